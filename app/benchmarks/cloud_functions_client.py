@@ -0,0 +1,111 @@
+"""Benchmark HTTP connection reuse of CloudFunctionsSandbox.
+
+Sends requests to a local stand-in for Cloud Functions, once with a new
+HTTP client per request (the previous behavior) and once with the
+client shared by CloudFunctionsSandbox, and prints the throughput of
+both.  The rest of CloudFunctionsSandbox.run_typecheck is not included
+so that only the HTTP client is compared.
+
+usage: python -m benchmarks.cloud_functions_client [--requests N] [--concurrency N]
+"""
+
+import argparse
+import asyncio
+import socket
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import httpx
+import uvicorn
+
+from mypy_playground.sandbox.cloud_functions import CloudFunctionsSandbox
+
+RESPONSE = b'{"exit_code": 0, "stdout": "Success: no issues found", "stderr": ""}'
+
+
+async def stand_in_function(
+    scope: dict[str, Any],
+    receive: Callable[[], Awaitable[dict[str, Any]]],
+    send: Callable[[dict[str, Any]], Awaitable[None]],
+) -> None:
+    """ASGI app responding like the Cloud Functions wrapper"""
+    if scope["type"] != "http":
+        return
+    while (await receive()).get("more_body"):
+        pass
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json")],
+        }
+    )
+    await send({"type": "http.response.body", "body": RESPONSE})
+
+
+def start_server() -> tuple[uvicorn.Server, str]:
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    config = uvicorn.Config(stand_in_function, log_level="warning")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, f"http://127.0.0.1:{port}/"
+
+
+async def measure(
+    func: Callable[[], Awaitable[object]], requests: int, concurrency: int
+) -> float:
+    """Return the number of requests per second"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run() -> None:
+        async with semaphore:
+            await func()
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(run() for _ in range(requests)))
+    return requests / (time.perf_counter() - start_time)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    server, base_url = start_server()
+    data = {"source": "x = 1", "options": []}
+
+    url = f"{base_url}mypy-latest"
+
+    async def new_client_per_request() -> None:
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            response = await client.post(url, json=data)
+            response.json()
+
+    sandbox = CloudFunctionsSandbox()
+    await sandbox.start()
+
+    async def shared_client() -> None:
+        assert sandbox.client is not None  # noqa: S101
+        response = await sandbox.client.post(url, json=data)
+        response.json()
+
+    try:
+        before = await measure(new_client_per_request, args.requests, args.concurrency)
+        after = await measure(shared_client, args.requests, args.concurrency)
+    finally:
+        await sandbox.close()
+        server.should_exit = True
+
+    print(f"new client per request: {before:8.1f} req/s")
+    print(f"shared client:          {after:8.1f} req/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
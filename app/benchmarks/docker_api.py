@@ -0,0 +1,269 @@
+"""Benchmark Docker API round trips of DockerSandbox.
+
+Runs a local stand-in for the Docker Engine API, which adds a fixed
+latency to every API call and "runs" mypy for a fixed time, and compares
+the latency of DockerSandbox.run_typecheck with the previous sequence of
+API calls (create, put_archive, start, wait, two log calls and delete).
+
+usage: python -m benchmarks.docker_api [--requests N] [--latency SECONDS]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import struct
+import tarfile
+import time
+import uuid
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Any
+from unittest import mock
+
+import aiodocker
+
+from mypy_playground.config import get_settings
+from mypy_playground.sandbox.docker import DockerSandbox
+
+OUTPUT = b"Success: no issues found in 1 source file\n"
+
+
+@dataclass
+class _Container:
+    config: dict[str, Any]
+    exited: asyncio.Event = field(default_factory=asyncio.Event)
+    stdin: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+def _frame(stream: int, data: bytes) -> bytes:
+    return struct.pack(">BxxxL", stream, len(data)) + data
+
+
+class DockerAPIServer:
+    """Stand-in for the Docker Engine API over TCP.
+
+    Implements only the endpoints used by DockerSandbox.  Every call takes
+    latency seconds and every container runs for run_time seconds.
+    """
+
+    def __init__(self, latency: float, run_time: float) -> None:
+        self.latency = latency
+        self.run_time = run_time
+        self.calls: Counter[str] = Counter()
+        self.containers: dict[str, _Container] = {}
+        self._server: asyncio.Server | None = None
+
+    async def start(self) -> str:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self._server.sockets[0].getsockname()[1]
+        return f"tcp://127.0.0.1:{port}"
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        with contextlib.suppress(ConnectionError, asyncio.IncompleteReadError):
+            while request_line := await reader.readline():
+                method, target, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()) != b"\r\n":
+                    name, value = line.decode().split(":", 1)
+                    headers[name.lower()] = value.strip()
+                body = await self._read_body(reader, headers)
+                # e.g. /v1.43/containers/{id}/start -> ["containers", "{id}", "start"]
+                path = target.split("?")[0].strip("/").split("/")
+                if path[0].startswith("v1."):
+                    path = path[1:]
+                query = target.partition("?")[2]
+                self.calls[f"{method} {path[-1]}"] += 1
+                await asyncio.sleep(self.latency)
+                if path[-1] == "attach":
+                    await self._attach(path[1], reader, writer)
+                    return
+                await self._route(method, path, query, body, writer)
+        writer.close()
+
+    async def _read_body(
+        self, reader: asyncio.StreamReader, headers: dict[str, str]
+    ) -> bytes:
+        if "content-length" in headers:
+            return await reader.readexactly(int(headers["content-length"]))
+        body = b""
+        if headers.get("transfer-encoding") == "chunked":
+            while size := int((await reader.readline()).strip(), 16):
+                body += await reader.readexactly(size)
+                await reader.readline()
+            await reader.readline()
+        return body
+
+    async def _route(
+        self,
+        method: str,
+        path: list[str],
+        query: str,
+        body: bytes,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        if path[-1] in ("version", "_ping"):
+            self._respond(writer, 200, {"ApiVersion": "1.43"})
+        elif path[-1] == "create":
+            container_id = uuid.uuid4().hex
+            self.containers[container_id] = _Container(json.loads(body))
+            self._respond(writer, 201, {"Id": container_id})
+        elif method == "DELETE":
+            self.containers.pop(path[1], None)
+            self._respond(writer, 204)
+        elif path[0] == "images" and path[-1] == "json":
+            self._respond(writer, 200, {"Id": f"sha256:{path[1]}"})
+        elif path[-1] == "json":
+            self._respond(writer, 200, {"Config": {"Tty": False}})
+        elif path[-1] == "archive":
+            self.containers[path[1]].stdin.set()
+            self._respond(writer, 200)
+        elif path[-1] == "start":
+            asyncio.create_task(self._run(path[1]))
+            self._respond(writer, 204)
+        elif path[-1] == "wait":
+            # Headers are sent as soon as the daemon starts waiting
+            container = self.containers[path[1]]
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                b"Transfer-Encoding: chunked\r\n\r\n"
+            )
+            await container.exited.wait()
+            data = b'{"StatusCode": 0}'
+            writer.write(b"%x\r\n%s\r\n0\r\n\r\n" % (len(data), data))
+        elif path[-1] == "logs":
+            data = _frame(1, OUTPUT) if "stdout=True" in query else b""
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/vnd.docker.raw-stream"
+                b"\r\nContent-Length: %d\r\n\r\n%s" % (len(data), data)
+            )
+        else:
+            self._respond(writer, 404, {"message": "not found"})
+
+    def _respond(
+        self, writer: asyncio.StreamWriter, status: int, data: object = None
+    ) -> None:
+        body = b"" if data is None else json.dumps(data).encode()
+        writer.write(
+            b"HTTP/1.1 %d X\r\nContent-Type: application/json\r\n"
+            b"Content-Length: %d\r\n\r\n%s" % (status, len(body), body)
+        )
+
+    async def _attach(
+        self,
+        container_id: str,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        container = self.containers[container_id]
+        writer.write(
+            b"HTTP/1.1 101 UPGRADED\r\nContent-Type: application/vnd.docker.raw-stream"
+            b"\r\nConnection: Upgrade\r\nUpgrade: tcp\r\n\r\n"
+        )
+        job = json.loads(await reader.readline())
+        await reader.readexactly(job["size"])
+        container.stdin.set()
+        await container.exited.wait()
+        writer.write(_frame(1, OUTPUT))
+        await writer.drain()
+        writer.close()
+
+    async def _run(self, container_id: str) -> None:
+        container = self.containers[container_id]
+        await container.stdin.wait()
+        await asyncio.sleep(self.run_time)
+        # Let the attached connection send the output first
+        container.exited.set()
+        await asyncio.sleep(0)
+        if container.config.get("HostConfig", {}).get("AutoRemove"):
+            self.containers.pop(container_id, None)
+
+
+async def legacy_run(client: aiodocker.Docker, source: str) -> None:
+    """The sequence of API calls before attaching to containers"""
+    config = {"Image": "stand-in", "Cmd": ["mypy", "main.py"]}
+    c: Any = await client.containers.create(config=config)
+    stream = io.BytesIO()
+    with tarfile.TarFile(fileobj=stream, mode="w") as tar:
+        data = source.encode()
+        tarinfo = tarfile.TarInfo(name="main.py")
+        tarinfo.size = len(data)
+        tar.addfile(tarinfo, io.BytesIO(data))
+    stream.seek(0)
+    await c.put_archive("/tmp", stream)  # noqa: S108
+    await c.start()
+    await c.wait()
+    await c.log(stdout=True, stderr=False)
+    await c.log(stdout=False, stderr=True)
+    await c.delete()
+
+
+async def measure(
+    server: DockerAPIServer, func: Callable[[], Awaitable[object]], requests: int
+) -> None:
+    server.calls.clear()
+    latencies = []
+    for _ in range(requests):
+        start_time = time.perf_counter()
+        await func()
+        latencies.append(time.perf_counter() - start_time)
+    calls = sum(server.calls.values()) / requests
+    print(
+        f"  {calls:.1f} API calls per request,"
+        f" p50={1000 * statistics.median(latencies):.2f} ms,"
+        f" mean={1000 * statistics.mean(latencies):.2f} ms",
+        flush=True,
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument(
+        "--latency", type=float, default=0.005, help="latency of each API call"
+    )
+    parser.add_argument(
+        "--run-time", type=float, default=0.05, help="run time of each container"
+    )
+    args = parser.parse_args()
+
+    server = DockerAPIServer(args.latency, args.run_time)
+    docker_host = await server.start()
+    settings = get_settings().model_copy(
+        update={
+            "docker_images": {"latest": "stand-in"},
+            "docker_pool_size": 0,
+            "docker_pool_sizes": {},
+            "docker_pool_traffic_budget": 0,
+        }
+    )
+    source = "x: int = 1\n" * 20
+    with (
+        mock.patch("mypy_playground.sandbox.docker.get_settings", new=lambda: settings),
+        mock.patch.dict(os.environ, DOCKER_HOST=docker_host),
+    ):
+        sandbox = DockerSandbox()
+        print("previous sequence:", flush=True)
+        await measure(server, lambda: legacy_run(sandbox.client, source), args.requests)
+        print("DockerSandbox:", flush=True)
+        await measure(
+            server,
+            lambda: sandbox.run_typecheck(source, mypy_version="latest"),
+            args.requests,
+        )
+        await sandbox.close()
+    await server.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
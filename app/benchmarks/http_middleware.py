@@ -0,0 +1,140 @@
+"""Microbenchmark of the overhead of PrometheusMiddleware.
+
+Calls a minimal FastAPI application directly through ASGI, without a
+server, and prints the time per request without middleware, with the
+previous middleware based on BaseHTTPMiddleware, and with the current
+pure ASGI middleware.
+
+usage: python -m benchmarks.http_middleware [--requests N]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+from prometheus_client import CollectorRegistry, Counter, Histogram
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import Response
+from starlette.types import Message
+
+from mypy_playground.middleware import PrometheusMiddleware
+
+
+class LegacyPrometheusMiddleware(BaseHTTPMiddleware):
+    """The previous implementation (labelled by the path of requests)"""
+
+    def __init__(self, app: Any, registry: CollectorRegistry) -> None:
+        super().__init__(app)
+        self._requests_total_counter = Counter(
+            registry=registry,
+            name="requests_total",
+            documentation="",
+            labelnames=("handler", "method", "code"),
+        )
+        self._requests_duration_seconds_histogram = Histogram(
+            registry=registry,
+            name="request_duration_seconds",
+            documentation="",
+            buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 3, 8, 20, 60),
+            labelnames=("handler", "method"),
+        )
+        self._response_size_bytes_histogram = Histogram(
+            registry=registry,
+            name="response_size_bytes",
+            documentation="",
+            buckets=(10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000),
+            labelnames=("handler", "method"),
+        )
+
+    async def dispatch(
+        self, request: Request, call_next: Callable[[Request], Awaitable[Response]]
+    ) -> Response:
+        start_time = time.time()
+        response = await call_next(request)
+        duration = time.time() - start_time
+        handler_name = request.url.path
+        self._requests_duration_seconds_histogram.labels(
+            handler_name, request.method
+        ).observe(duration)
+        self._requests_total_counter.labels(
+            handler_name, request.method, response.status_code
+        ).inc()
+        content_length = response.headers.get("content-length")
+        if content_length:
+            with contextlib.suppress(ValueError):
+                self._response_size_bytes_histogram.labels(
+                    handler_name, request.method
+                ).observe(int(content_length))
+        return response
+
+
+def create_app(
+    middleware: type[PrometheusMiddleware | LegacyPrometheusMiddleware] | None,
+) -> FastAPI:
+    app = FastAPI()
+    if middleware is not None:
+        app.add_middleware(middleware, registry=CollectorRegistry())
+
+    @app.get("/api/items/{item_id}")
+    async def item(item_id: str) -> PlainTextResponse:
+        return PlainTextResponse(item_id)
+
+    return app
+
+
+async def measure(app: FastAPI, requests: int) -> float:
+    """Return the average time per request in microseconds"""
+
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Message) -> None:
+        pass
+
+    def scope(i: int) -> dict[str, Any]:
+        path = f"/api/items/{i}"
+        return {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"host", b"localhost")],
+            "client": ("127.0.0.1", 12345),
+            "server": ("localhost", 80),
+        }
+
+    # Warm up
+    for i in range(100):
+        await app(scope(i), receive, send)
+    start_time = time.perf_counter()
+    for i in range(requests):
+        await app(scope(i), receive, send)
+    return 1_000_000 * (time.perf_counter() - start_time) / requests
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    for name, middleware in (
+        ("no middleware", None),
+        ("BaseHTTPMiddleware (previous)", LegacyPrometheusMiddleware),
+        ("pure ASGI (current)", PrometheusMiddleware),
+    ):
+        per_request = await measure(create_app(middleware), args.requests)
+        print(f"{name}: {per_request:.1f} us/request", flush=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
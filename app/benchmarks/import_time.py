@@ -0,0 +1,62 @@
+"""Measure the import time of the application.
+
+Imports a module in a fresh interpreter with `python -X importtime` and
+prints the modules with the largest cumulative import time.  The
+sandbox backend is selected with the "sandbox" environment variable,
+as in the application.
+
+usage: python -m benchmarks.import_time [--module M] [--sandbox S] [--top N]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).parents[1]
+
+
+def measure_imports(
+    module: str, env: dict[str, str] | None = None, cwd: Path | None = None
+) -> dict[str, int]:
+    """Import a module in a new process and return its imports
+
+    The result maps the name of each imported module to its cumulative
+    import time in microseconds.
+    """
+    process = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        check=True,
+        cwd=cwd,
+        env={**os.environ, "PYTHONPATH": str(APP_DIR), **(env or {})},
+        text=True,
+    )
+    imports = {}
+    for line in process.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        if cumulative.strip().isdigit():
+            imports[name.strip()] = int(cumulative)
+    return imports
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="mypy_playground.main")
+    parser.add_argument("--sandbox", help="value of Settings.sandbox")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    env = {"sandbox": args.sandbox} if args.sandbox else None
+    imports = measure_imports(args.module, env)
+    print(f"{args.module}: {imports[args.module] / 1000:.1f} ms")
+    for name, cumulative in sorted(imports.items(), key=lambda i: -i[1])[: args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
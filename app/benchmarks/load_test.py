@@ -0,0 +1,372 @@
+"""Replayable load test of the type-check path.
+
+Drives the application in-process with /api/typecheck requests from a
+trace, against a stand-in sandbox, and writes a JSON report with the
+latency percentiles, the throughput, the time spent waiting for a
+sandbox and the lag of the event loop.
+
+The trace is generated from a scenario with a fixed seed, so the same
+scenario replays the same requests at the same times.  A scenario
+describes:
+- rate, duration and seed of the Poisson arrivals
+- mix: weighted kinds of requests (source lines, mypy version, flags)
+- sandbox: stand-in to use
+  - {"type": "fixed", "latency": 0.05}
+  - {"type": "lognormal", "median": 0.05, "sigma": 0.5}
+  - {"type": "docker", "api_latency": 0.002, "run_time": 0.05}, which runs
+    DockerSandbox against benchmarks.docker_api.DockerAPIServer
+  - {"type": "local"}, which runs mypy with LocalSandbox, by default in
+    the virtualenv of this script for every mypy version
+  "per_line" adds seconds per line of source to "fixed" and "lognormal".
+- settings: overrides of Settings, such as sandbox_concurrency
+
+Queue wait is measured from sending a request to the stand-in receiving
+it, so it includes the overhead of the application itself.
+
+usage:
+  python -m benchmarks.load_test [--scenario FILE] [--output FILE]
+      [--save-trace FILE] [--replay FILE]
+  python -m benchmarks.load_test compare BASE.json NEW.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+import httpx
+
+from benchmarks.docker_api import DockerAPIServer
+from mypy_playground.config import Settings, get_settings
+from mypy_playground.main import app
+from mypy_playground.sandbox.base import AbstractSandbox, Result
+from mypy_playground.sandbox.docker import DockerSandbox
+from mypy_playground.sandbox.local import LocalSandbox
+
+DEFAULT_SCENARIO: dict[str, Any] = {
+    "seed": 1,
+    "rate": 50.0,
+    "duration": 10.0,
+    "mix": [
+        {"weight": 6, "source_lines": 20, "mypy_version": "latest"},
+        {"weight": 2, "source_lines": 200, "mypy_version": "latest"},
+        {
+            "weight": 1,
+            "source_lines": 20,
+            "mypy_version": "latest",
+            "flags": {"strict": True},
+        },
+        {"weight": 1, "source_lines": 20, "mypy_version": "master"},
+    ],
+    "sandbox": {"type": "lognormal", "median": 0.05, "sigma": 0.5},
+    "settings": {},
+}
+# Interval of sampling the lag of the event loop
+_LAG_INTERVAL = 0.01
+_GIT_ERRORS = (OSError, subprocess.CalledProcessError)
+# Request body -> time when the stand-in received it
+_receive_times: dict[str, float] = {}
+
+
+def generate_trace(scenario: dict[str, Any]) -> list[dict[str, Any]]:
+    """Generate timed requests from a scenario"""
+    rng = random.Random(scenario["seed"])  # noqa: S311
+    mix = scenario["mix"]
+    weights = [kind.get("weight", 1) for kind in mix]
+    trace: list[dict[str, Any]] = []
+    at = rng.expovariate(scenario["rate"])
+    while at < scenario["duration"]:
+        kind = rng.choices(mix, weights)[0]
+        # A unique first line, so that requests are neither cached nor coalesced
+        lines = [f"# request {len(trace)}"]
+        lines += [
+            f"x{i}: int = {rng.randrange(100)}" for i in range(kind["source_lines"])
+        ]
+        body = {"source": "\n".join(lines) + "\n", **kind.get("flags", {})}
+        body["mypyVersion"] = kind["mypy_version"]
+        trace.append({"at": round(at, 6), "body": body})
+        at += rng.expovariate(scenario["rate"])
+    return trace
+
+
+class RecordingDockerSandbox(DockerSandbox):
+    """DockerSandbox which records when requests reach it"""
+
+    async def run_typecheck(
+        self,
+        source: str,
+        /,
+        mypy_version: str,
+        python_version: str | None = None,
+        **kwargs: Any,
+    ) -> Result | None:
+        _receive_times[source] = time.perf_counter()
+        return await super().run_typecheck(
+            source, mypy_version, python_version, **kwargs
+        )
+
+
+class RecordingLocalSandbox(LocalSandbox):
+    """LocalSandbox which records when requests reach it"""
+
+    async def run_typecheck(
+        self,
+        source: str,
+        /,
+        mypy_version: str,
+        python_version: str | None = None,
+        **kwargs: Any,
+    ) -> Result | None:
+        _receive_times[source] = time.perf_counter()
+        return await super().run_typecheck(
+            source, mypy_version, python_version, **kwargs
+        )
+
+
+class StandInSandbox(AbstractSandbox):
+    """Sandbox which sleeps instead of running mypy"""
+
+    backend = "stand_in"
+
+    def __init__(self, config: dict[str, Any], seed: int) -> None:
+        self.config = config
+        self.rng = random.Random(seed)  # noqa: S311
+
+    async def run_typecheck(
+        self,
+        source: str,
+        /,
+        mypy_version: str,
+        python_version: str | None = None,
+        **kwargs: Any,
+    ) -> Result | None:
+        _receive_times[source] = time.perf_counter()
+        latency = self._get_latency(source)
+        await asyncio.sleep(latency)
+        return Result(
+            exit_code=0,
+            stdout="Success: no issues found in 1 source file",
+            stderr="",
+            duration=int(1000 * latency),
+        )
+
+    async def resolve_target(self, mypy_version: str) -> str | None:
+        return f"stand-in:{mypy_version}"
+
+    def _get_latency(self, source: str) -> float:
+        config = self.config
+        latency = float(config.get("per_line", 0.0)) * source.count("\n")
+        if config["type"] == "fixed":
+            return latency + float(config["latency"])
+        if config["type"] == "lognormal":
+            return latency + float(config["median"]) * math.exp(
+                self.rng.gauss(0, config["sigma"])
+            )
+        raise ValueError(f"unknown stand-in: {config['type']}")
+
+
+def get_percentiles(values: list[float]) -> dict[str, float]:
+    """Get percentiles of values in milliseconds"""
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def percentile(p: float) -> float:
+        index = max(0, math.ceil(p / 100 * len(values)) - 1)
+        return round(1000 * values[index], 3)
+
+    return {
+        "p50": percentile(50),
+        "p95": percentile(95),
+        "p99": percentile(99),
+        "max": round(1000 * values[-1], 3),
+        "mean": round(1000 * sum(values) / len(values), 3),
+    }
+
+
+async def _monitor_loop_lag(lags: list[float]) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        start_time = loop.time()
+        await asyncio.sleep(_LAG_INTERVAL)
+        lags.append(max(0.0, loop.time() - start_time - _LAG_INTERVAL))
+
+
+def _get_settings(scenario: dict[str, Any], trace: list[dict[str, Any]]) -> Settings:
+    versions = sorted({item["body"]["mypyVersion"] for item in trace})
+    update: dict[str, Any] = {
+        "mypy_versions": [(f"mypy {version}", version) for version in versions],
+        "docker_images": dict.fromkeys(versions, "stand-in"),
+        "local_venvs": dict.fromkeys(versions, sys.prefix),
+        "docker_pool_size": 0,
+        "docker_pool_sizes": {},
+        "docker_pool_traffic_budget": 0,
+        "docker_reaper_interval": 0,
+        "cache_max_entries": 0,
+    }
+    update.update(scenario.get("settings", {}))
+    return get_settings().model_copy(update=update)
+
+
+async def run(scenario: dict[str, Any], trace: list[dict[str, Any]]) -> dict[str, Any]:
+    """Replay a trace and return the report"""
+    settings = _get_settings(scenario, trace)
+    sandbox_config = scenario["sandbox"]
+    server = None
+    with contextlib.ExitStack() as stack:
+        for module in (
+            "mypy_playground.sandbox",
+            "mypy_playground.sandbox.docker",
+            "mypy_playground.sandbox.local",
+        ):
+            stack.enter_context(
+                mock.patch(f"{module}.get_settings", new=lambda: settings)
+            )
+        # The scheduler is created again with the settings
+        stack.enter_context(mock.patch("mypy_playground.sandbox.scheduler", None))
+        app.dependency_overrides[get_settings] = lambda: settings
+
+        sandbox: AbstractSandbox
+        if sandbox_config["type"] == "docker":
+            server = DockerAPIServer(
+                sandbox_config["api_latency"], sandbox_config["run_time"]
+            )
+            docker_host = await server.start()
+            stack.enter_context(mock.patch.dict(os.environ, DOCKER_HOST=docker_host))
+            sandbox = RecordingDockerSandbox()
+        elif sandbox_config["type"] == "local":
+            sandbox = RecordingLocalSandbox()
+        else:
+            sandbox = StandInSandbox(sandbox_config, scenario["seed"])
+        app.state.sandbox = sandbox
+        await sandbox.start()
+        try:
+            report = await _replay(trace)
+        finally:
+            await sandbox.close()
+            if server is not None:
+                await server.close()
+            app.dependency_overrides.pop(get_settings, None)
+            del app.state.sandbox
+    report["scenario"] = scenario
+    report["commit"] = _get_commit()
+    return report
+
+
+async def _replay(trace: list[dict[str, Any]]) -> dict[str, Any]:
+    latencies: list[float] = []
+    queue_waits: list[float] = []
+    lags: list[float] = []
+    statuses: Counter[str] = Counter()
+    transport = httpx.ASGITransport(app=app)
+    limits = httpx.Limits(max_connections=None)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://app", limits=limits, timeout=600
+    ) as client:
+
+        async def request(body: dict[str, Any]) -> None:
+            start_time = time.perf_counter()
+            response = await client.post("/api/typecheck", json=body)
+            end_time = time.perf_counter()
+            statuses[str(response.status_code)] += 1
+            if response.status_code == 200:
+                latencies.append(end_time - start_time)
+            received = _receive_times.pop(body["source"], None)
+            if received is not None:
+                queue_waits.append(received - start_time)
+
+        monitor = asyncio.create_task(_monitor_loop_lag(lags))
+        tasks = []
+        start_time = time.perf_counter()
+        for item in trace:
+            delay = start_time + item["at"] - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(request(item["body"])))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start_time
+        monitor.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await monitor
+
+    return {
+        "requests": len(trace),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput": round(statuses["200"] / elapsed, 3),
+        "status": dict(statuses),
+        "latency_ms": get_percentiles(latencies),
+        "queue_wait_ms": get_percentiles(queue_waits),
+        "loop_lag_ms": get_percentiles(lags),
+    }
+
+
+def _get_commit() -> str | None:
+    try:
+        process = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],  # noqa: S607
+            capture_output=True,
+            check=True,
+            cwd=Path(__file__).parent,
+            text=True,
+        )
+    except _GIT_ERRORS:
+        return None
+    return process.stdout.strip()
+
+
+def compare(base: dict[str, Any], new: dict[str, Any]) -> None:
+    """Print the changes of the metrics between two reports"""
+    print(f"{base.get('commit')} -> {new.get('commit')}")
+    print(f"  throughput: {base['throughput']} -> {new['throughput']} req/s")
+    for section in ("latency_ms", "queue_wait_ms", "loop_lag_ms"):
+        for key, value in new[section].items():
+            old = base[section].get(key)
+            change = f" ({100 * (value - old) / old:+.1f}%)" if old else ""
+            print(f"  {section}.{key}: {old} -> {value}{change}")
+
+
+def main() -> None:
+    if sys.argv[1:2] == ["compare"]:
+        parser = argparse.ArgumentParser(prog="load_test compare")
+        parser.add_argument("base", type=Path)
+        parser.add_argument("new", type=Path)
+        args = parser.parse_args(sys.argv[2:])
+        compare(json.loads(args.base.read_text()), json.loads(args.new.read_text()))
+        return
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenario", type=Path, help="JSON file of a scenario")
+    parser.add_argument("--output", type=Path, help="write the report to a file")
+    parser.add_argument("--save-trace", type=Path, help="write the requests to a file")
+    parser.add_argument("--replay", type=Path, help="replay requests from a file")
+    args = parser.parse_args()
+
+    scenario = dict(DEFAULT_SCENARIO)
+    if args.scenario is not None:
+        scenario.update(json.loads(args.scenario.read_text()))
+    if args.replay is not None:
+        trace = [json.loads(line) for line in args.replay.read_text().splitlines()]
+    else:
+        trace = generate_trace(scenario)
+    if args.save_trace is not None:
+        args.save_trace.write_text("".join(json.dumps(item) + "\n" for item in trace))
+
+    report = asyncio.run(run(scenario, trace))
+    output = json.dumps(report, indent=2)
+    if args.output is not None:
+        args.output.write_text(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
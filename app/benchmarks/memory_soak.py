@@ -0,0 +1,140 @@
+"""Soak test of the memory usage with CloudFunctionsSandbox.
+
+Sends many /api/typecheck requests to the application in-process, which
+forwards them to a local stand-in for Cloud Functions, and reports the
+RSS over time and the request latency for a memory management mode:
+
+- policy: MemoryManager runs full collections in the background
+- per-request: a full collection before and after every request
+  (the previous workaround)
+- none: only the automatic collections of CPython
+
+Run each mode in its own process to compare them.
+
+usage: python -m benchmarks.memory_soak [--mode MODE] [--requests N]
+"""
+
+import argparse
+import asyncio
+import gc
+import statistics
+import time
+from typing import Any
+from unittest import mock
+
+import httpx
+
+from benchmarks.cloud_functions_client import start_server
+from mypy_playground.config import get_settings
+from mypy_playground.main import app
+from mypy_playground.memory import MemoryManager, get_rss
+from mypy_playground.sandbox.base import Result
+from mypy_playground.sandbox.cloud_functions import CloudFunctionsSandbox
+
+MiB = 1024 * 1024
+
+
+class PerRequestGCSandbox(CloudFunctionsSandbox):
+    async def run_typecheck(
+        self,
+        source: str,
+        /,
+        mypy_version: str,
+        python_version: str | None = None,
+        **kwargs: Any,
+    ) -> Result | None:
+        gc.collect()
+        try:
+            return await super().run_typecheck(
+                source, mypy_version, python_version, **kwargs
+            )
+        finally:
+            gc.collect()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--mode", choices=("policy", "per-request", "none"), default="policy"
+    )
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--samples", type=int, default=10)
+    args = parser.parse_args()
+
+    server, base_url = start_server()
+    settings = get_settings().model_copy(
+        update={
+            "cloud_functions_base_url": base_url,
+            "cloud_functions_identity_token": "token",
+            "cloud_functions_names": {"latest": "mypy-latest"},
+            "mypy_versions": [("mypy latest", "latest")],
+            # Every request has a different source, so it is not cached
+            "cache_max_entries": 0,
+            "sandbox_concurrency": args.concurrency,
+        }
+    )
+    patches = [
+        mock.patch(f"{module}.get_settings", new=lambda: settings)
+        for module in (
+            "mypy_playground.sandbox",
+            "mypy_playground.sandbox.cloud_functions",
+        )
+    ]
+    for patch in patches:
+        patch.start()
+    app.dependency_overrides[get_settings] = lambda: settings
+
+    sandbox = (
+        PerRequestGCSandbox() if args.mode == "per-request" else CloudFunctionsSandbox()
+    )
+    app.state.sandbox = sandbox
+    await sandbox.start()
+    memory_manager = MemoryManager(
+        check_interval=settings.memory_check_interval if args.mode == "policy" else 0,
+        gc_interval=settings.gc_interval,
+        rss_growth_threshold=settings.gc_rss_growth_threshold,
+        object_growth_threshold=settings.gc_object_growth_threshold,
+    )
+    await memory_manager.start()
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: list[float] = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+
+        async def request(i: int) -> None:
+            async with semaphore:
+                start_time = time.perf_counter()
+                response = await client.post(
+                    "/api/typecheck", json={"source": f"x = {i}\n" * 20}
+                )
+                latencies.append(time.perf_counter() - start_time)
+                response.raise_for_status()
+
+        print(f"mode: {args.mode}", flush=True)
+        print(f"rss at start: {(get_rss() or 0) / MiB:.1f} MiB", flush=True)
+        chunk = args.requests // args.samples
+        for sample in range(args.samples):
+            await asyncio.gather(
+                *(request(i) for i in range(sample * chunk, (sample + 1) * chunk))
+            )
+            rss = (get_rss() or 0) / MiB
+            print(
+                f"rss after {(sample + 1) * chunk} requests: {rss:.1f} MiB", flush=True
+            )
+
+    await memory_manager.close()
+    await sandbox.close()
+    server.should_exit = True
+    for patch in patches:
+        patch.stop()
+
+    latencies.sort()
+    p50 = statistics.median(latencies)
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(f"latency: p50={1000 * p50:.2f} ms, p99={1000 * p99:.2f} ms", flush=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+// Write Brotli and gzip variants of the build output (e.g. index.js.br and
+// index.js.gz next to index.js), which the app serves depending on
+// Accept-Encoding. See app/mypy_playground/static.py.
+import { readdir, readFile, stat, utimes, writeFile } from "node:fs/promises";
+import { extname, join } from "node:path";
+import { brotliCompressSync, constants, gzipSync } from "node:zlib";
+
+const COMPRESSIBLE_EXTENSIONS = new Set([
+  ".css",
+  ".html",
+  ".js",
+  ".json",
+  ".map",
+  ".mjs",
+  ".svg",
+  ".txt",
+  ".wasm",
+  ".xml",
+]);
+// Smaller files are not worth the extra requests for variants
+const MIN_SIZE = 1024;
+
+const variants = [
+  [
+    ".br",
+    (data) =>
+      brotliCompressSync(data, {
+        params: {
+          [constants.BROTLI_PARAM_QUALITY]: constants.BROTLI_MAX_QUALITY,
+          [constants.BROTLI_PARAM_SIZE_HINT]: data.length,
+        },
+      }),
+  ],
+  [".gz", (data) => gzipSync(data, { level: constants.Z_BEST_COMPRESSION })],
+];
+
+async function* walk(dir) {
+  for (const entry of await readdir(dir, { withFileTypes: true })) {
+    const path = join(dir, entry.name);
+    if (entry.isDirectory()) {
+      yield* walk(path);
+    } else if (entry.isFile()) {
+      yield path;
+    }
+  }
+}
+
+const dir = process.argv[2] ?? "dist";
+let original = 0;
+let compressed = 0;
+for await (const path of walk(dir)) {
+  if (!COMPRESSIBLE_EXTENSIONS.has(extname(path))) {
+    continue;
+  }
+  const data = await readFile(path);
+  if (data.length < MIN_SIZE) {
+    continue;
+  }
+  const { mtime } = await stat(path);
+  for (const [suffix, compress] of variants) {
+    const output = compress(data);
+    // Serve the original if compression does not help
+    if (output.length >= data.length) {
+      continue;
+    }
+    await writeFile(path + suffix, output);
+    // Keep the same modification time as the original file
+    await utimes(path + suffix, mtime, mtime);
+    original += data.length;
+    compressed += output.length;
+  }
+}
+console.log(`compressed ${original} bytes into ${compressed} bytes in ${dir}`);
@@ -0,0 +1,156 @@
+"""Bisection of mypy versions.
+
+Finds the first mypy version in which the output for a snippet differs
+from an older version, running mypy with O(log n) versions.  Like git
+bisect, this assumes that the output changed only once in the range.
+"""
+
+import logging
+import math
+import re
+from collections.abc import Awaitable, Callable, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+from mypy_playground.sandbox import run_typecheck_in_sandbox
+from mypy_playground.sandbox.base import AbstractSandbox, Result
+
+logger = logging.getLogger(__name__)
+
+# Version IDs of releases, e.g. "1.19.1", "0.990" and "basedmypy-2.9.1".
+# Aliases such as "latest" and "master" cannot be ordered.
+_RELEASE = re.compile(r"(?P<family>[a-z]+-)?(?P<number>\d+(?:\.\d+)*)")
+
+# Called with a mypy version, the number of probes so far and the maximum
+ProgressCallback = Callable[[str, int, int], None]
+
+
+class BisectionError(Exception):
+    """Raised when mypy fails with a version"""
+
+    def __init__(self, mypy_version: str) -> None:
+        super().__init__(f"failed to run mypy {mypy_version}")
+        self.mypy_version = mypy_version
+
+
+@dataclass
+class BisectionResult:
+    # The first version whose output differs from the oldest version
+    first_changed: str | None
+    # The version just before first_changed
+    last_unchanged: str | None
+    results: dict[str, Result]
+
+
+def get_candidate_versions(
+    available_versions: Sequence[str],
+    old_version: str | None = None,
+    new_version: str | None = None,
+) -> list[str]:
+    """Get releases to bisect from old_version to new_version
+
+    Only releases of the same family as the given versions (mypy by
+    default) are candidates, ordered by their version numbers, so that
+    aliases and other families do not break the order.  The range is the
+    oldest to the newest of the family by default.
+
+    Raises ValueError if a given version is unknown or not a release, or
+    if old_version is newer than new_version.
+    """
+    families = set()
+    for version in (old_version, new_version):
+        if version is None:
+            continue
+        if version not in available_versions:
+            raise ValueError(f"unknown mypy version: {version}")
+        match = _RELEASE.fullmatch(version)
+        if match is None:
+            raise ValueError(f"not a release of mypy: {version}")
+        families.add(match["family"] or "")
+    if len(families) > 1:
+        raise ValueError("mypy versions must be releases of the same family")
+    family = families.pop() if families else ""
+
+    releases = []
+    for version in available_versions:
+        match = _RELEASE.fullmatch(version)
+        if match is not None and (match["family"] or "") == family:
+            number = tuple(int(n) for n in match["number"].split("."))
+            releases.append((number, version))
+    releases.sort()
+    versions = [version for _, version in releases]
+    if not versions:
+        return []
+    old_index = versions.index(old_version) if old_version else 0
+    new_index = versions.index(new_version) if new_version else len(versions) - 1
+    if old_index > new_index:
+        raise ValueError(f"{old_version} is newer than {new_version}")
+    return versions[old_index : new_index + 1]
+
+
+def make_probe(
+    sandbox: AbstractSandbox, source: str, **kwargs: Any
+) -> Callable[[str], Awaitable[Result | None]]:
+    """Make a function running mypy for the source with a mypy version
+
+    Results are kept in the result cache of the sandbox, so repeated
+    bisections are cheap.
+    """
+
+    async def probe(mypy_version: str) -> Result | None:
+        return await run_typecheck_in_sandbox(
+            sandbox, source, mypy_version=mypy_version, **kwargs
+        )
+
+    return probe
+
+
+def same_output(a: Result, b: Result) -> bool:
+    return (a.exit_code, a.stdout, a.stderr) == (b.exit_code, b.stdout, b.stderr)
+
+
+def get_max_probes(num_versions: int) -> int:
+    """Number of probes needed for versions in the worst case"""
+    if num_versions <= 1:
+        return num_versions
+    return 2 + math.ceil(math.log2(num_versions - 1))
+
+
+async def bisect_versions(
+    versions: Sequence[str],
+    probe: Callable[[str], Awaitable[Result | None]],
+    on_progress: ProgressCallback | None = None,
+) -> BisectionResult:
+    """Find the first version whose output differs from the first version
+
+    versions must be ordered from the oldest to the newest.
+    """
+    max_probes = get_max_probes(len(versions))
+    results: dict[str, Result] = {}
+
+    async def run(index: int) -> Result:
+        mypy_version = versions[index]
+        if on_progress is not None:
+            on_progress(mypy_version, len(results), max_probes)
+        result = await probe(mypy_version)
+        if result is None:
+            raise BisectionError(mypy_version)
+        results[mypy_version] = result
+        return result
+
+    if not versions:
+        return BisectionResult(None, None, results)
+    low, high = 0, len(versions) - 1
+    oldest = await run(low)
+    if high == low or same_output(oldest, await run(high)):
+        return BisectionResult(None, None, results)
+
+    # The output of low is the same as the oldest, and that of high is not
+    while high - low > 1:
+        middle = (low + high) // 2
+        if same_output(oldest, await run(middle)):
+            low = middle
+        else:
+            high = middle
+    logger.info("bisected mypy versions with %d probes", len(results))
+    return BisectionResult(versions[high], versions[low], results)
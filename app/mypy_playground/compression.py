@@ -0,0 +1,60 @@
+"""Content encoding of responses.
+
+gzip is always available.  Brotli is used only when the optional brotli
+package is installed, as it is not a dependency of the application.
+"""
+
+import gzip
+import importlib
+import importlib.util
+from typing import Any
+
+# Lower than the default 9, as responses are compressed per request
+_GZIP_LEVEL = 6
+# Moderate quality, which is much faster than the default 11
+_BROTLI_QUALITY = 5
+
+brotli: Any = (
+    importlib.import_module("brotli")
+    if importlib.util.find_spec("brotli") is not None
+    else None
+)
+
+
+def get_accepted_encodings(accept_encoding: str) -> set[str]:
+    """Get the encodings accepted by Accept-Encoding (q=0 means not accepted)"""
+    encodings = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                if float(params.removeprefix("q=")) <= 0:
+                    continue
+            except ValueError:
+                continue
+        encodings.add(name.strip().lower())
+    return encodings
+
+
+def get_available_encodings() -> list[str]:
+    """Get encodings which compress() supports in the order of preference"""
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def select_encoding(accept_encoding: str) -> str | None:
+    """Select an encoding to compress a response with, if any"""
+    accepted = get_accepted_encodings(accept_encoding)
+    for encoding in get_available_encodings():
+        if encoding in accepted:
+            return encoding
+    return None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br" and brotli is not None:
+        result: bytes = brotli.compress(data, quality=_BROTLI_QUALITY)
+        return result
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=_GZIP_LEVEL, mtime=0)
+    raise ValueError(f"unsupported encoding: {encoding}")
@@ -1,3 +1,4 @@
+import sys
 from functools import lru_cache
 from pathlib import Path
 from typing import Any, Literal
@@ -10,6 +11,15 @@ from pydantic_settings import (
     TomlConfigSettingsSource,
 )
 
+# Sandbox backends, which are imported by mypy_playground.sandbox.registry
+SandboxName = Literal[
+    "mypy_playground.sandbox.docker.DockerSandbox",
+    "mypy_playground.sandbox.cloud_functions.CloudFunctionsSandbox",
+    "mypy_playground.sandbox.daemon.DaemonSandbox",
+    "mypy_playground.sandbox.local.LocalSandbox",
+    "mypy_playground.sandbox.hedged.HedgedSandbox",
+]
+
 
 def _parse_pair_str(config: str) -> tuple[str, str]:
     pair = tuple(config.split(":", 1))
@@ -84,10 +94,7 @@ class Settings(BaseSettings):
         toml_file="config.toml",
     )
 
-    sandbox: Literal[
-        "mypy_playground.sandbox.docker.DockerSandbox",
-        "mypy_playground.sandbox.cloud_functions.CloudFunctionsSandbox",
-    ] = Field(
+    sandbox: SandboxName = Field(
         default="mypy_playground.sandbox.docker.DockerSandbox",
         description="Sandbox implementation to use",
     )
@@ -97,6 +104,33 @@ class Settings(BaseSettings):
         description="The number of running sandboxes at the same time",
     )
 
+    sandbox_queue_size: int = Field(
+        default=100,
+        description="Maximum number of requests waiting for a sandbox",
+    )
+
+    sandbox_queue_timeout: float = Field(
+        default=30.0,
+        description="Reject requests projected to wait longer than this (seconds)",
+    )
+
+    sandbox_max_output_bytes: int = Field(
+        default=1024 * 1024,
+        description="Maximum size of stdout and stderr each in bytes; "
+        "longer output is truncated (0 disables)",
+    )
+
+    compression_min_size: int = Field(
+        default=1024,
+        description="Minimum size in bytes of type-check responses to compress "
+        "(0 disables)",
+    )
+
+    sandbox_version_weights: dict[str, int] = Field(
+        default={},
+        description="Share of sandboxes per mypy version when busy (1 by default)",
+    )
+
     default_python_version: str = Field(
         default="3.14",
         description="Default Python version",
@@ -142,6 +176,195 @@ class Settings(BaseSettings):
         description="Docker images used by DockerSandbox",
     )
 
+    docker_pool_size: int = Field(
+        default=0,
+        description="Number of pre-created containers per mypy version (0 disables)",
+    )
+
+    docker_pool_sizes: dict[str, int] = Field(
+        default={},
+        description="Number of pre-created containers for specific mypy versions",
+    )
+
+    docker_pool_traffic_budget: int = Field(
+        default=0,
+        description="Extra pre-created containers distributed by recent traffic",
+    )
+
+    docker_reaper_interval: float = Field(
+        default=60.0,
+        description="Interval in seconds between cleanups of orphaned containers "
+        "(0 disables)",
+    )
+
+    docker_reaper_max_age: float = Field(
+        default=600.0,
+        description="Age in seconds after which unused sandbox containers are "
+        "deleted and pre-created containers are replaced",
+    )
+
+    docker_reaper_batch_size: int = Field(
+        default=10,
+        description="Number of orphaned containers deleted concurrently",
+    )
+
+    # DaemonSandbox settings
+    daemon_workers_per_key: int = Field(
+        default=1,
+        description="Number of mypy workers per mypy and Python version",
+    )
+
+    daemon_max_jobs: int = Field(
+        default=200,
+        description="Number of jobs after which a mypy worker is recycled",
+    )
+
+    daemon_max_rss: int = Field(
+        default=256 * 1024 * 1024,
+        description="Peak resident set size of a job above which a mypy worker "
+        "is recycled",
+    )
+
+    daemon_memory_limit: int = Field(
+        default=512 * 1024 * 1024,
+        description="Memory limit of a mypy worker container",
+    )
+
+    daemon_job_timeout: float = Field(
+        default=30.0,
+        description="Seconds after which a mypy worker running a job is killed",
+    )
+
+    daemon_max_idle_workers: int = Field(
+        default=8,
+        description="Maximum number of idle mypy workers of all mypy and Python "
+        "versions, beyond which the least recently used one is recycled",
+    )
+
+    # LocalSandbox settings
+    local_venvs: dict[str, str] = Field(
+        default_factory=lambda: {"latest": sys.prefix},
+        description="Virtualenvs with mypy installed used by LocalSandbox",
+    )
+
+    local_cpu_time_limit: int = Field(
+        default=30,
+        description="CPU time limit in seconds of a local mypy job (0 disables it)",
+    )
+
+    local_memory_limit: int = Field(
+        default=1024 * 1024 * 1024,
+        description="Address space limit in bytes of a local mypy job (0 disables it)",
+    )
+
+    local_process_limit: int = Field(
+        default=1,
+        description="Limit of processes of the user running a local mypy job, "
+        "which prevents it from starting processes (0 disables it)",
+    )
+
+    local_job_timeout: float = Field(
+        default=30.0,
+        description="Seconds after which a local mypy worker running a job is killed",
+    )
+
+    local_max_jobs: int = Field(
+        default=200,
+        description="Number of jobs after which a local mypy worker is recycled",
+    )
+
+    local_max_idle_workers: int = Field(
+        default=4,
+        description="Maximum number of idle local mypy workers of all mypy versions, "
+        "beyond which the least recently used one is recycled",
+    )
+
+    local_require_network_namespace: bool = Field(
+        default=False,
+        description="Refuse to start LocalSandbox when local mypy jobs cannot be "
+        "put in a network namespace without interfaces",
+    )
+
+    # HedgedSandbox settings
+    hedged_backends: list[SandboxName] = Field(
+        default=[
+            "mypy_playground.sandbox.docker.DockerSandbox",
+            "mypy_playground.sandbox.cloud_functions.CloudFunctionsSandbox",
+        ],
+        description="Sandbox backends used by HedgedSandbox in the order of preference",
+    )
+
+    hedged_percentile: float = Field(
+        default=95.0,
+        description="Percentile of latencies of the first backend after which "
+        "a request is hedged to the next backend",
+    )
+
+    hedged_initial_delay: float = Field(
+        default=3.0,
+        description="Seconds after which a request is hedged until enough "
+        "latencies are observed",
+    )
+
+    hedged_min_delay: float = Field(
+        default=0.1,
+        description="Minimum seconds before a request is hedged",
+    )
+
+    hedged_window: int = Field(
+        default=200,
+        description="Number of recent latencies per mypy version used for hedging",
+    )
+
+    # Memory management settings
+    memory_check_interval: float = Field(
+        default=5.0,
+        description="Seconds between memory usage checks (0 disables them)",
+    )
+
+    gc_interval: float = Field(
+        default=300.0,
+        description="Seconds after which a full GC runs anyway (0 disables it)",
+    )
+
+    gc_rss_growth_threshold: int = Field(
+        default=64 * 1024 * 1024,
+        description="RSS growth in bytes which triggers a full GC (0 disables it)",
+    )
+
+    gc_object_growth_threshold: int = Field(
+        default=0,
+        description="Growth of GC-tracked objects which triggers a full GC "
+        "(0 disables it)",
+    )
+
+    # Result cache settings
+    cache_max_entries: int = Field(
+        default=1024,
+        description="Maximum number of results kept in memory (0 disables the cache)",
+    )
+
+    cache_max_memory_bytes: int = Field(
+        default=64 * 1024 * 1024,
+        description="Maximum total size of the results kept in memory "
+        "(0 means no limit)",
+    )
+
+    cache_ttl: float = Field(
+        default=24 * 60 * 60,
+        description="Seconds a cached result stays valid",
+    )
+
+    cache_dir: Path | None = Field(
+        default=None,
+        description="Directory for the on-disk result cache (disabled if unset)",
+    )
+
+    cache_disk_max_bytes: int = Field(
+        default=256 * 1024 * 1024,
+        description="Maximum total size of the on-disk result cache",
+    )
+
     # Cloud Functions settings
     cloud_functions_base_url: str | None = Field(
         default=None,
@@ -168,6 +391,37 @@ class Settings(BaseSettings):
         description="Mapping of mypy version IDs to Cloud Function names",
     )
 
+    cloud_functions_max_connections: int = Field(
+        default=100,
+        description="Maximum number of connections to Cloud Functions",
+    )
+
+    cloud_functions_max_keepalive_connections: int = Field(
+        default=20,
+        description="Maximum number of idle connections kept alive",
+    )
+
+    cloud_functions_http2: bool = Field(
+        default=False,
+        description="Use HTTP/2 for Cloud Functions (requires the h2 package)",
+    )
+
+    cloud_functions_connect_timeout: float = Field(
+        default=5.0,
+        description="Timeout in seconds for connecting to Cloud Functions",
+    )
+
+    cloud_functions_read_timeout: float = Field(
+        default=30.0,
+        description="Timeout in seconds for reading a response from Cloud Functions",
+    )
+
+    cloud_functions_cache: bool = Field(
+        default=True,
+        description="Let Cloud Functions keep the mypy cache of the standard "
+        "library in warm instances",
+    )
+
     @field_validator("mypy_versions", mode="before")
     @classmethod
     def parse_mypy_versions(cls, v: Any) -> list[tuple[str, str]]:
@@ -193,10 +447,10 @@ class Settings(BaseSettings):
         # Already validated dict
         return v  # type: ignore[no-any-return]
 
-    @field_validator("docker_images", mode="before")
+    @field_validator("docker_images", "local_venvs", mode="before")
     @classmethod
     def parse_docker_images(cls, v: Any) -> dict[str, str]:
-        """Parse docker_images from various input formats"""
+        """Parse docker_images and local_venvs from various input formats"""
         if isinstance(v, str):
             return dict(DictOption(v))
         if isinstance(v, dict):
@@ -204,6 +458,17 @@ class Settings(BaseSettings):
         # Already validated dict
         return v  # type: ignore[no-any-return]
 
+    @field_validator("docker_pool_sizes", "sandbox_version_weights", mode="before")
+    @classmethod
+    def parse_int_dict(cls, v: Any) -> dict[str, int]:
+        """Parse docker_pool_sizes and sandbox_version_weights"""
+        if isinstance(v, str):
+            return {k: int(val) for k, val in DictOption(v).items()}
+        if isinstance(v, dict):
+            return {str(k): int(val) for k, val in v.items()}
+        # Already validated dict
+        return v  # type: ignore[no-any-return]
+
     @classmethod
     def settings_customise_sources(
         cls,
@@ -4,40 +4,39 @@ from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 
 from mypy_playground.config import get_settings
+from mypy_playground.memory import MemoryManager
 from mypy_playground.middleware import PrometheusMiddleware
 from mypy_playground.routes import api_router, private_router
-from mypy_playground.sandbox.base import AbstractSandbox
-from mypy_playground.sandbox.cloud_functions import CloudFunctionsSandbox
-from mypy_playground.sandbox.docker import DockerSandbox
+from mypy_playground.sandbox.registry import create_sandbox
+from mypy_playground.static import PrecompressedStaticFiles
 
 logger = logging.getLogger(__name__)
 root_dir = Path(__file__).parents[1]
 static_dir = root_dir / "static"
 
 
-def _create_sandbox(sandbox_name: str) -> AbstractSandbox:
-    if sandbox_name == "mypy_playground.sandbox.docker.DockerSandbox":
-        return DockerSandbox()
-    elif (
-        sandbox_name == "mypy_playground.sandbox.cloud_functions.CloudFunctionsSandbox"
-    ):
-        return CloudFunctionsSandbox()
-    raise ValueError(f"Unsupported sandbox: {sandbox_name}")
-
-
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None]:
     """Lifespan context manager for startup and shutdown"""
     settings = get_settings()
     # Startup
     logger.info("Starting up mypy-playground")
-    app.state.sandbox = _create_sandbox(settings.sandbox)
+    app.state.sandbox = create_sandbox(settings.sandbox)
+    await app.state.sandbox.start()
+    memory_manager = MemoryManager(
+        check_interval=settings.memory_check_interval,
+        gc_interval=settings.gc_interval,
+        rss_growth_threshold=settings.gc_rss_growth_threshold,
+        object_growth_threshold=settings.gc_object_growth_threshold,
+    )
+    await memory_manager.start()
     yield
     # Shutdown
     logger.info("Shutting down mypy-playground")
+    await memory_manager.close()
+    await app.state.sandbox.close()
 
 
 settings = get_settings()
@@ -63,6 +62,6 @@ app.include_router(api_router)
 if static_dir.is_dir():
     app.mount(
         "/",
-        StaticFiles(directory=str(static_dir), html=True),
+        PrecompressedStaticFiles(directory=str(static_dir), html=True),
         name="static",
     )
@@ -0,0 +1,167 @@
+"""Memory management of the application process.
+
+CPython 3.14 may not collect cyclic garbage soon enough, which makes
+the memory usage grow over time:
+https://github.com/python/cpython/issues/142516
+
+Instead of running a full collection for every request, MemoryManager
+checks the memory usage periodically in the background and runs a full
+collection when it has grown too much or when a collection is due.
+"""
+
+import asyncio
+import contextlib
+import gc
+import logging
+import os
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+_NAMESPACE = "mypy_play"
+_SUB_SYSTEM = "memory"
+
+_rss_bytes = Gauge(
+    namespace=_NAMESPACE,
+    subsystem=_SUB_SYSTEM,
+    name="rss_bytes",
+    documentation="Resident set size of the process at the last check.",
+)
+_tracked_objects = Gauge(
+    namespace=_NAMESPACE,
+    subsystem=_SUB_SYSTEM,
+    name="tracked_objects",
+    documentation="Number of objects tracked by the GC at the last check.",
+)
+_gc_duration_seconds = Histogram(
+    namespace=_NAMESPACE,
+    subsystem=_SUB_SYSTEM,
+    name="gc_duration_seconds",
+    documentation="Histogram of pauses for full garbage collections.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+_gc_collections_total = Counter(
+    namespace=_NAMESPACE,
+    subsystem=_SUB_SYSTEM,
+    name="gc_collections_total",
+    documentation="Counter of full garbage collections by MemoryManager.",
+    labelnames=("reason",),
+)
+
+
+def get_rss() -> int | None:
+    """Return the resident set size of this process in bytes (Linux only)"""
+    try:
+        with open("/proc/self/statm") as f:
+            fields = f.read().split()
+    except OSError:
+        return None
+    return int(fields[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+class MemoryManager:
+    """Run full garbage collections based on memory growth.
+
+    A collection runs when one of the following holds:
+    - the RSS has grown by rss_growth_threshold bytes since the last one
+    - the number of GC-tracked objects has grown by object_growth_threshold
+    - gc_interval seconds have passed since the last one
+    Thresholds and the interval are disabled when they are 0.
+    """
+
+    def __init__(
+        self,
+        check_interval: float,
+        gc_interval: float = 0,
+        rss_growth_threshold: int = 0,
+        object_growth_threshold: int = 0,
+    ) -> None:
+        self.check_interval = check_interval
+        self.gc_interval = gc_interval
+        self.rss_growth_threshold = rss_growth_threshold
+        self.object_growth_threshold = object_growth_threshold
+        self._task: asyncio.Task[None] | None = None
+        self._last_collection = time.monotonic()
+        self._baseline_rss: int | None = None
+        self._baseline_objects = 0
+
+    async def start(self) -> None:
+        if self.check_interval <= 0:
+            logger.info("memory manager is disabled")
+            return
+        self._update_baseline()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def check(self) -> str | None:
+        """Run a collection if needed and return the reason"""
+        rss = get_rss()
+        if rss is not None:
+            _rss_bytes.set(rss)
+        objects = self._count_objects()
+        if objects is not None:
+            _tracked_objects.set(objects)
+
+        reason = None
+        if (
+            self.rss_growth_threshold > 0
+            and rss is not None
+            and self._baseline_rss is not None
+            and rss - self._baseline_rss >= self.rss_growth_threshold
+        ):
+            reason = "rss"
+        elif (
+            objects is not None
+            and objects - self._baseline_objects >= self.object_growth_threshold
+        ):
+            reason = "objects"
+        elif (
+            self.gc_interval > 0
+            and time.monotonic() - self._last_collection >= self.gc_interval
+        ):
+            reason = "interval"
+
+        if reason is not None:
+            self.collect(reason)
+        return reason
+
+    def collect(self, reason: str) -> None:
+        start_time = time.perf_counter()
+        collected = gc.collect()
+        duration = time.perf_counter() - start_time
+        _gc_duration_seconds.observe(duration)
+        _gc_collections_total.labels(reason).inc()
+        logger.info(
+            "collected garbage: reason=%s, objects=%d, duration=%.1f ms",
+            reason,
+            collected,
+            1000 * duration,
+        )
+        self._last_collection = time.monotonic()
+        self._update_baseline()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                self.check()
+            except Exception:
+                logger.exception("failed to check memory usage")
+
+    def _count_objects(self) -> int | None:
+        # Counting objects visits the whole heap, so it is opt-in
+        if self.object_growth_threshold <= 0:
+            return None
+        return len(gc.get_objects())
+
+    def _update_baseline(self) -> None:
+        self._baseline_rss = get_rss()
+        self._baseline_objects = self._count_objects() or 0
@@ -1,20 +1,53 @@
-import contextlib
 import time
 
-from fastapi import Request
-from prometheus_client import REGISTRY, Counter, Histogram
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram
+from starlette.routing import Mount
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 _NAMESPACE = "mypy_play"
 _SUB_SYSTEM = "http"
 
+# Handler label of requests which did not match any route
+_UNMATCHED = "unmatched"
+# Other methods are labelled "other"
+_METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
 
-class PrometheusMiddleware(BaseHTTPMiddleware):
-    """FastAPI middleware for Prometheus metrics collection"""
 
-    def __init__(self, app, registry=None):  # type: ignore[no-untyped-def]
-        super().__init__(app)
+def _get_handler_name(scope: Scope) -> str:
+    """Get a label for the route which handled the request
+
+    Labels are route templates (e.g. "/api/gist/{gist_id}") or names of
+    mounted applications (e.g. "static"), so the number of time series
+    does not grow with the number of distinct paths.
+    """
+    route = scope.get("route")
+    if route is None:
+        return _get_mount_name(scope)
+    path = getattr(route, "path", None)
+    return path if isinstance(path, str) else _UNMATCHED
+
+
+def _get_mount_name(scope: Scope) -> str:
+    """Get the name of the mount which handled the request
+
+    Mount does not store itself in the scope, but the mounted application
+    as the endpoint, so it is looked up in the routes of the application.
+    """
+    endpoint = scope.get("endpoint")
+    router = getattr(scope.get("app"), "router", None)
+    if endpoint is None or router is None:
+        return _UNMATCHED
+    for route in router.routes:
+        if isinstance(route, Mount) and route.app is endpoint:
+            return route.name or _UNMATCHED
+    return _UNMATCHED
+
+
+class PrometheusMiddleware:
+    """ASGI middleware for Prometheus metrics collection"""
+
+    def __init__(self, app: ASGIApp, registry: CollectorRegistry | None = None) -> None:
+        self.app = app
         self.registry = registry or REGISTRY
 
         self._requests_total_counter = Counter(
@@ -44,30 +77,35 @@ class PrometheusMiddleware(BaseHTTPMiddleware):
             labelnames=("handler", "method"),
         )
 
-    async def dispatch(self, request: Request, call_next):  # type: ignore[no-untyped-def]
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """Collect metrics for each request"""
-        start_time = time.time()
-
-        response: Response = await call_next(request)
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-        duration = time.time() - start_time
-        method = request.method
-        # Use the path as handler name (closest to Tornado's handler name)
-        handler_name = request.url.path
-        status_code = response.status_code
-
-        # Update metrics
-        self._requests_duration_seconds_histogram.labels(handler_name, method).observe(
-            duration
-        )
-        self._requests_total_counter.labels(handler_name, method, status_code).inc()
+        start_time = time.perf_counter()
+        status_code = 500
+        size = 0
 
-        # Get response size from Content-Length header if available
-        content_length = response.headers.get("content-length")
-        if content_length:
-            with contextlib.suppress(ValueError):
-                self._response_size_bytes_histogram.labels(
-                    handler_name, method
-                ).observe(int(content_length))
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
 
-        return response
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start_time
+            method = scope["method"] if scope["method"] in _METHODS else "other"
+            # The router stores the matched route in the scope
+            handler_name = _get_handler_name(scope)
+            self._requests_duration_seconds_histogram.labels(
+                handler_name, method
+            ).observe(duration)
+            self._requests_total_counter.labels(handler_name, method, status_code).inc()
+            self._response_size_bytes_histogram.labels(handler_name, method).observe(
+                size
+            )
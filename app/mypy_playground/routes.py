@@ -1,23 +1,40 @@
+import asyncio
 import dataclasses
+import hashlib
+import json
 import logging
-from typing import Annotated
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Annotated, Any
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from prometheus_client import REGISTRY, exposition
 
 from mypy_playground import gist
+from mypy_playground.bisection import (
+    BisectionError,
+    bisect_versions,
+    get_candidate_versions,
+    make_probe,
+)
+from mypy_playground.compression import compress, select_encoding
 from mypy_playground.config import Settings, get_settings
 from mypy_playground.sandbox import run_typecheck_in_sandbox
 from mypy_playground.sandbox.base import (
     ARGUMENT_FLAGS,
     ARGUMENT_MULTI_SELECT_OPTIONS,
     AbstractSandbox,
+    Result,
 )
+from mypy_playground.sandbox.scheduler import SchedulerOverloadedError
 from mypy_playground.schemas import (
+    BisectRequest,
     ContextResponse,
     GistRequest,
     GistResponse,
+    TypecheckBatchGroup,
+    TypecheckBatchRequest,
+    TypecheckBatchResponse,
     TypecheckRequest,
     TypecheckResponse,
 )
@@ -42,11 +59,14 @@ fib("10")
 api_router = APIRouter(prefix="/api")
 
 
-@api_router.get("/context", response_model=ContextResponse)
-async def get_context(
-    settings: Annotated[Settings, Depends(get_settings)],
-) -> ContextResponse:
-    """Get playground context including available Python and mypy versions"""
+# Cache-Control of /api/context, which changes only when deployed
+_CONTEXT_CACHE_CONTROL = "public, no-cache"
+
+# (settings, body, ETag) of the last /api/context response
+_context_cache: tuple[Settings, bytes, str] | None = None
+
+
+def _build_context(settings: Settings) -> ContextResponse:
     mypy_versions = settings.mypy_versions
     config: dict[str, bool | str | list[str]] = {flag: False for flag in ARGUMENT_FLAGS}
     for option in ARGUMENT_MULTI_SELECT_OPTIONS:
@@ -55,7 +75,7 @@ async def get_context(
     config["pythonVersion"] = settings.default_python_version
 
     # Make sure that the context type matches with app/frontend/types.tsx
-    context = ContextResponse(
+    return ContextResponse(
         defaultConfig=config,
         initialCode=initial_code,
         pythonVersions=settings.python_versions,
@@ -64,19 +84,49 @@ async def get_context(
         multiSelectOptions=ARGUMENT_MULTI_SELECT_OPTIONS,
         gaTrackingId=settings.ga_tracking_id,
     )
-    return context
 
 
-@api_router.post("/typecheck", response_model=TypecheckResponse)
-async def typecheck(
-    request: TypecheckRequest,
-    raw_request: Request,
+def _get_context_body(settings: Settings) -> tuple[bytes, str]:
+    """Get the serialized context and its ETag, built once per settings"""
+    global _context_cache
+    if _context_cache is None or _context_cache[0] is not settings:
+        body = _build_context(settings).model_dump_json().encode("utf-8")
+        etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        _context_cache = (settings, body, etag)
+    return _context_cache[1], _context_cache[2]
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Check If-None-Match, which uses the weak comparison"""
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(",")
+    )
+
+
+@api_router.get(
+    "/context",
+    response_model=ContextResponse,
+    responses={status.HTTP_304_NOT_MODIFIED: {"description": "Not modified"}},
+)
+async def get_context(
+    request: Request,
     settings: Annotated[Settings, Depends(get_settings)],
-) -> TypecheckResponse:
-    """Run mypy type-checking on the provided source code"""
-    sandbox: AbstractSandbox = raw_request.app.state.sandbox
-    source = request.source
+) -> Response:
+    """Get playground context including available Python and mypy versions"""
+    body, etag = _get_context_body(settings)
+    headers = {"ETag": etag, "Cache-Control": _CONTEXT_CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 
+def _get_typecheck_args(
+    request: TypecheckRequest, settings: Settings
+) -> dict[str, str | bool | list[str]]:
+    """Get arguments for the sandbox from the request"""
     args: dict[str, str | bool | list[str]] = {}
     # Validate and add python_version
     if (
@@ -112,7 +162,24 @@ async def typecheck(
         # Use the first item as the default
         args["mypy_version"] = settings.mypy_versions[0][1]
 
-    result = await run_typecheck_in_sandbox(sandbox, source, **args)  # type: ignore[arg-type]
+    return args
+
+
+@api_router.post("/typecheck", response_model=TypecheckResponse)
+async def typecheck(
+    request: TypecheckRequest,
+    raw_request: Request,
+    settings: Annotated[Settings, Depends(get_settings)],
+) -> Response:
+    """Run mypy type-checking on the provided source code"""
+    sandbox: AbstractSandbox = raw_request.app.state.sandbox
+    source = request.source
+    args = _get_typecheck_args(request, settings)
+
+    try:
+        result = await run_typecheck_in_sandbox(sandbox, source, **args)  # type: ignore[arg-type]
+    except SchedulerOverloadedError as e:
+        raise _get_overloaded_exception(e) from e
     if result is None:
         logger.error("an error occurred during running type-check")
         raise HTTPException(
@@ -120,7 +187,275 @@ async def typecheck(
             detail="an error occurred during running mypy",
         )
 
-    return TypecheckResponse(**dataclasses.asdict(result))
+    body = TypecheckResponse(**dataclasses.asdict(result)).model_dump_json()
+    return await _create_json_response(
+        body.encode("utf-8"),
+        raw_request.headers.get("accept-encoding", ""),
+        settings.compression_min_size,
+    )
+
+
+async def _create_json_response(
+    body: bytes, accept_encoding: str, min_size: int
+) -> Response:
+    """Create a JSON response, compressed if it is large enough"""
+    headers = {}
+    if min_size > 0 and len(body) >= min_size:
+        headers["Vary"] = "Accept-Encoding"
+        encoding = select_encoding(accept_encoding)
+        if encoding is not None:
+            # Output of mypy can be megabytes, so do not block the event loop
+            body = await asyncio.to_thread(compress, body, encoding)
+            headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _get_overloaded_exception(e: SchedulerOverloadedError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="the playground is busy, please try again later",
+        headers={"Retry-After": str(e.retry_after_seconds)},
+    )
+
+
+@api_router.post("/typecheck/batch", response_model=TypecheckBatchResponse)
+async def typecheck_batch(
+    request: TypecheckBatchRequest,
+    raw_request: Request,
+    settings: Annotated[Settings, Depends(get_settings)],
+) -> TypecheckBatchResponse:
+    """Run mypy type-checking with multiple mypy versions
+
+    Versions which produced the same output are grouped together.
+    """
+    sandbox: AbstractSandbox = raw_request.app.state.sandbox
+    source = request.source
+    args = _get_typecheck_args(request, settings)
+
+    available_versions = {version for _, version in settings.mypy_versions}
+    mypy_versions = list(dict.fromkeys(request.mypyVersions))
+    if unknown_versions := [v for v in mypy_versions if v not in available_versions]:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail=f"unknown mypy versions: {', '.join(unknown_versions)}",
+        )
+
+    # Do not take more sandboxes (or places in the queue) than a single user can
+    semaphore = asyncio.Semaphore(settings.sandbox_concurrency)
+
+    async def run(mypy_version: str) -> Result | None:
+        async with semaphore:
+            return await run_typecheck_in_sandbox(
+                sandbox,
+                source,
+                **(args | {"mypy_version": mypy_version}),  # type: ignore[arg-type]
+            )
+
+    # Let the other versions finish even if one is rejected to cache them
+    results = await asyncio.gather(
+        *(run(v) for v in mypy_versions), return_exceptions=True
+    )
+
+    groups: dict[tuple[int, str, str], TypecheckBatchGroup] = {}
+    failed_versions = []
+    for mypy_version, result in zip(mypy_versions, results, strict=True):
+        if isinstance(result, SchedulerOverloadedError):
+            raise _get_overloaded_exception(result) from result
+        if isinstance(result, BaseException):
+            raise result
+        if result is None:
+            failed_versions.append(mypy_version)
+            continue
+        key = (result.exit_code, result.stdout, result.stderr)
+        if key not in groups:
+            groups[key] = TypecheckBatchGroup(
+                mypyVersions=[],
+                exit_code=result.exit_code,
+                stdout=result.stdout,
+                stderr=result.stderr,
+            )
+        groups[key].mypyVersions.append(mypy_version)
+    if failed_versions:
+        logger.error("failed to run type-check for mypy versions: %s", failed_versions)
+
+    return TypecheckBatchResponse(
+        groups=list(groups.values()), failedMypyVersions=failed_versions
+    )
+
+
+# Called with an event name and data to send a server-sent event
+SendEvent = Callable[[str, dict[str, Any]], None]
+
+
+def _stream_events(run: Callable[[SendEvent], Awaitable[None]]) -> StreamingResponse:
+    """Stream events sent by run() as server-sent events
+
+    An error event is sent when the sandbox is overloaded or run() fails.
+    """
+    events: asyncio.Queue[str | None] = asyncio.Queue()
+
+    def send(event: str, data: dict[str, Any]) -> None:
+        events.put_nowait(f"event: {event}\ndata: {json.dumps(data)}\n\n")
+
+    async def wrapper() -> None:
+        try:
+            await run(send)
+        except SchedulerOverloadedError as e:
+            send(
+                "error",
+                {
+                    "detail": "the playground is busy, please try again later",
+                    "retryAfter": e.retry_after_seconds,
+                },
+            )
+        except Exception:
+            logger.exception("an unexpected error occurred during streaming")
+            send(
+                "error",
+                {"detail": "an unexpected error occurred", "retryAfter": None},
+            )
+        finally:
+            events.put_nowait(None)
+
+    async def stream() -> AsyncIterator[str]:
+        task = asyncio.create_task(wrapper())
+        try:
+            while (event := await events.get()) is not None:
+                yield event
+        finally:
+            # The client has gone away if the task is still running
+            task.cancel()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@api_router.post("/typecheck/stream")
+async def typecheck_stream(
+    request: TypecheckRequest,
+    raw_request: Request,
+    settings: Annotated[Settings, Depends(get_settings)],
+) -> StreamingResponse:
+    """Run mypy type-checking and stream the progress as server-sent events
+
+    Events:
+    - queued: {"position": int} while waiting for a sandbox
+    - started: {} when mypy starts
+    - output: {"stream": "stdout" | "stderr", "line": str} while mypy runs
+    - result: the same fields as /api/typecheck (the last event)
+    - error: {"detail": str, "retryAfter": int | None} (the last event)
+    """
+    sandbox: AbstractSandbox = raw_request.app.state.sandbox
+    source = request.source
+    args = _get_typecheck_args(request, settings)
+
+    async def run(send: SendEvent) -> None:
+        def on_position(position: int) -> None:
+            if position == 0:
+                send("started", {})
+            else:
+                send("queued", {"position": position})
+
+        def on_output(stream: str, line: str) -> None:
+            send("output", {"stream": stream, "line": line})
+
+        result = await run_typecheck_in_sandbox(
+            sandbox,
+            source,
+            on_position=on_position,
+            on_output=on_output,
+            **args,  # type: ignore[arg-type]
+        )
+        if result is None:
+            logger.error("an error occurred during running type-check")
+            send(
+                "error",
+                {"detail": "an error occurred during running mypy", "retryAfter": None},
+            )
+        else:
+            response = TypecheckResponse(**dataclasses.asdict(result))
+            send("result", response.model_dump())
+
+    return _stream_events(run)
+
+
+@api_router.post("/bisect")
+async def bisect(
+    request: BisectRequest,
+    raw_request: Request,
+    settings: Annotated[Settings, Depends(get_settings)],
+) -> StreamingResponse:
+    """Find the first mypy version whose output differs from an older version
+
+    The range is from oldMypyVersion to newMypyVersion, which must be
+    releases of the same family, such as mypy or basedmypy.  Releases of
+    the family in mypy-versions are bisected in the order of their version
+    numbers; aliases such as latest are skipped.  The range is from the
+    oldest to the newest release of mypy by default.
+    The progress is streamed as server-sent events:
+    - probe: {"mypyVersion": str, "probes": int, "maxProbes": int}
+      before running mypy with a version
+    - result: {"firstChangedVersion": str | None,
+      "lastUnchangedVersion": str | None, "results": {version: result}}
+      (the last event)
+    - error: {"detail": str, "retryAfter": int | None} (the last event)
+    """
+    sandbox: AbstractSandbox = raw_request.app.state.sandbox
+    source = request.source
+    args = _get_typecheck_args(request, settings)
+    del args["mypy_version"]
+
+    available_versions = [version for _, version in settings.mypy_versions]
+    try:
+        versions = get_candidate_versions(
+            available_versions, request.oldMypyVersion, request.newMypyVersion
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT, detail=str(e)
+        ) from None
+
+    probe = make_probe(sandbox, source, **args)
+
+    async def run(send: SendEvent) -> None:
+        def on_progress(mypy_version: str, probes: int, max_probes: int) -> None:
+            send(
+                "probe",
+                {
+                    "mypyVersion": mypy_version,
+                    "probes": probes,
+                    "maxProbes": max_probes,
+                },
+            )
+
+        try:
+            result = await bisect_versions(versions, probe, on_progress)
+        except BisectionError as e:
+            logger.error("an error occurred during bisecting mypy versions")
+            send(
+                "error",
+                {
+                    "detail": f"an error occurred during running mypy {e.mypy_version}",
+                    "retryAfter": None,
+                },
+            )
+            return
+        send(
+            "result",
+            {
+                "firstChangedVersion": result.first_changed,
+                "lastUnchangedVersion": result.last_unchanged,
+                "results": {
+                    v: TypecheckResponse(**dataclasses.asdict(r)).model_dump()
+                    for v, r in result.results.items()
+                },
+            },
+        )
+
+    return _stream_events(run)
 
 
 @api_router.post(
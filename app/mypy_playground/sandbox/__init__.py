@@ -1,38 +1,159 @@
-import asyncio
 import logging
+import time
+from collections.abc import Callable
 from typing import Any
 
 from mypy_playground.config import get_settings
-from mypy_playground.sandbox.base import AbstractSandbox, Result
+from mypy_playground.sandbox.base import (
+    AbstractSandbox,
+    OutputCallback,
+    Result,
+    report_output,
+)
+from mypy_playground.sandbox.cache import (
+    ResultCache,
+    is_cacheable_result,
+    make_cache_key,
+)
+from mypy_playground.sandbox.coalesce import RequestCoalescer
+from mypy_playground.sandbox.metrics import (
+    in_flight,
+    results_total,
+    run_duration_seconds,
+)
+from mypy_playground.sandbox.scheduler import Scheduler
 
 logger = logging.getLogger(__name__)
 
 
-semaphore: asyncio.Semaphore | None = None
+scheduler: Scheduler | None = None
+cache: ResultCache | None = None
+coalescer = RequestCoalescer()
 
 
-def _get_semaphore() -> asyncio.Semaphore:
-    # Lazy initialization of the semaphore to use settings correctly
-    global semaphore
-    if not semaphore:
+def get_scheduler() -> Scheduler:
+    # Lazy initialization of the scheduler to use settings correctly
+    global scheduler
+    if not scheduler:
         settings = get_settings()
-        value = settings.sandbox_concurrency
-        logger.info("created semaphore for sandbox: concurrency=%d", value)
-        semaphore = asyncio.Semaphore(value)
-    return semaphore
+        logger.info(
+            "created scheduler for sandbox: concurrency=%d, queue_size=%d",
+            settings.sandbox_concurrency,
+            settings.sandbox_queue_size,
+        )
+        scheduler = Scheduler(
+            concurrency=settings.sandbox_concurrency,
+            max_queue=settings.sandbox_queue_size,
+            max_wait=settings.sandbox_queue_timeout,
+            versions={version for _, version in settings.mypy_versions},
+            weights=settings.sandbox_version_weights,
+        )
+    return scheduler
+
+
+def _get_cache() -> ResultCache | None:
+    # Lazy initialization of the cache to use settings correctly
+    global cache
+    settings = get_settings()
+    if settings.cache_max_entries <= 0:
+        return None
+    if cache is None:
+        logger.info(
+            "created result cache: max_entries=%d, dir=%s",
+            settings.cache_max_entries,
+            settings.cache_dir,
+        )
+        cache = ResultCache(
+            max_entries=settings.cache_max_entries,
+            ttl=settings.cache_ttl,
+            memory_max_bytes=settings.cache_max_memory_bytes,
+            disk_dir=settings.cache_dir,
+            disk_max_bytes=settings.cache_disk_max_bytes,
+        )
+    return cache
+
+
+async def _get_keys(
+    sandbox: AbstractSandbox, source: str, **kwargs: Any
+) -> tuple[str | None, str | None]:
+    """Get keys for caching and coalescing the request"""
+    mypy_version = kwargs.get("mypy_version")
+    if not isinstance(mypy_version, str):
+        return None, None
+    target = await sandbox.resolve_target(mypy_version)
+    if not isinstance(target, str):
+        # Results for an unresolvable target must not be cached, but it is
+        # still safe to share them between concurrent requests.
+        return None, make_cache_key(f"version:{mypy_version}", source, **kwargs)
+    key = make_cache_key(target, source, **kwargs)
+    return key, key
 
 
 async def run_typecheck_in_sandbox(
     sandbox: AbstractSandbox,
     source: str,
-    semaphore: asyncio.Semaphore | None = None,
+    scheduler: Scheduler | None = None,
+    cache: ResultCache | None = None,
+    on_position: Callable[[int], None] | None = None,
+    on_output: OutputCallback | None = None,
     **kwargs: Any,
 ) -> Result | None:
-    if semaphore is None:
-        logger.debug("using the default semaphore")
-        semaphore = _get_semaphore()
-
-    logger.debug("acquiring semaphore")
-    async with semaphore:
-        logger.debug("acquired semaphore")
-        return await sandbox.run_typecheck(source, **kwargs)
+    """Run type-checking with caching, coalescing and scheduling
+
+    on_position is called with the position in the queue while waiting
+    for a sandbox, and with 0 when mypy starts.  on_output is called with
+    lines of output while mypy runs.  Streamed requests are not coalesced
+    as only one request would receive the output.
+
+    Raises SchedulerOverloadedError when the request cannot be queued.
+    """
+    if scheduler is None:
+        logger.debug("using the default scheduler")
+        scheduler = get_scheduler()
+    if cache is None:
+        cache = _get_cache()
+
+    cache_key, coalescing_key = await _get_keys(sandbox, source, **kwargs)
+    if cache is not None and cache_key is not None:
+        result = await cache.get(cache_key)
+        if result is not None:
+            logger.debug("found a cached result")
+            if on_output is not None:
+                report_output(on_output, result)
+            return result
+
+    mypy_version = kwargs.get("mypy_version")
+    # Unknown versions share a label to bound the number of time series
+    labels = (scheduler.get_queue_name(mypy_version), sandbox.backend)
+
+    async def run() -> Result | None:
+        logger.debug("waiting for a sandbox")
+        async with scheduler.slot(mypy_version, on_position, sandbox.backend):
+            logger.debug("acquired a sandbox")
+            if on_position is not None:
+                on_position(0)
+            start_time = time.perf_counter()
+            with in_flight.labels(*labels).track_inprogress():
+                if on_output is None:
+                    result = await sandbox.run_typecheck(source, **kwargs)
+                else:
+                    result = await sandbox.run_typecheck_streaming(
+                        source, on_output, **kwargs
+                    )
+            run_duration_seconds.labels(*labels).observe(
+                time.perf_counter() - start_time
+            )
+            exit_code = "error" if result is None else str(result.exit_code)
+            results_total.labels(*labels, exit_code).inc()
+        if (
+            cache is not None
+            and cache_key is not None
+            and result is not None
+            and is_cacheable_result(result)
+        ):
+            await cache.set(cache_key, result)
+        return result
+
+    if coalescing_key is None or on_output is not None:
+        return await run()
+    return await coalescer.run(coalescing_key, run)
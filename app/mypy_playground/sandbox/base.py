@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from collections.abc import Callable
 from dataclasses import dataclass
 from typing import Any
 
@@ -91,11 +92,72 @@ class Result:
     duration: int  # in millisecond
 
 
+# Called with the stream name ("stdout" or "stderr") and a line of output
+OutputCallback = Callable[[str, str], None]
+
+
+class OutputLimit:
+    """Keep the first max_bytes of a stream and count the rest (0 disables)"""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.omitted = 0
+
+    def take(self, data: bytes) -> bytes:
+        """Return the part of data within the limit"""
+        if self.max_bytes <= 0:
+            return data
+        kept = data[: max(0, self.max_bytes - self.size)]
+        self.size += len(kept)
+        self.omitted += len(data) - len(kept)
+        return kept
+
+    @property
+    def marker(self) -> str | None:
+        """Line appended to truncated output"""
+        if self.omitted == 0:
+            return None
+        return f"[output truncated: {self.omitted} more bytes]"
+
+
+def truncate_output(output: str, max_bytes: int) -> str:
+    """Truncate output which was loaded at once, adding the marker"""
+    limit = OutputLimit(max_bytes)
+    data = limit.take(output.encode("utf-8"))
+    if limit.marker is None:
+        return output
+    return data.decode("utf-8", errors="ignore") + "\n" + limit.marker
+
+
+def get_mypy_options(python_version: str | None = None, **kwargs: Any) -> list[str]:
+    """Build the command line options of mypy from the request"""
+    options = ["--no-site-packages"]
+    if python_version:
+        options += ["--python-version", f"{python_version}"]
+    for key, value in kwargs.items():
+        if key in ARGUMENT_FLAGS:
+            options.append(f"--{key}")
+        if key in ARGUMENT_MULTI_SELECT_OPTIONS:
+            for v in value:
+                options.append(f"--{key}={v}")
+    return options
+
+
 class AbstractSandbox(ABC):
+    # Name of the sandbox in metrics
+    backend = "unknown"
+
     @abstractmethod
     def __init__(self) -> None:
         pass
 
+    async def start(self) -> None:  # noqa: B027
+        """Start background work (called on application startup)"""
+
+    async def close(self) -> None:  # noqa: B027
+        """Release resources (called on application shutdown)"""
+
     @abstractmethod
     async def run_typecheck(
         self,
@@ -106,3 +168,40 @@ class AbstractSandbox(ABC):
         **kwargs: Any,
     ) -> Result | None:
         pass
+
+    async def run_typecheck_streaming(
+        self,
+        source: str,
+        /,
+        on_output: OutputCallback,
+        mypy_version: str,
+        python_version: str | None = None,
+        **kwargs: Any,
+    ) -> Result | None:
+        """Run type-checking and report lines of output while mypy runs.
+
+        Sandboxes which cannot report output incrementally report all the
+        lines once mypy finishes.
+        """
+        result = await self.run_typecheck(
+            source, mypy_version=mypy_version, python_version=python_version, **kwargs
+        )
+        if result is not None:
+            report_output(on_output, result)
+        return result
+
+    async def resolve_target(self, mypy_version: str) -> str | None:
+        """Resolve a mypy version ID to the concrete target to run.
+
+        The returned string identifies what actually runs mypy (e.g. a Docker
+        image ID), so it changes when an alias like "latest" is updated.
+        Returns None if the target cannot be resolved, which disables caching.
+        """
+        return None
+
+
+def report_output(on_output: OutputCallback, result: Result) -> None:
+    """Report all the lines of output in the result"""
+    for stream, output in (("stdout", result.stdout), ("stderr", result.stderr)):
+        for line in output.splitlines():
+            on_output(stream, line)
@@ -0,0 +1,234 @@
+"""Content-addressed cache of type-checking results.
+
+The output of mypy only depends on the source code, the mypy version,
+the Python version and the flags.  The cache is keyed on a hash of those
+after normalization, with the mypy version resolved to the concrete
+target (e.g. Docker image ID) so that aliases such as "latest" do not
+serve stale results after they move.
+"""
+
+import asyncio
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+from mypy_playground.sandbox.base import (
+    ARGUMENT_FLAGS,
+    ARGUMENT_MULTI_SELECT_OPTIONS,
+    Result,
+)
+from mypy_playground.sandbox.metrics import cache_evictions_total, cache_requests_total
+
+logger = logging.getLogger(__name__)
+
+# Flags producing output which is not a pure function of the input
+# (e.g. timing information).
+_UNCACHEABLE_FLAGS = frozenset({"verbose"})
+
+# Exit codes of mypy which finished type-checking (without or with errors).
+# Others include crashes of mypy or of its worker and kills by the sandbox
+# (e.g. 137 when out of memory), which may not happen again.
+_CACHEABLE_EXIT_CODES = frozenset({0, 1})
+
+# Errors caused by a broken on-disk entry
+_BROKEN_ENTRY_ERRORS = (OSError, ValueError, KeyError, TypeError)
+
+# Evict down to this ratio of the limit to avoid evicting on every write
+_DISK_EVICTION_RATIO = 0.9
+
+
+def make_cache_key(target: str, source: str, **kwargs: Any) -> str | None:
+    """Create a cache key for the given request.
+
+    The order of flags and options and flags set to their default value
+    do not affect the key.  Returns None when the request is not cacheable.
+    """
+    if any(kwargs.get(flag) for flag in _UNCACHEABLE_FLAGS):
+        return None
+    flags = sorted(flag for flag in ARGUMENT_FLAGS if kwargs.get(flag))
+    options = {
+        option: sorted(set(kwargs[option]))
+        for option in ARGUMENT_MULTI_SELECT_OPTIONS
+        if kwargs.get(option)
+    }
+    payload = json.dumps(
+        {
+            "target": target,
+            "source": source,
+            "python_version": kwargs.get("python_version"),
+            "flags": flags,
+            "options": options,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def is_cacheable_result(result: Result) -> bool:
+    """Return whether the result is worth replaying to other requests"""
+    return result.exit_code in _CACHEABLE_EXIT_CODES
+
+
+def _get_size(result: Result) -> int:
+    """Approximate the memory used by a result"""
+    return len(result.stdout.encode("utf-8")) + len(result.stderr.encode("utf-8"))
+
+
+def _get_disk_path(disk_dir: Path, key: str) -> Path:
+    return disk_dir / key[:2] / f"{key}.json"
+
+
+def _scan_disk(disk_dir: Path) -> list[tuple[float, Path, int]]:
+    """Return (mtime, path, size) of all entries on disk"""
+    files = []
+    for path in disk_dir.glob("*/*.json"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime, path, stat.st_size))
+    return files
+
+
+class ResultCache:
+    """Two-tier result cache: bounded in-memory LRU and optional disk"""
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl: float,
+        disk_dir: Path | None = None,
+        disk_max_bytes: int = 0,
+        memory_max_bytes: int = 0,
+    ) -> None:
+        self.max_entries = max_entries
+        self.memory_max_bytes = memory_max_bytes
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        # key -> (created time, result, size)
+        self._entries: OrderedDict[str, tuple[float, Result, int]] = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes: int | None = None
+        self._disk_lock = asyncio.Lock()
+
+    async def get(self, key: str) -> Result | None:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None and now - entry[0] >= self.ttl:
+            self._pop_memory(key)
+            cache_evictions_total.labels("memory", "ttl").inc()
+            entry = None
+        if entry is not None:
+            self._entries.move_to_end(key)
+            cache_requests_total.labels("memory", "hit").inc()
+            return entry[1]
+        cache_requests_total.labels("memory", "miss").inc()
+
+        if self.disk_dir is None:
+            return None
+        disk_entry = await asyncio.to_thread(self._read_disk, self.disk_dir, key, now)
+        if disk_entry is None:
+            cache_requests_total.labels("disk", "miss").inc()
+            return None
+        cache_requests_total.labels("disk", "hit").inc()
+        self._set_memory(key, *disk_entry)
+        return disk_entry[1]
+
+    async def set(self, key: str, result: Result) -> None:
+        created = time.time()
+        self._set_memory(key, created, result)
+        if self.disk_dir is None:
+            return
+        async with self._disk_lock:
+            try:
+                await asyncio.to_thread(
+                    self._write_disk, self.disk_dir, key, created, result
+                )
+            except OSError:
+                logger.exception("failed to write a result to the disk cache")
+
+    def _set_memory(self, key: str, created: float, result: Result) -> None:
+        if self.max_entries <= 0:
+            return
+        size = _get_size(result)
+        if 0 < self.memory_max_bytes < size:
+            return
+        if key in self._entries:
+            self._pop_memory(key)
+        self._entries[key] = (created, result, size)
+        self._memory_bytes += size
+        while len(self._entries) > self.max_entries or (
+            0 < self.memory_max_bytes < self._memory_bytes
+        ):
+            self._pop_memory(next(iter(self._entries)))
+            cache_evictions_total.labels("memory", "size").inc()
+
+    def _pop_memory(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self._memory_bytes -= size
+
+    def _read_disk(
+        self, disk_dir: Path, key: str, now: float
+    ) -> tuple[float, Result] | None:
+        path = _get_disk_path(disk_dir, key)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            created = float(data["created"])
+            result = Result(**data["result"])
+        except FileNotFoundError:
+            return None
+        except _BROKEN_ENTRY_ERRORS:
+            logger.warning("ignoring a broken disk cache entry: %s", path)
+            return None
+        if now - created >= self.ttl:
+            return None
+        return created, result
+
+    def _write_disk(
+        self, disk_dir: Path, key: str, created: float, result: Result
+    ) -> None:
+        path = _get_disk_path(disk_dir, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps(
+            {"created": created, "result": dataclasses.asdict(result)}
+        ).encode("utf-8")
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_bytes(data)
+        try:
+            old_size = path.stat().st_size
+        except FileNotFoundError:
+            old_size = 0
+        os.replace(tmp_path, path)
+
+        if self._disk_bytes is None:
+            self._disk_bytes = sum(size for _, _, size in _scan_disk(disk_dir))
+        else:
+            # An overwritten entry is replaced rather than added
+            self._disk_bytes += len(data) - old_size
+        if self._disk_bytes > self.disk_max_bytes:
+            self._evict_disk(disk_dir)
+
+    def _evict_disk(self, disk_dir: Path) -> None:
+        now = time.time()
+        files = sorted(_scan_disk(disk_dir))
+        total = sum(size for _, _, size in files)
+        target = self.disk_max_bytes * _DISK_EVICTION_RATIO
+        for mtime, path, size in files:
+            if now - mtime >= self.ttl:
+                reason = "ttl"
+            elif total > target:
+                reason = "size"
+            else:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+            cache_evictions_total.labels("disk", reason).inc()
+        self._disk_bytes = total
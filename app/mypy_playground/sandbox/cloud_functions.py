@@ -1,27 +1,61 @@
-import gc
+import importlib.util
+import json
 import time
 import urllib.parse
 from logging import getLogger
 from typing import Any
 
-import google.auth.transport.requests
-import google.oauth2.id_token
 import httpx
 
 from mypy_playground.config import get_settings
 from mypy_playground.sandbox.base import (
-    ARGUMENT_FLAGS,
-    ARGUMENT_MULTI_SELECT_OPTIONS,
     AbstractSandbox,
     Result,
+    get_mypy_options,
+    truncate_output,
+)
+from mypy_playground.sandbox.identity_token import IdentityTokenProvider
+from mypy_playground.sandbox.metrics import (
+    cloud_functions_cache_requests_total,
+    measure_phase,
 )
 
 logger = getLogger(__name__)
 
+# Version IDs whose Cloud Function is updated in place
+_MOVING_VERSION_SUFFIXES = ("latest", "master")
+# Allowance for JSON escaping of the output and the rest of the response
+_RESPONSE_SIZE_FACTOR = 12
+_RESPONSE_SIZE_OVERHEAD = 64 * 1024
+
+
+class ResponseTooLargeError(Exception):
+    pass
+
 
 class CloudFunctionsSandbox(AbstractSandbox):
+    backend = "cloud_functions"
+
     def __init__(self) -> None:
-        pass
+        # Fail with a clearer message than the ImportError of httpx
+        if get_settings().cloud_functions_http2 and not importlib.util.find_spec("h2"):
+            raise RuntimeError(
+                "cloud_functions_http2 requires the h2 package, "
+                "which is installed by: pip install 'httpx[http2]'"
+            )
+        # Shared by all the requests to reuse connections
+        self.client: httpx.AsyncClient | None = None
+        self.identity_tokens = IdentityTokenProvider()
+
+    async def start(self) -> None:
+        if self.client is None:
+            self.client = self._create_client()
+
+    async def close(self) -> None:
+        await self.identity_tokens.close()
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
 
     async def run_typecheck(
         self,
@@ -31,7 +65,6 @@ class CloudFunctionsSandbox(AbstractSandbox):
         python_version: str | None = None,
         **kwargs: Any,
     ) -> Result | None:
-        gc.collect()
         start_time = time.time()
 
         function_url = self._get_cloud_function_url(mypy_version)
@@ -41,60 +74,121 @@ class CloudFunctionsSandbox(AbstractSandbox):
             )
             return None
 
-        token = self._get_identity_token(function_url)
+        try:
+            with measure_phase(mypy_version, self.backend, "token"):
+                token = await self._get_identity_token(function_url)
+        except Exception:
+            logger.error("failed to get an identity token")
+            return None
 
-        args = ["--cache-dir", "/dev/null", "--no-site-packages"]
-        if python_version:
-            args += ["--python-version", f"{python_version}"]
-        for key, value in kwargs.items():
-            if key in ARGUMENT_FLAGS:
-                args.append(f"--{key}")
-            if key in ARGUMENT_MULTI_SELECT_OPTIONS:
-                for v in value:
-                    args.append(f"--{key}={v}")
+        args = ["--cache-dir", "/dev/null", *get_mypy_options(python_version, **kwargs)]
 
+        settings = get_settings()
+        max_output_bytes = settings.sandbox_max_output_bytes
         data = {
             "source": source,
             "options": args,
+            # The function truncates stdout and stderr to this size
+            "max_output_bytes": max_output_bytes,
+            # The function replaces --cache-dir with its own cache
+            "use_cache": settings.cloud_functions_cache,
         }
         headers = {
             "Authorization": f"Bearer {token}",
             "Content-Type": "application/json",
-            "User-Agent": "mypy-playground",  # TODO: Better UA w/ version?
         }
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            try:
-                response = await client.post(
+        client = self.client
+        if client is None:
+            # Not started by the application (e.g. in scripts)
+            client = self.client = self._create_client()
+        try:
+            with measure_phase(mypy_version, self.backend, "request"):
+                async with client.stream(
+                    "POST",
                     function_url,
                     json=data,
                     headers=headers,
-                )
-
-                if response.status_code != 200:
-                    # TODO: better error handling
-                    logger.error(
-                        "unexpected status code from Cloud Functions: %d",
-                        response.status_code,
-                    )
-                    return None
-
-                res_data = response.json()
-                duration = int(1000 * (time.time() - start_time))
-                return Result(
-                    exit_code=res_data["exit_code"],
-                    stdout=res_data["stdout"],
-                    stderr=res_data["stderr"],
-                    duration=duration,
-                )
-            except httpx.HTTPError:
-                logger.exception("HTTP error during Cloud Functions request")
-                return None
-            finally:
-                # Temporary workaround for GC issue in CPython 3.14
-                # that can cause memory usage increase over time.
-                # https://github.com/python/cpython/issues/142516
-                gc.collect()
+                ) as response:
+                    if response.status_code != 200:
+                        # TODO: better error handling
+                        logger.error(
+                            "unexpected status code from Cloud Functions: %d",
+                            response.status_code,
+                        )
+                        return None
+                    body = await self._read_body(response, max_output_bytes)
+
+            res_data = json.loads(body)
+            if isinstance(cache := res_data.get("cache"), dict):
+                cloud_functions_cache_requests_total.labels(
+                    mypy_version, "hit" if cache.get("hit") else "miss"
+                ).inc()
+            duration = int(1000 * (time.time() - start_time))
+            stdout, stderr = res_data["stdout"], res_data["stderr"]
+            # Functions deployed before the limit was added return everything
+            if "omitted_bytes" not in res_data:
+                stdout = truncate_output(stdout, max_output_bytes)
+                stderr = truncate_output(stderr, max_output_bytes)
+            return Result(
+                exit_code=res_data["exit_code"],
+                stdout=stdout,
+                stderr=stderr,
+                duration=duration,
+            )
+        except httpx.HTTPError:
+            logger.exception("HTTP error during Cloud Functions request")
+            return None
+        except ResponseTooLargeError:
+            logger.exception("too large response from Cloud Functions")
+            return None
+
+    async def _read_body(
+        self, response: httpx.Response, max_output_bytes: int
+    ) -> bytes:
+        """Read a response body, giving up once it cannot fit in the limit"""
+        if max_output_bytes <= 0:
+            return await response.aread()
+        max_size = _RESPONSE_SIZE_FACTOR * max_output_bytes + _RESPONSE_SIZE_OVERHEAD
+        chunks = []
+        size = 0
+        async for chunk in response.aiter_bytes():
+            size += len(chunk)
+            if size > max_size:
+                raise ResponseTooLargeError(f"more than {max_size} bytes")
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    async def resolve_target(self, mypy_version: str) -> str | None:
+        # Functions for aliases such as "latest" are redeployed in place when
+        # the alias moves, so their URL does not identify the mypy version.
+        if mypy_version.endswith(_MOVING_VERSION_SUFFIXES):
+            return None
+        return self._get_cloud_function_url(mypy_version)
+
+    def _create_client(self) -> httpx.AsyncClient:
+        settings = get_settings()
+        logger.info(
+            "creating HTTP client for Cloud Functions: max_connections=%d, http2=%s",
+            settings.cloud_functions_max_connections,
+            settings.cloud_functions_http2,
+        )
+        return httpx.AsyncClient(
+            headers={
+                "User-Agent": "mypy-playground",  # TODO: Better UA w/ version?
+            },
+            http2=settings.cloud_functions_http2,
+            limits=httpx.Limits(
+                max_connections=settings.cloud_functions_max_connections,
+                max_keepalive_connections=(
+                    settings.cloud_functions_max_keepalive_connections
+                ),
+            ),
+            timeout=httpx.Timeout(
+                settings.cloud_functions_read_timeout,
+                connect=settings.cloud_functions_connect_timeout,
+            ),
+        )
 
     def _get_cloud_function_url(self, mypy_version_id: str) -> str | None:
         settings = get_settings()
@@ -108,14 +202,12 @@ class CloudFunctionsSandbox(AbstractSandbox):
 
         return urllib.parse.urljoin(base_url, name)
 
-    def _get_identity_token(self, url: str) -> str:
+    async def _get_identity_token(self, url: str) -> str:
         """Get identity token to invoke a Cloud Function.
 
         1. Get a token given via options (development use).
-        2. Use google-auth library to get a token.
+        2. Use google-auth library to get a token (cached).
         3. Raises an exception if all of the above fails.
-
-        https://cloud.google.com/functions/docs/securing/authenticating
         """
         # 1. Options
         settings = get_settings()
@@ -123,14 +215,4 @@ class CloudFunctionsSandbox(AbstractSandbox):
             return token
 
         # 2. google-auth library
-        # Experimental async support
-        # https://googleapis.dev/python/google-auth/latest/reference/google.auth.transport._aiohttp_requests.html
-        auth_req = google.auth.transport.requests.Request()
-        # Get a token or raise an exception
-        if isinstance(
-            token := google.oauth2.id_token.fetch_id_token(auth_req, url),  # type: ignore[no-untyped-call]
-            str,
-        ):
-            return token
-
-        raise Exception("failed to get identity token")
+        return await self.identity_tokens.get(url)
@@ -0,0 +1,69 @@
+"""Coalescing of identical in-flight type-checking requests.
+
+When many identical requests arrive at the same time (e.g. a popular
+shared snippet), only the first one runs in a sandbox and its result is
+fanned out to all of them.
+"""
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+
+from mypy_playground.sandbox.base import Result
+from mypy_playground.sandbox.metrics import coalesced_requests_total
+
+logger = logging.getLogger(__name__)
+
+
+class _InflightJob:
+    def __init__(self, task: asyncio.Task[Result | None]) -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class RequestCoalescer:
+    """Share a single execution between concurrent requests with the same key.
+
+    The execution runs in its own task, so cancelling the request which
+    started it does not affect the other waiters.  The execution is
+    cancelled only when all the waiters are gone.  Errors are propagated
+    to all the waiters and are not reused by later requests.
+    """
+
+    def __init__(self) -> None:
+        self._jobs: dict[str, _InflightJob] = {}
+
+    async def run(
+        self, key: str, func: Callable[[], Awaitable[Result | None]]
+    ) -> Result | None:
+        job = self._jobs.get(key)
+        if job is None:
+            job = self._start(key, func)
+        else:
+            logger.debug("joining an in-flight request")
+            coalesced_requests_total.inc()
+
+        job.waiters += 1
+        try:
+            return await asyncio.shield(job.task)
+        finally:
+            job.waiters -= 1
+            if job.waiters == 0 and not job.task.done():
+                logger.debug("cancelling an in-flight request without waiters")
+                self._remove(key, job)
+                job.task.cancel()
+
+    def _start(
+        self, key: str, func: Callable[[], Awaitable[Result | None]]
+    ) -> _InflightJob:
+        async def wrapper() -> Result | None:
+            return await func()
+
+        job = _InflightJob(asyncio.create_task(wrapper()))
+        job.task.add_done_callback(lambda _: self._remove(key, job))
+        self._jobs[key] = job
+        return job
+
+    def _remove(self, key: str, job: _InflightJob) -> None:
+        if self._jobs.get(key) is job:
+            del self._jobs[key]
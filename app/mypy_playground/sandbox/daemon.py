@@ -0,0 +1,231 @@
+"""Sandbox keeping warm mypy workers in long-lived containers.
+
+Each worker container runs daemon_worker.py, which imports mypy once
+and type-checks each job in a forked child.  Jobs are sent over the
+container's attached stdio stream, as the container has no network.
+A worker is recycled after a number of jobs, when a job uses too much
+memory, when too many workers are idle, or when a job fails or times out.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict, defaultdict, deque
+from pathlib import Path
+from typing import Any
+
+import aiodocker
+from aiodocker.stream import Stream
+
+from mypy_playground.config import get_settings
+from mypy_playground.sandbox.base import AbstractSandbox, Result, get_mypy_options
+from mypy_playground.sandbox.docker import WORKER_LABEL, DockerSandbox
+from mypy_playground.sandbox.metrics import (
+    daemon_worker_recycles_total,
+    measure_phase,
+)
+
+logger = logging.getLogger(__name__)
+
+_WORKER_SOURCE = (Path(__file__).parent / "daemon_worker.py").read_text()
+
+# Errors after which a worker is in an unknown state
+_WORKER_ERRORS = (aiodocker.exceptions.DockerError, ConnectionError, ValueError)
+
+_WorkerKey = tuple[str, str | None]
+
+
+class _Worker:
+    """A worker container and the stream attached to it"""
+
+    def __init__(self, container: Any, stream: Stream) -> None:
+        self.container = container
+        self.stream = stream
+        self.jobs = 0
+        self.rss = 0
+        self._buffer = b""
+
+    async def run(self, job: dict[str, Any]) -> dict[str, Any]:
+        await self.stream.write_in(json.dumps(job).encode("utf-8") + b"\n")
+        while b"\n" not in self._buffer:
+            message = await self.stream.read_out()
+            if message is None:
+                raise ConnectionError("mypy worker exited unexpectedly")
+            self._buffer += message.data
+        line, _, self._buffer = self._buffer.partition(b"\n")
+        self.jobs += 1
+        response: dict[str, Any] = json.loads(line)
+        self.rss = int(response.pop("rss", 0))
+        return response
+
+
+class DaemonSandbox(DockerSandbox):
+    """Run mypy in warm workers per mypy version and Python version"""
+
+    backend = "daemon"
+
+    def __init__(self) -> None:
+        super().__init__()
+        # Workers are long-lived, so pre-created containers are not used
+        self.pool = None
+        self._idle_workers: defaultdict[_WorkerKey, deque[_Worker]] = defaultdict(deque)
+        # Idle worker -> key, from the least recently used one
+        self._idle_order: OrderedDict[_Worker, _WorkerKey] = OrderedDict()
+        self._slots: dict[_WorkerKey, asyncio.Semaphore] = {}
+        self._retiring: set[asyncio.Task[None]] = set()
+
+    # Workers report the output once mypy finishes
+    run_typecheck_streaming = AbstractSandbox.run_typecheck_streaming
+
+    async def close(self) -> None:
+        for key in list(self._idle_workers):
+            for worker in self._idle_workers.pop(key):
+                self._retire(worker, "shutdown")
+        self._idle_order.clear()
+        if self._retiring:
+            await asyncio.gather(*self._retiring)
+        await super().close()
+
+    async def run_typecheck(
+        self,
+        source: str,
+        /,
+        mypy_version: str,
+        python_version: str | None = None,
+        **kwargs: Any,
+    ) -> Result | None:
+        start_time = time.time()
+        settings = get_settings()
+
+        docker_image = self._get_docker_image(mypy_version)
+        if docker_image is None:
+            logger.error(
+                "cannot find a docker image for mypy version: %s", mypy_version
+            )
+            return None
+
+        key = (docker_image, python_version)
+        if key not in self._slots:
+            self._slots[key] = asyncio.Semaphore(settings.daemon_workers_per_key)
+        job = {
+            "source": source,
+            "options": get_mypy_options(python_version, **kwargs),
+            "max_output_bytes": settings.sandbox_max_output_bytes,
+        }
+
+        async with self._slots[key]:
+            idle_workers = self._idle_workers[key]
+            worker = None
+            if idle_workers:
+                worker = idle_workers.pop()
+                del self._idle_order[worker]
+            try:
+                if worker is None:
+                    with measure_phase(mypy_version, self.backend, "spawn"):
+                        worker = await self._spawn(docker_image)
+                with measure_phase(mypy_version, self.backend, "run"):
+                    response = await asyncio.wait_for(
+                        worker.run(job), timeout=settings.daemon_job_timeout
+                    )
+            except TimeoutError:
+                logger.error("mypy worker timed out")
+                if worker is not None:
+                    self._retire(worker, "timeout")
+                return None
+            except _WORKER_ERRORS:
+                logger.exception("mypy worker error")
+                if worker is not None:
+                    self._retire(worker, "error")
+                return None
+            except asyncio.CancelledError:
+                # The response to the job may still arrive later
+                if worker is not None:
+                    self._retire(worker, "cancelled")
+                raise
+
+            if worker.jobs >= settings.daemon_max_jobs:
+                self._retire(worker, "jobs")
+            elif worker.rss >= settings.daemon_max_rss:
+                self._retire(worker, "memory")
+            else:
+                self._add_idle_worker(key, worker)
+
+        duration = int(1000 * (time.time() - start_time))
+        logger.info("finished in %d ms", duration)
+        return Result(
+            exit_code=response["exit_code"],
+            stdout=response["stdout"].strip(),
+            stderr=response["stderr"].strip(),
+            duration=duration,
+        )
+
+    async def _on_image_updated(self, docker_image: str) -> None:
+        for (image, _), idle_workers in self._idle_workers.items():
+            if image != docker_image:
+                continue
+            while idle_workers:
+                worker = idle_workers.pop()
+                del self._idle_order[worker]
+                self._retire(worker, "image")
+
+    def _add_idle_worker(self, key: _WorkerKey, worker: _Worker) -> None:
+        self._idle_workers[key].append(worker)
+        self._idle_order[worker] = key
+        # Workers of rarely used versions do not stay forever
+        while len(self._idle_order) > get_settings().daemon_max_idle_workers:
+            oldest, oldest_key = self._idle_order.popitem(last=False)
+            self._idle_workers[oldest_key].remove(oldest)
+            self._retire(oldest, "idle")
+
+    async def _spawn(self, docker_image: str) -> _Worker:
+        settings = get_settings()
+        logger.info("starting a mypy worker: %s", docker_image)
+        config = {
+            "Image": docker_image,
+            "Cmd": ["python", "-c", _WORKER_SOURCE],
+            "OpenStdin": True,
+            # The worker exits once the owner is disconnected, even if it
+            # crashed, and the daemon removes the container
+            "StdinOnce": True,
+            "AttachStdin": True,
+            "AttachStdout": True,
+            "HostConfig": {
+                "AutoRemove": True,
+                "CapDrop": ["ALL"],
+                "Memory": settings.daemon_memory_limit,
+                "NetworkMode": "none",
+                "PidsLimit": 32,
+                "SecurityOpt": ["no-new-privileges"],
+                "Tmpfs": {"/tmp": "rw,exec,size=128m"},  # noqa: S108
+            },
+            # Found by the reaper if it is left behind
+            "Labels": {**self._get_labels(), WORKER_LABEL: "1"},
+        }
+        c: Any = await self.client.containers.create(config=config)  # type: ignore
+        self.containers_in_use.add(c.id)
+        try:
+            await c.start()
+            stream = c.attach(stdin=True, stdout=True)
+        except aiodocker.exceptions.DockerError:
+            await self._delete_container(c)
+            raise
+        return _Worker(c, stream)
+
+    def _retire(self, worker: _Worker, reason: str) -> None:
+        """Stop and delete the worker container in the background"""
+        logger.info("recycling a mypy worker: reason=%s, jobs=%d", reason, worker.jobs)
+        daemon_worker_recycles_total.labels(reason).inc()
+
+        async def retire() -> None:
+            await worker.stream.close()
+            try:
+                await self._delete_container(worker.container)
+            except aiodocker.exceptions.DockerError as e:
+                # It may have exited and been removed by the daemon already
+                if e.status not in (404, 409):
+                    logger.exception("failed to delete a mypy worker. ignoring.")
+
+        task = asyncio.create_task(retire())
+        self._retiring.add(task)
+        task.add_done_callback(self._retiring.discard)
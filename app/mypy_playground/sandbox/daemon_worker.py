@@ -0,0 +1,252 @@
+"""Long-lived mypy worker for DaemonSandbox and LocalSandbox.
+
+This script runs inside a sandbox container, or as a local process, and
+is not imported by the application.  It reads one JSON job per line from
+stdin and writes one JSON result per line to stdout.  mypy is imported
+once, and every job runs in a forked child so no state is carried over
+between jobs except for the incremental cache of the standard library.
+
+Jobs may ask for resource limits of the child and for blocking network
+access, which local processes need as they are not in a container.
+
+This module should be able to run on Python 3.8 and later.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+# Each local worker has its own directory
+BASE_DIR = os.environ.get("MYPY_WORKER_DIR", "/tmp")  # noqa: S108
+WORK_DIR = os.path.join(BASE_DIR, "work")
+CACHE_DIR = os.path.join(BASE_DIR, "cache")
+SOURCE_FILE_NAME = "main.py"
+# /tmp of containers is a small tmpfs, so the number of caches is limited
+CACHE_MAX_PROFILES = int(os.environ.get("MYPY_CACHE_MAX_PROFILES", "4"))
+# Name in jobs -> resource limited by it
+RESOURCE_LIMITS = {
+    "cpu": resource.RLIMIT_CPU,
+    "as": resource.RLIMIT_AS,
+    "nproc": resource.RLIMIT_NPROC,
+}
+CLONE_NEWNET = 0x40000000
+
+
+def get_base_cache_dir(options: List[str]) -> str:
+    # Cached data depends on options, so use a separate cache per options
+    digest = hashlib.sha256(json.dumps(sorted(options)).encode()).hexdigest()
+    return os.path.join(CACHE_DIR, "base", digest[:16])
+
+
+def truncate(output: str, max_bytes: int) -> str:
+    """Keep the first max_bytes of output (0 means no limit)"""
+    data = output.encode("utf-8")
+    if max_bytes <= 0 or len(data) <= max_bytes:
+        return output
+    omitted = len(data) - max_bytes
+    return (
+        data[:max_bytes].decode("utf-8", errors="ignore")
+        + "\n[output truncated: %d more bytes]" % omitted
+    )
+
+
+def set_limits(limits: Dict[str, int]) -> None:
+    for name, value in limits.items():
+        if value > 0:
+            resource.setrlimit(RESOURCE_LIMITS[name], (value, value))
+
+
+def block_network() -> bool:
+    """Block network access of this process.
+
+    Return whether it is in a new network namespace, as otherwise only the
+    audit hook blocks sockets, which native code can bypass.
+    """
+    # A new network namespace has no interfaces, but it needs privileges
+    isolated = False
+    unshare = getattr(os, "unshare", None)
+    if unshare is not None:
+        with contextlib.suppress(OSError):
+            unshare(CLONE_NEWNET)
+            isolated = True
+
+    def hook(event: str, args: Tuple[Any, ...]) -> None:
+        if event.startswith("socket."):
+            raise PermissionError("network access is not allowed")
+
+    # Audit hooks cannot be removed once added
+    sys.addaudithook(hook)
+    return isolated
+
+
+def run_child(
+    source: str,
+    options: List[str],
+    cache_dir: str,
+    max_bytes: int,
+    limits: Dict[str, int],
+    no_network: bool,
+    fd: int,
+) -> None:
+    import mypy.api
+
+    # Nothing but the protocol must be written to stdout
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+    set_limits(limits)
+    isolated = block_network() if no_network else None
+
+    os.makedirs(WORK_DIR, exist_ok=True)
+    os.chdir(WORK_DIR)
+    with open(SOURCE_FILE_NAME, "w") as f:
+        f.write(source)
+    stdout, stderr, exit_code = mypy.api.run(
+        ["--cache-dir", cache_dir] + options + [SOURCE_FILE_NAME]
+    )
+    with os.fdopen(fd, "w") as w:
+        json.dump(
+            {
+                "exit_code": exit_code,
+                "stdout": truncate(stdout, max_bytes),
+                "stderr": truncate(stderr, max_bytes),
+                "network_namespace": isolated,
+            },
+            w,
+        )
+
+
+def run_mypy(
+    source: str,
+    options: List[str],
+    cache_dir: str,
+    max_bytes: int = 0,
+    limits: Optional[Dict[str, int]] = None,
+    no_network: bool = False,
+) -> Dict[str, Any]:
+    """Run mypy in a forked child process"""
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        try:
+            run_child(
+                source, options, cache_dir, max_bytes, limits or {}, no_network, w
+            )
+        finally:
+            os._exit(0)
+    os.close(w)
+    with os.fdopen(r) as f:
+        data = f.read()
+    _, status, usage = os.wait4(pid, 0)
+
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    if not data:
+        result: Dict[str, Any] = {
+            "exit_code": 2,
+            "stdout": "",
+            "stderr": f"mypy worker crashed (status: {status})",
+        }
+    else:
+        result = json.loads(data)
+    # Peak resident set size of the child in bytes (ru_maxrss is in KiB)
+    result["rss"] = usage.ru_maxrss * 1024
+    return result
+
+
+def build_base_cache(
+    options: List[str],
+    base_cache_dir: str,
+    limits: Dict[str, int],
+    no_network: bool,
+) -> None:
+    """Analyze the standard library with an empty module and keep the cache"""
+    parent_dir = os.path.dirname(base_cache_dir)
+    os.makedirs(parent_dir, exist_ok=True)
+    # Written elsewhere and renamed, so a partial cache is never used
+    build_dir = tempfile.mkdtemp(dir=parent_dir, prefix="build-")
+    try:
+        result = run_mypy("", options, build_dir, limits=limits, no_network=no_network)
+        if result["exit_code"] == 0:
+            evict_base_caches(parent_dir)
+            os.rename(build_dir, base_cache_dir)
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+
+
+def evict_base_caches(parent_dir: str) -> None:
+    """Delete the least recently used caches to make room for a new one"""
+    base_dirs = [
+        os.path.join(parent_dir, name)
+        for name in os.listdir(parent_dir)
+        if not name.startswith("build-")
+    ]
+    base_dirs.sort(key=os.path.getmtime)
+    for base_dir in base_dirs[: max(0, len(base_dirs) - CACHE_MAX_PROFILES + 1)]:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+
+def copy_base_cache(base_cache_dir: str, job_cache_dir: str) -> None:
+    """Copy the base cache for a job, leaving the job without one on failure"""
+    if not os.path.isdir(base_cache_dir):
+        return
+    try:
+        shutil.copytree(base_cache_dir, job_cache_dir)
+    except OSError:
+        # e.g. /tmp is full; the job still runs without the warm cache
+        shutil.rmtree(job_cache_dir, ignore_errors=True)
+        return
+    # Used for the least recently used eviction
+    os.utime(base_cache_dir)
+
+
+def run_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    source = job["source"]
+    options = job["options"]
+
+    # The standard library is analyzed once per options with an empty module.
+    # Each job works on a throwaway copy of that cache, so the user's module
+    # is never reused by another job regardless of the cache format.
+    base_cache_dir = get_base_cache_dir(options)
+    limits = job.get("limits", {})
+    no_network = job.get("block_network", False)
+    if not os.path.isdir(base_cache_dir):
+        with contextlib.suppress(OSError):
+            build_base_cache(options, base_cache_dir, limits, no_network)
+    job_cache_dir = os.path.join(CACHE_DIR, "job")
+    shutil.rmtree(job_cache_dir, ignore_errors=True)
+    copy_base_cache(base_cache_dir, job_cache_dir)
+    try:
+        return run_mypy(
+            source,
+            options,
+            job_cache_dir,
+            job.get("max_output_bytes", 0),
+            limits,
+            no_network,
+        )
+    finally:
+        shutil.rmtree(job_cache_dir, ignore_errors=True)
+
+
+def main() -> None:
+    # Import mypy in the parent so forked children start with it loaded
+    import mypy.api  # noqa: F401
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        result = run_job(json.loads(line))
+        sys.stdout.write(json.dumps(result) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
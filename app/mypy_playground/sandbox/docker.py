@@ -1,33 +1,157 @@
+import asyncio
+import codecs
+import contextlib
+import json
 import logging
-import tarfile
 import time
-from io import BytesIO
-from pathlib import Path
-from typing import Any
+import uuid
+from pathlib import Path, PurePosixPath
+from typing import TYPE_CHECKING, Any
 
 import aiodocker
+import aiohttp
+from aiodocker.stream import Stream
 
 from mypy_playground.config import get_settings
 from mypy_playground.sandbox.base import (
     ARGUMENT_FLAGS,
     ARGUMENT_MULTI_SELECT_OPTIONS,
     AbstractSandbox,
+    OutputCallback,
+    OutputLimit,
     Result,
+    get_mypy_options,
 )
+from mypy_playground.sandbox.docker_pool import ContainerPool
+from mypy_playground.sandbox.metrics import measure_phase
+
+if TYPE_CHECKING:
+    from mypy_playground.sandbox.docker_reaper import ContainerReaper
 
 logger = logging.getLogger(__name__)
 
+# How long a resolved image ID is reused before inspecting the image again
+_IMAGE_RESOLVE_INTERVAL = 60.0
+
+# Sandbox images may contain a pre-built mypy cache of the standard library
+# in this directory for each Python version and cache profile.
+_MYPY_CACHE_DIR = PurePosixPath("/opt/mypy-cache")
+# Flags which do not affect the cached data of the standard library
+_CACHE_NEUTRAL_FLAGS = frozenset(
+    {
+        "verbose",
+        "show-error-context",
+        "stats",
+        "inferstats",
+        "version",
+        "show-traceback",
+        "scripts-are-modules",
+        "show-column-numbers",
+        "show-error-codes",
+    }
+)
+# Cache-affecting flags -> name of the pre-built cache profile
+_CACHE_PROFILES = {
+    frozenset(): "default",
+    frozenset({"strict"}): "strict",
+}
+
+# Labels of containers for finding orphaned ones
+OWNER_LABEL = "mypy-playground.owner"
+CREATED_LABEL = "mypy-playground.created"
+# Long-lived workers of DaemonSandbox, which exit when their owner is gone
+WORKER_LABEL = "mypy-playground.worker"
+
+# Errors of the Docker API, including ones of attached connections
+_DOCKER_ERRORS = (aiodocker.exceptions.DockerError, aiohttp.ClientError)
+
+# Stream IDs of multiplexed output of containers
+_STREAMS = {1: "stdout", 2: "stderr"}
+
+# Containers are created before the arguments for mypy are known,
+# so this script reads them from stdin, followed by the source code:
+# a line of the job in JSON, and then "size" bytes of the source code.
+# The source code is written to /tmp, which is a tmpfs mount.
+# The pre-built cache is used only if the image contains it.
+# It should be able to run on Python 3.8 and later.
+_RUNNER = """\
+import json, os, sys
+job = json.loads(sys.stdin.buffer.readline())
+with open(job["path"], "wb") as f:
+    f.write(sys.stdin.buffer.read(job["size"]))
+cache_dir = job.get("cache_dir")
+if not (cache_dir and os.path.isdir(cache_dir)):
+    cache_dir = "/dev/null"
+os.execvp("mypy", ["mypy", "--cache-dir", cache_dir] + job["args"])
+"""
+
 
 class DockerSandbox(AbstractSandbox):
+    backend = "docker"
+
     client: aiodocker.Docker
     source_file_path: Path
+    pool: ContainerPool | None
+    # Unique ID of this instance for labeling containers
+    instance_id: str
+    # IDs of containers which are pooled or running
+    containers_in_use: set[str]
+    # image name -> (resolved time, image ID)
+    _image_ids: dict[str, tuple[float, str]]
 
     def __init__(self) -> None:
         self.client = aiodocker.Docker()
+        self._image_ids = {}
+        self.instance_id = uuid.uuid4().hex
+        self.containers_in_use = set()
+        # Deletion of exited containers
+        self._deleting: set[asyncio.Task[None]] = set()
+        # Started with the sandbox
+        self.reaper: ContainerReaper | None = None
         # It should be fine to hardcode the temp path for now,
         # as we recreate a Docker container every time we run mypy.
         self.source_file_path = Path("/tmp/main.py")  # noqa: S108
 
+        settings = get_settings()
+        self.pool = None
+        if (
+            settings.docker_pool_size > 0
+            or any(size > 0 for size in settings.docker_pool_sizes.values())
+            or settings.docker_pool_traffic_budget > 0
+        ):
+            self.pool = ContainerPool(
+                self._create_container,
+                self._delete_container,
+                max_age=settings.docker_reaper_max_age,
+            )
+
+    async def start(self) -> None:
+        # Imported here as the reaper module depends on this module
+        from mypy_playground.sandbox.docker_reaper import ContainerReaper
+
+        settings = get_settings()
+        self.reaper = ContainerReaper(
+            self,
+            interval=settings.docker_reaper_interval,
+            max_age=settings.docker_reaper_max_age,
+            batch_size=settings.docker_reaper_batch_size,
+        )
+        await self.reaper.start()
+        if self.pool is not None:
+            logger.info("starting the container pool")
+            await self.pool.start()
+
+    async def close(self) -> None:
+        if self.reaper is not None:
+            await self.reaper.close()
+            self.reaper = None
+        if self.pool is not None:
+            logger.info("closing the container pool")
+            await self.pool.close()
+        if self._deleting:
+            await asyncio.gather(*self._deleting)
+        await self.client.close()
+
     async def run_typecheck(
         self,
         source: str,
@@ -35,6 +159,29 @@ class DockerSandbox(AbstractSandbox):
         mypy_version: str,
         python_version: str | None = None,
         **kwargs: Any,
+    ) -> Result | None:
+        return await self._run(source, None, mypy_version, python_version, **kwargs)
+
+    async def run_typecheck_streaming(
+        self,
+        source: str,
+        /,
+        on_output: OutputCallback,
+        mypy_version: str,
+        python_version: str | None = None,
+        **kwargs: Any,
+    ) -> Result | None:
+        return await self._run(
+            source, on_output, mypy_version, python_version, **kwargs
+        )
+
+    async def _run(
+        self,
+        source: str,
+        on_output: OutputCallback | None,
+        mypy_version: str,
+        python_version: str | None = None,
+        **kwargs: Any,
     ) -> Result | None:
         start_time = time.time()
 
@@ -45,51 +192,64 @@ class DockerSandbox(AbstractSandbox):
             )
             return None
 
-        cmd = ["mypy", "--cache-dir", "/dev/null", "--no-site-packages"]
-        if python_version:
-            cmd += ["--python-version", f"{python_version}"]
-        for key, value in kwargs.items():
-            if key in ARGUMENT_FLAGS:
-                cmd.append(f"--{key}")
-            if key in ARGUMENT_MULTI_SELECT_OPTIONS:
-                for v in value:
-                    cmd.append(f"--{key}={v}")
-        cmd.append(self.source_file_path.name)
-
-        config = {
-            "Image": docker_image,
-            "Cmd": cmd,
-            "HostConfig": {
-                "CapDrop": ["ALL"],
-                "Memory": 128 * 1024 * 1024,
-                "NetworkMode": "none",
-                "PidsLimit": 32,
-                "SecurityOpt": ["no-new-privileges"],
-            },
+        args = get_mypy_options(python_version, **kwargs)
+        args.append(self.source_file_path.name)
+        data = source.encode("utf-8")
+        job = {
+            "args": args,
+            "cache_dir": self._get_cache_dir(python_version, **kwargs),
+            "path": str(self.source_file_path),
+            "size": len(data),
         }
 
+        # Round trips to the Docker daemon are on the critical path:
+        # 1. create a container (done in advance when the pool is enabled)
+        # 2. inspect it and attach to its stdin and output
+        # 3. start it, and send the job and the source code to stdin
+        # 4. get the exit code once the output ends
+        # The output of both streams comes through the attached connection.
+        # The exited container is deleted in the background.
         # Using Any to suppress type errors around aiodocker
         c: Any | None = None
         try:
-            logger.info("creating container")
-            c = await self.client.containers.create(config=config)  # type: ignore
-            await c.put_archive(  # type: ignore[no-untyped-call]
-                str(self.source_file_path.parent), self._create_archive(source)
-            )
-            await c.start()
-            exit_code = (await c.wait())["StatusCode"]
-            stdout = "".join(await c.log(stdout=True, stderr=False)).strip()
-            stderr = "".join(await c.log(stdout=False, stderr=True)).strip()
-            await c.delete()
-        except aiodocker.exceptions.DockerError:
+            if self.pool is not None:
+                with measure_phase(mypy_version, self.backend, "acquire"):
+                    c = await self.pool.acquire(mypy_version, docker_image)
+            else:
+                logger.info("creating container")
+                with measure_phase(mypy_version, self.backend, "create"):
+                    c = await self._create_container(docker_image)
+            async with contextlib.AsyncExitStack() as stack:
+                with measure_phase(mypy_version, self.backend, "attach"):
+                    stream: Stream = await stack.enter_async_context(
+                        c.attach(stdin=True, stdout=True, stderr=True)
+                    )
+                with measure_phase(mypy_version, self.backend, "start"):
+                    await c.start()
+                with measure_phase(mypy_version, self.backend, "output"):
+                    await stream.write_in(
+                        json.dumps(job).encode("utf-8") + b"\n" + data
+                    )
+                    stdout, stderr = await self._read_output(
+                        stream, on_output, get_settings().sandbox_max_output_bytes
+                    )
+            with measure_phase(mypy_version, self.backend, "wait"):
+                exit_code = (await c.wait())["StatusCode"]
+        except _DOCKER_ERRORS:
             logger.exception("docker api error")
             if c is not None:
-                try:
-                    logger.info("cleaning up the container: %s", c)
-                    await c.delete()
-                except aiodocker.exceptions.DockerError:
-                    logger.exception("docker api error while cleaning up. ignoring.")
+                await self._cleanup_container(c)
             return None
+        except asyncio.CancelledError:
+            # Otherwise a started container keeps running mypy to completion
+            if c is not None:
+                await self._cleanup_container(c)
+            raise
+        finally:
+            # It is deleted below, or by the reaper if it is orphaned
+            if c is not None:
+                self.containers_in_use.discard(c.id)
+        self._delete_in_background(c)
 
         duration = int(1000 * (time.time() - start_time))
         logger.info("finished in %d ms", duration)
@@ -100,16 +260,143 @@ class DockerSandbox(AbstractSandbox):
             duration=duration,
         )
 
-    def _create_archive(self, source: str) -> BytesIO:
-        stream = BytesIO()
-        with tarfile.TarFile(fileobj=stream, mode="w") as tar:
-            data = source.encode("utf-8")
-            tarinfo = tarfile.TarInfo(name=self.source_file_path.name)
-            tarinfo.size = len(data)
-            tarinfo.mtime = int(time.time())
-            tar.addfile(tarinfo, BytesIO(data))
-        stream.seek(0)
-        return stream
+    def _delete_in_background(self, c: Any) -> None:
+        async def delete() -> None:
+            try:
+                await c.delete(force=True)
+            except aiodocker.exceptions.DockerError:
+                logger.exception("failed to delete a container. ignoring.")
+
+        task = asyncio.create_task(delete())
+        self._deleting.add(task)
+        task.add_done_callback(self._deleting.discard)
+
+    async def _cleanup_container(self, c: Any) -> None:
+        try:
+            logger.info("cleaning up the container: %s", c)
+            await c.delete(force=True)
+        except aiodocker.exceptions.DockerError:
+            logger.exception("docker api error while cleaning up. ignoring.")
+
+    async def _read_output(
+        self, stream: Stream, on_output: OutputCallback | None, max_bytes: int = 0
+    ) -> tuple[str, str]:
+        """Read multiplexed stdout and stderr until the container exits
+
+        Only the first max_bytes of each stream are kept (0 means no limit),
+        but the rest is still read so that the container is not blocked.
+        """
+        chunks: dict[str, list[str]] = {"stdout": [], "stderr": []}
+        buffers = dict.fromkeys(chunks, "")
+        decoders = {
+            name: codecs.getincrementaldecoder("utf-8")(errors="replace")
+            for name in chunks
+        }
+        limits = {name: OutputLimit(max_bytes) for name in chunks}
+        while (message := await stream.read_out()) is not None:
+            name = _STREAMS.get(message.stream)
+            if name is None:
+                continue
+            data = limits[name].take(message.data)
+            if not data:
+                continue
+            chunk = decoders[name].decode(data)
+            chunks[name].append(chunk)
+            if on_output is not None:
+                *lines, buffers[name] = (buffers[name] + chunk).split("\n")
+                for line in lines:
+                    on_output(name, line)
+        for name, decoder in decoders.items():
+            chunk = decoder.decode(b"", final=True)
+            chunks[name].append(chunk)
+            if on_output is not None and buffers[name] + chunk:
+                on_output(name, buffers[name] + chunk)
+            marker = limits[name].marker
+            if marker is not None:
+                chunks[name].append("\n" + marker)
+                if on_output is not None:
+                    on_output(name, marker)
+        return "".join(chunks["stdout"]).strip(), "".join(chunks["stderr"]).strip()
+
+    async def resolve_target(self, mypy_version: str) -> str | None:
+        docker_image = self._get_docker_image(mypy_version)
+        if docker_image is None:
+            return None
+
+        now = time.monotonic()
+        cached = self._image_ids.get(docker_image)
+        if cached is not None and now - cached[0] < _IMAGE_RESOLVE_INTERVAL:
+            return cached[1]
+        try:
+            image_id: str = (await self.client.images.inspect(docker_image))["Id"]
+        except aiodocker.exceptions.DockerError:
+            logger.warning("failed to inspect docker image: %s", docker_image)
+            return None
+        self._image_ids[docker_image] = (now, image_id)
+        if cached is not None and cached[1] != image_id:
+            logger.info("docker image was updated: %s", docker_image)
+            await self._on_image_updated(docker_image)
+        return image_id
+
+    async def _on_image_updated(self, docker_image: str) -> None:
+        # Pre-created containers use the previous image
+        if self.pool is not None:
+            await self.pool.discard(docker_image)
+
+    def _get_cache_dir(
+        self, python_version: str | None = None, **kwargs: Any
+    ) -> str | None:
+        """Get the pre-built cache matching the request, if any.
+
+        mypy invalidates cached data built with different options, so only
+        requests with the same cache-affecting options benefit from it.
+        """
+        if not python_version:
+            return None
+        if any(kwargs.get(option) for option in ARGUMENT_MULTI_SELECT_OPTIONS):
+            return None
+        flags = frozenset(
+            flag
+            for flag in ARGUMENT_FLAGS
+            if kwargs.get(flag) and flag not in _CACHE_NEUTRAL_FLAGS
+        )
+        profile = _CACHE_PROFILES.get(flags)
+        if profile is None:
+            return None
+        return str(_MYPY_CACHE_DIR / python_version / profile)
+
+    async def _create_container(self, docker_image: str) -> Any:
+        config = {
+            "Image": docker_image,
+            "Cmd": ["python", "-c", _RUNNER],
+            "AttachStdin": True,
+            "AttachStdout": True,
+            "AttachStderr": True,
+            "OpenStdin": True,
+            "StdinOnce": True,
+            "HostConfig": {
+                "CapDrop": ["ALL"],
+                "Memory": 128 * 1024 * 1024,
+                "NetworkMode": "none",
+                "PidsLimit": 32,
+                "SecurityOpt": ["no-new-privileges"],
+                "Tmpfs": {str(self.source_file_path.parent): "rw,size=16m"},
+            },
+            "Labels": self._get_labels(),
+        }
+        c = await self.client.containers.create(config=config)  # type: ignore
+        self.containers_in_use.add(c.id)
+        return c
+
+    def _get_labels(self) -> dict[str, str]:
+        return {
+            OWNER_LABEL: self.instance_id,
+            CREATED_LABEL: str(int(time.time())),
+        }
+
+    async def _delete_container(self, container: Any) -> None:
+        self.containers_in_use.discard(container.id)
+        await container.delete(force=True)
 
     def _get_docker_image(self, mypy_version_id: str) -> str | None:
         settings = get_settings()
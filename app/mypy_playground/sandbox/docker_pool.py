@@ -0,0 +1,174 @@
+"""Pool of pre-created containers for DockerSandbox.
+
+Creating a container dominates the latency of type-checking a small
+snippet, so containers are created ahead of time and refilled in the
+background.  Each container is still used for exactly one request.
+
+Pre-created containers are replaced once they are older than max_age,
+so that reapers of other instances sharing the Docker daemon can tell
+them apart from orphaned containers (see docker_reaper.py).
+"""
+
+import asyncio
+import contextlib
+import logging
+import math
+import time
+from collections import defaultdict, deque
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import aiodocker
+import aiohttp
+
+from mypy_playground.config import get_settings
+from mypy_playground.sandbox.metrics import (
+    docker_pool_cold_misses_total,
+    docker_pool_containers,
+    docker_pool_refill_duration_seconds,
+)
+
+logger = logging.getLogger(__name__)
+
+# How often pool sizes are recomputed from recent traffic
+_REBALANCE_INTERVAL = 30.0
+# Weight of the traffic observed in past intervals
+_TRAFFIC_DECAY = 0.5
+# Errors of the Docker daemon which the pool outlives
+_DOCKER_ERRORS = (aiodocker.exceptions.DockerError, aiohttp.ClientError, TimeoutError)
+
+
+class ContainerPool:
+    """Pre-created (not yet started) containers grouped by Docker image"""
+
+    def __init__(
+        self,
+        create_container: Callable[[str], Awaitable[Any]],
+        delete_container: Callable[[Any], Awaitable[None]],
+        max_age: float = 0,
+    ) -> None:
+        self._create_container = create_container
+        self._delete_container = delete_container
+        self.max_age = max_age
+        # Image -> (created time, container) in the order of creation
+        self._containers: defaultdict[str, deque[tuple[float, Any]]] = defaultdict(
+            deque
+        )
+        self._targets: dict[str, int] = {}
+        # mypy version ID -> decayed number of requests
+        self._traffic: defaultdict[str, float] = defaultdict(float)
+        self._recent_traffic: defaultdict[str, int] = defaultdict(int)
+        self._refill_needed = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+
+    async def start(self) -> None:
+        self._rebalance()
+        self._refill_needed.set()
+        self._task = asyncio.create_task(self._refill_loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        for image in list(self._containers):
+            await self.discard(image)
+
+    async def acquire(self, mypy_version: str, image: str) -> Any:
+        """Take a container out of the pool or create one if it is empty"""
+        self._recent_traffic[mypy_version] += 1
+        containers = self._containers[image]
+        if containers:
+            _, container = containers.popleft()
+            docker_pool_containers.labels(image).set(len(containers))
+            self._refill_needed.set()
+            return container
+        logger.info("no pre-created container for image: %s", image)
+        docker_pool_cold_misses_total.labels(image).inc()
+        self._refill_needed.set()
+        return await self._create_container(image)
+
+    async def discard(self, image: str) -> None:
+        """Delete all the pre-created containers for the image"""
+        containers = self._containers.pop(image, deque())
+        docker_pool_containers.labels(image).set(0)
+        for _, container in containers:
+            await self._delete_quietly(container)
+        self._refill_needed.set()
+
+    def _rebalance(self) -> None:
+        """Recompute the number of containers to keep for each image"""
+        settings = get_settings()
+        for mypy_version, count in self._recent_traffic.items():
+            self._traffic[mypy_version] += count
+        self._recent_traffic.clear()
+
+        total_traffic = sum(self._traffic.values())
+        targets: defaultdict[str, int] = defaultdict(int)
+        for mypy_version, image in settings.docker_images.items():
+            size = settings.docker_pool_sizes.get(
+                mypy_version, settings.docker_pool_size
+            )
+            if total_traffic > 0:
+                share = self._traffic[mypy_version] / total_traffic
+                size += math.floor(settings.docker_pool_traffic_budget * share)
+            targets[image] += size
+        self._targets = dict(targets)
+
+        for mypy_version in self._traffic:
+            self._traffic[mypy_version] *= _TRAFFIC_DECAY
+
+    async def _refill_loop(self) -> None:
+        last_rebalanced = time.monotonic()
+        while True:
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(
+                    self._refill_needed.wait(), timeout=_REBALANCE_INTERVAL
+                )
+            self._refill_needed.clear()
+            if time.monotonic() - last_rebalanced >= _REBALANCE_INTERVAL:
+                self._rebalance()
+                last_rebalanced = time.monotonic()
+            try:
+                await asyncio.gather(
+                    *(
+                        self._refill(image, target)
+                        for image, target in self._targets.items()
+                    )
+                )
+                for image in set(self._containers) - set(self._targets):
+                    await self.discard(image)
+            except Exception:
+                # The pool is refilled on the next request or interval
+                logger.exception("unexpected error while refilling the pool")
+
+    async def _refill(self, image: str, target: int) -> None:
+        # Look up the deque every time as it can be replaced by discard()
+        while self.max_age > 0 and self._containers[image]:
+            created_time, container = self._containers[image][0]
+            if time.time() - created_time < self.max_age:
+                break
+            self._containers[image].popleft()
+            await self._delete_quietly(container)
+        while len(self._containers[image]) > target:
+            await self._delete_quietly(self._containers[image].pop()[1])
+        while len(self._containers[image]) < target:
+            start_time = time.monotonic()
+            try:
+                container = await self._create_container(image)
+            except _DOCKER_ERRORS:
+                logger.exception("failed to create a container for the pool")
+                return
+            docker_pool_refill_duration_seconds.labels(image).observe(
+                time.monotonic() - start_time
+            )
+            self._containers[image].append((time.time(), container))
+            docker_pool_containers.labels(image).set(len(self._containers[image]))
+        docker_pool_containers.labels(image).set(len(self._containers[image]))
+
+    async def _delete_quietly(self, container: Any) -> None:
+        try:
+            await self._delete_container(container)
+        except _DOCKER_ERRORS:
+            logger.exception("failed to delete a pre-created container. ignoring.")
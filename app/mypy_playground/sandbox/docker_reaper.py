@@ -0,0 +1,136 @@
+"""Cleanup of orphaned sandbox containers.
+
+Containers created by DockerSandbox are deleted once they exit, and
+workers of DaemonSandbox are removed by the daemon, but containers may be
+left behind when the application crashes or fails to delete them.
+ContainerReaper periodically deletes such containers, identified by the
+labels which DockerSandbox puts on every container.
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import time
+from typing import Any
+
+import aiodocker
+import aiohttp
+
+from mypy_playground.sandbox.docker import (
+    CREATED_LABEL,
+    OWNER_LABEL,
+    WORKER_LABEL,
+    DockerSandbox,
+)
+from mypy_playground.sandbox.metrics import docker_reaped_containers_total
+
+logger = logging.getLogger(__name__)
+
+_EXITED_STATES = frozenset({"exited", "dead"})
+# Containers of other instances which are neither exited nor older than
+# max_age times this factor may still be pooled or running there
+_ABANDONED_AGE_FACTOR = 3
+# Errors of talking to the Docker daemon, after which the reaper retries
+_DOCKER_ERRORS = (aiodocker.exceptions.DockerError, aiohttp.ClientError, TimeoutError)
+
+
+class ContainerReaper:
+    """Delete containers of DockerSandbox which are no longer used.
+
+    A container is deleted when it is not used by this instance and
+    - it has exited and belongs to this instance, or
+    - it has exited, belongs to another instance and is older than
+      max_age, as that instance may still be reading its output, or
+    - it belongs to this instance and is older than max_age, or
+    - it belongs to another instance and is older than max_age times
+      _ABANDONED_AGE_FACTOR, so that instance is presumably gone, unless
+      it is a worker of DaemonSandbox, which exits without its owner
+    Other instances sharing the Docker daemon keep their containers in
+    use for less than max_age, as pooled containers are replaced by then.
+    """
+
+    def __init__(
+        self,
+        sandbox: DockerSandbox,
+        interval: float,
+        max_age: float,
+        batch_size: int,
+    ) -> None:
+        self.sandbox = sandbox
+        self.interval = interval
+        self.max_age = max_age
+        self.batch_size = max(1, batch_size)
+        self._task: asyncio.Task[None] | None = None
+
+    async def start(self) -> None:
+        if self.interval <= 0:
+            logger.info("container reaper is disabled")
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def reap(self) -> int:
+        """Delete orphaned containers and return the number of them"""
+        containers: list[Any] = await self.sandbox.client.containers.list(
+            all=True, filters=json.dumps({"label": [OWNER_LABEL]})
+        )
+        now = time.time()
+        orphans = []
+        for c in containers:
+            reason = self._get_reason(c, now)
+            if reason is not None:
+                orphans.append((c, reason))
+
+        reaped = 0
+        for i in range(0, len(orphans), self.batch_size):
+            batch = orphans[i : i + self.batch_size]
+            results = await asyncio.gather(
+                *(c.delete(force=True) for c, _ in batch), return_exceptions=True
+            )
+            for (c, reason), result in zip(batch, results, strict=True):
+                if isinstance(result, aiodocker.exceptions.DockerError):
+                    # It may have been deleted in the meantime
+                    logger.warning("failed to delete container %s: %s", c.id, result)
+                elif isinstance(result, BaseException):
+                    raise result
+                else:
+                    docker_reaped_containers_total.labels(reason).inc()
+                    reaped += 1
+        if reaped:
+            logger.info("deleted %d orphaned containers", reaped)
+        return reaped
+
+    def _get_reason(self, c: Any, now: float) -> str | None:
+        if c.id in self.sandbox.containers_in_use:
+            return None
+        # Fields of the container in the list
+        labels = c["Labels"] or {}
+        created = float(c["Created"])
+        with contextlib.suppress(KeyError, ValueError):
+            created = float(labels[CREATED_LABEL])
+        age = now - created
+        is_own = labels.get(OWNER_LABEL) == self.sandbox.instance_id
+        if c["State"] in _EXITED_STATES:
+            return "exited" if is_own or age >= self.max_age else None
+        if is_own:
+            return "stale" if age >= self.max_age else None
+        if WORKER_LABEL in labels:
+            return None
+        if age >= self.max_age * _ABANDONED_AGE_FACTOR:
+            return "abandoned"
+        return None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.reap()
+            except _DOCKER_ERRORS:
+                logger.exception("failed to clean up orphaned containers")
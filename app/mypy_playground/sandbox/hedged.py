@@ -0,0 +1,204 @@
+"""Sandbox hedging requests across several sandbox backends.
+
+Each request first runs in the first backend of hedged_backends.  If it
+has not answered within a percentile of the recent latencies of that
+backend (hedged_percentile), a second attempt is sent to the next
+backend, and whichever answers first wins while the other is cancelled.
+When an attempt fails, the request falls back to the next backend which
+has not been tried yet.
+
+The request itself holds a slot of the scheduler, which the fallback
+attempts reuse, but a hedged attempt runs alongside the first one and
+takes another slot.  A request is not hedged when no slot is free.
+
+Latencies of the first backend are tracked per mypy version.  Until
+enough of them are observed, hedged_initial_delay is used instead.
+
+Results are cached under the target of the first backend, as the others
+may not resolve moving versions such as "latest" (Cloud Functions never
+does).  The backends are expected to run the same mypy for a version ID,
+so a result of a fallback backend is cached under that target too.
+"""
+
+import asyncio
+import contextlib
+import logging
+import math
+import time
+from collections import defaultdict, deque
+from typing import Any
+
+from mypy_playground.config import get_settings
+from mypy_playground.sandbox import get_scheduler
+from mypy_playground.sandbox.base import AbstractSandbox, Result
+from mypy_playground.sandbox.metrics import (
+    hedged_attempt_failures_total,
+    hedged_requests_total,
+    hedged_winners_total,
+)
+from mypy_playground.sandbox.registry import create_sandbox
+from mypy_playground.sandbox.scheduler import Scheduler
+
+logger = logging.getLogger(__name__)
+
+_HEDGED_SANDBOX = "mypy_playground.sandbox.hedged.HedgedSandbox"
+# Number of latencies observed before the percentile is used
+_MIN_SAMPLES = 20
+
+
+class LatencyTracker:
+    """Recent latencies per key"""
+
+    def __init__(self, window: int) -> None:
+        self._latencies: defaultdict[str, deque[float]] = defaultdict(
+            lambda: deque(maxlen=window)
+        )
+
+    def observe(self, key: str, latency: float) -> None:
+        self._latencies[key].append(latency)
+
+    def percentile(self, key: str, p: float) -> float | None:
+        """Return the p-th percentile, or None if too few were observed"""
+        latencies = self._latencies.get(key)
+        if latencies is None or len(latencies) < _MIN_SAMPLES:
+            return None
+        values = sorted(latencies)
+        return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+class HedgedSandbox(AbstractSandbox):
+    """Run mypy in one of several sandbox backends, hedging slow requests"""
+
+    backend = "hedged"
+
+    def __init__(self) -> None:
+        settings = get_settings()
+        if len(settings.hedged_backends) < 2:
+            raise ValueError("hedged_backends must have at least two backends")
+        if _HEDGED_SANDBOX in settings.hedged_backends:
+            raise ValueError("HedgedSandbox cannot hedge itself")
+        self.sandboxes = [create_sandbox(name) for name in settings.hedged_backends]
+        self._latencies = LatencyTracker(settings.hedged_window)
+        # Scheduler limiting hedged attempts (the default one if None)
+        self.scheduler: Scheduler | None = None
+        # Losing attempts cleaning up after cancellation
+        self._cancelled: set[asyncio.Task[Result | None]] = set()
+
+    async def start(self) -> None:
+        for sandbox in self.sandboxes:
+            await sandbox.start()
+
+    async def close(self) -> None:
+        if self._cancelled:
+            await asyncio.gather(*self._cancelled, return_exceptions=True)
+        for sandbox in self.sandboxes:
+            await sandbox.close()
+
+    async def run_typecheck(
+        self,
+        source: str,
+        /,
+        mypy_version: str,
+        python_version: str | None = None,
+        **kwargs: Any,
+    ) -> Result | None:
+        start_time = time.perf_counter()
+        deadline = start_time + self._get_delay(mypy_version)
+        # Attempt -> (index of the sandbox, "first", "hedge" or "fallback")
+        attempts: dict[asyncio.Task[Result | None], tuple[int, str]] = {}
+        next_index = 0
+        hedged = False
+        scheduler = self.scheduler or get_scheduler()
+
+        def launch(kind: str) -> asyncio.Task[Result | None]:
+            nonlocal next_index
+            sandbox = self.sandboxes[next_index]
+            task = asyncio.create_task(
+                sandbox.run_typecheck(
+                    source,
+                    mypy_version=mypy_version,
+                    python_version=python_version,
+                    **kwargs,
+                )
+            )
+            attempts[task] = (next_index, kind)
+            next_index += 1
+            return task
+
+        launch("first")
+        try:
+            while attempts:
+                timeout = None
+                if not hedged and next_index < len(self.sandboxes):
+                    timeout = max(0.0, deadline - time.perf_counter())
+                done, _ = await asyncio.wait(
+                    attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    hedged = True
+                    if not scheduler.try_acquire():
+                        logger.info("not hedging a request: no free slot")
+                        continue
+                    slow = self.sandboxes[next_index - 1].backend
+                    logger.info("hedging a request: slow backend=%s", slow)
+                    hedged_requests_total.labels(slow).inc()
+                    # The slot is held until the attempt has cleaned up
+                    launch("hedge").add_done_callback(lambda _: scheduler.release())
+                    continue
+
+                for task in done:
+                    index, kind = attempts.pop(task)
+                    backend = self.sandboxes[index].backend
+                    result = self._get_result(task, backend)
+                    if result is None:
+                        hedged_attempt_failures_total.labels(backend).inc()
+                        continue
+                    if index == 0:
+                        self._latencies.observe(
+                            mypy_version, time.perf_counter() - start_time
+                        )
+                    hedged_winners_total.labels(backend, kind).inc()
+                    return result
+
+                if not attempts and next_index < len(self.sandboxes):
+                    logger.info("falling back to the next backend")
+                    launch("fallback")
+            return None
+        finally:
+            for task, (index, _) in attempts.items():
+                if index == 0:
+                    # The first backend took at least this long, which keeps
+                    # the percentile from drifting down as its slow attempts
+                    # are cancelled
+                    self._latencies.observe(
+                        mypy_version, time.perf_counter() - start_time
+                    )
+                task.cancel()
+                self._cancelled.add(task)
+                task.add_done_callback(self._forget)
+
+    async def resolve_target(self, mypy_version: str) -> str | None:
+        target = await self.sandboxes[0].resolve_target(mypy_version)
+        return None if target is None else f"hedged:{target}"
+
+    def _get_delay(self, mypy_version: str) -> float:
+        settings = get_settings()
+        delay = self._latencies.percentile(mypy_version, settings.hedged_percentile)
+        if delay is None:
+            return settings.hedged_initial_delay
+        return max(delay, settings.hedged_min_delay)
+
+    def _get_result(
+        self, task: asyncio.Task[Result | None], backend: str
+    ) -> Result | None:
+        with contextlib.suppress(asyncio.CancelledError):
+            if task.exception() is None:
+                return task.result()
+            logger.error("failed to run mypy in %s", backend, exc_info=task.exception())
+        return None
+
+    def _forget(self, task: asyncio.Task[Result | None]) -> None:
+        self._cancelled.discard(task)
+        # An attempt may fail while it is cleaning up
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("cancelled attempt failed", exc_info=task.exception())
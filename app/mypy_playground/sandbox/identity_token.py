@@ -0,0 +1,137 @@
+"""Cached identity tokens for invoking Cloud Functions.
+
+Fetching an identity token is a blocking round trip to the metadata
+server (or to the OAuth 2.0 endpoint), so tokens are cached per audience
+and fetched in a thread.  A token is refreshed in the background shortly
+before it expires, so requests rarely wait for a fetch.
+"""
+
+import asyncio
+import base64
+import functools
+import json
+import logging
+import time
+from collections.abc import Callable
+
+import google.auth.transport.requests
+import google.oauth2.id_token
+
+from mypy_playground.sandbox.metrics import (
+    identity_token_fetch_duration_seconds,
+    identity_token_refresh_failures_total,
+)
+
+logger = logging.getLogger(__name__)
+
+# Tokens are not used in the last seconds before they expire
+_EXPIRY_MARGIN = 60.0
+# Tokens are refreshed in the background in the last seconds before they expire
+_REFRESH_MARGIN = 300.0
+# Interval between background refreshes after a failure
+_RETRY_INTERVAL = 10.0
+# Lifetime assumed for a token without a readable expiry (Google uses 1 hour)
+_DEFAULT_LIFETIME = 3600.0
+
+_MALFORMED_TOKEN_ERRORS = (IndexError, KeyError, TypeError, ValueError)
+
+
+def fetch_id_token(audience: str) -> str:
+    """Fetch an identity token using google-auth (blocking)"""
+    # https://cloud.google.com/functions/docs/securing/authenticating
+    auth_req = google.auth.transport.requests.Request()
+    # Get a token or raise an exception
+    if isinstance(
+        token := google.oauth2.id_token.fetch_id_token(auth_req, audience),  # type: ignore[no-untyped-call]
+        str,
+    ):
+        return token
+    raise Exception("failed to get identity token")
+
+
+def _get_expiry(token: str) -> float:
+    """Read the expiry from the claims of a JWT without verifying it"""
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(
+            base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))
+        )
+        return float(claims["exp"])
+    except _MALFORMED_TOKEN_ERRORS:
+        logger.warning("cannot read the expiry of an identity token")
+        return time.time() + _DEFAULT_LIFETIME
+
+
+class _Token:
+    def __init__(self, value: str, expiry: float) -> None:
+        self.value = value
+        self.expiry = expiry
+
+
+class IdentityTokenProvider:
+    """Provide identity tokens per audience without blocking the event loop.
+
+    Concurrent fetches for the same audience are coalesced into one.
+    """
+
+    def __init__(self, fetch: Callable[[str], str] = fetch_id_token) -> None:
+        self._fetch = fetch
+        self._tokens: dict[str, _Token] = {}
+        self._refreshing: dict[str, asyncio.Task[_Token]] = {}
+        self._retry_after: dict[str, float] = {}
+
+    async def get(self, audience: str) -> str:
+        """Get a valid token, fetching it if needed"""
+        now = time.time()
+        token = self._tokens.get(audience)
+        if token is not None and now < token.expiry - _EXPIRY_MARGIN:
+            if now >= token.expiry - _REFRESH_MARGIN and now >= self._retry_after.get(
+                audience, 0
+            ):
+                logger.debug("refreshing an identity token in the background")
+                self._refresh(audience)
+            return token.value
+
+        logger.debug("fetching an identity token")
+        # Shielded as the fetch is shared with other requests
+        token = await asyncio.shield(self._refresh(audience))
+        return token.value
+
+    async def close(self) -> None:
+        tasks = list(self._refreshing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _refresh(self, audience: str) -> asyncio.Task[_Token]:
+        task = self._refreshing.get(audience)
+        if task is None:
+            task = asyncio.create_task(self._fetch_token(audience))
+            self._refreshing[audience] = task
+            task.add_done_callback(functools.partial(self._on_refreshed, audience))
+        return task
+
+    def _on_refreshed(self, audience: str, task: asyncio.Task[_Token]) -> None:
+        if self._refreshing.get(audience) is task:
+            del self._refreshing[audience]
+        if not task.cancelled():
+            # Mark errors of background refreshes as retrieved (already logged)
+            task.exception()
+
+    async def _fetch_token(self, audience: str) -> _Token:
+        start_time = time.perf_counter()
+        try:
+            value = await asyncio.to_thread(self._fetch, audience)
+        except Exception:
+            logger.exception("failed to fetch an identity token")
+            identity_token_refresh_failures_total.inc()
+            self._retry_after[audience] = time.time() + _RETRY_INTERVAL
+            raise
+        finally:
+            identity_token_fetch_duration_seconds.observe(
+                time.perf_counter() - start_time
+            )
+        token = _Token(value, _get_expiry(value))
+        self._tokens[audience] = token
+        self._retry_after.pop(audience, None)
+        return token
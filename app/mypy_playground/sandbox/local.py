@@ -0,0 +1,253 @@
+"""Sandbox running mypy in a pool of local worker processes.
+
+For environments without Docker or Cloud Functions, such as CI and
+self-hosting.  Each worker runs daemon_worker.py with the Python of the
+virtualenv of a mypy version, in its own temporary directory and process
+group, and type-checks each job in a forked child with resource limits
+and without network access.  Workers are reused, and are recycled after
+a number of jobs or when too many workers are idle, or killed when a job
+fails or times out.
+
+Local processes are less isolated than containers: they can read files
+which the user running the application can read.  Without the privilege
+to create a network namespace, network access is blocked only by an
+audit hook, which native code can bypass, and the process limit is per
+user and not enforced for root.  local_require_network_namespace makes
+LocalSandbox refuse to start in that case.
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict, defaultdict, deque
+from pathlib import Path
+from typing import Any
+
+from mypy_playground.config import get_settings
+from mypy_playground.sandbox.base import (
+    AbstractSandbox,
+    Result,
+    get_mypy_options,
+)
+from mypy_playground.sandbox.metrics import (
+    local_worker_recycles_total,
+    measure_phase,
+)
+
+logger = logging.getLogger(__name__)
+
+_WORKER_PATH = Path(__file__).parent / "daemon_worker.py"
+# Version IDs whose virtualenv may be upgraded in place
+_MOVING_VERSION_SUFFIXES = ("latest", "master")
+# Maximum size of a line of the worker protocol
+_LINE_LIMIT = 64 * 1024 * 1024
+# Errors after which a worker is in an unknown state
+_WORKER_ERRORS = (ConnectionError, ValueError, OSError)
+
+
+def _can_create_network_namespace() -> bool:
+    # Tried in a new process, as a namespace cannot be left once entered
+    process = subprocess.run(  # noqa: S603
+        [sys.executable, "-I", "-c", "import os; os.unshare(os.CLONE_NEWNET)"],
+        capture_output=True,
+        check=False,
+    )
+    return process.returncode == 0
+
+
+class _Worker:
+    """A local worker process and its temporary directory"""
+
+    def __init__(self, process: asyncio.subprocess.Process, directory: str) -> None:
+        if process.stdin is None or process.stdout is None:
+            raise ValueError("stdin and stdout of a worker must be pipes")
+        self.process = process
+        self.stdin = process.stdin
+        self.stdout = process.stdout
+        self.directory = directory
+        self.jobs = 0
+
+    async def run(self, job: dict[str, Any]) -> dict[str, Any]:
+        self.stdin.write(json.dumps(job).encode("utf-8") + b"\n")
+        await self.stdin.drain()
+        line = await self.stdout.readline()
+        if not line:
+            raise ConnectionError("mypy worker exited unexpectedly")
+        self.jobs += 1
+        response: dict[str, Any] = json.loads(line)
+        return response
+
+    async def kill(self) -> None:
+        # The worker and the child running a job share the process group
+        with contextlib.suppress(ProcessLookupError):
+            os.killpg(self.process.pid, signal.SIGKILL)
+        await self.process.wait()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class LocalSandbox(AbstractSandbox):
+    """Run mypy in local worker processes per mypy version"""
+
+    backend = "local"
+
+    def __init__(self) -> None:
+        if (
+            get_settings().local_require_network_namespace
+            and not _can_create_network_namespace()
+        ):
+            raise RuntimeError(
+                "local_require_network_namespace is set, but a network namespace "
+                "cannot be created (it needs CAP_SYS_ADMIN or user namespaces)"
+            )
+        self._network_warned = False
+        self._idle_workers: defaultdict[str, deque[_Worker]] = defaultdict(deque)
+        # Idle worker -> mypy version, from the least recently used one
+        self._idle_order: OrderedDict[_Worker, str] = OrderedDict()
+        self._slots = asyncio.Semaphore(get_settings().sandbox_concurrency)
+        self._retiring: set[asyncio.Task[None]] = set()
+
+    async def close(self) -> None:
+        for mypy_version in list(self._idle_workers):
+            for worker in self._idle_workers.pop(mypy_version):
+                self._retire(worker, "shutdown")
+        self._idle_order.clear()
+        if self._retiring:
+            await asyncio.gather(*self._retiring)
+
+    async def run_typecheck(
+        self,
+        source: str,
+        /,
+        mypy_version: str,
+        python_version: str | None = None,
+        **kwargs: Any,
+    ) -> Result | None:
+        start_time = time.time()
+        settings = get_settings()
+
+        venv = settings.local_venvs.get(mypy_version)
+        if venv is None:
+            logger.error("cannot find a virtualenv for mypy version: %s", mypy_version)
+            return None
+
+        job = {
+            "source": source,
+            "options": get_mypy_options(python_version, **kwargs),
+            "max_output_bytes": settings.sandbox_max_output_bytes,
+            "limits": {
+                "cpu": settings.local_cpu_time_limit,
+                "as": settings.local_memory_limit,
+                "nproc": settings.local_process_limit,
+            },
+            "block_network": True,
+        }
+
+        async with self._slots:
+            idle_workers = self._idle_workers[mypy_version]
+            worker = None
+            if idle_workers:
+                worker = idle_workers.pop()
+                del self._idle_order[worker]
+            try:
+                if worker is None:
+                    with measure_phase(mypy_version, self.backend, "spawn"):
+                        worker = await self._spawn(venv)
+                with measure_phase(mypy_version, self.backend, "run"):
+                    response = await asyncio.wait_for(
+                        worker.run(job), timeout=settings.local_job_timeout
+                    )
+            except TimeoutError:
+                logger.error("mypy worker timed out")
+                if worker is not None:
+                    self._retire(worker, "timeout")
+                return None
+            except _WORKER_ERRORS:
+                logger.exception("mypy worker error")
+                if worker is not None:
+                    self._retire(worker, "error")
+                return None
+            except asyncio.CancelledError:
+                # The response to the job may still arrive later
+                if worker is not None:
+                    self._retire(worker, "cancelled")
+                raise
+
+            if response.get("network_namespace") is False and not self._network_warned:
+                self._network_warned = True
+                logger.warning(
+                    "cannot create a network namespace for mypy jobs, "
+                    "so network access is blocked only by an audit hook"
+                )
+            if worker.jobs >= settings.local_max_jobs:
+                self._retire(worker, "jobs")
+            else:
+                self._add_idle_worker(mypy_version, worker)
+
+        duration = int(1000 * (time.time() - start_time))
+        logger.info("finished in %d ms", duration)
+        return Result(
+            exit_code=response["exit_code"],
+            stdout=response["stdout"].strip(),
+            stderr=response["stderr"].strip(),
+            duration=duration,
+        )
+
+    async def resolve_target(self, mypy_version: str) -> str | None:
+        if mypy_version.endswith(_MOVING_VERSION_SUFFIXES):
+            return None
+        venv = get_settings().local_venvs.get(mypy_version)
+        return f"local:{venv}" if venv is not None else None
+
+    def _add_idle_worker(self, mypy_version: str, worker: _Worker) -> None:
+        self._idle_workers[mypy_version].append(worker)
+        self._idle_order[worker] = mypy_version
+        # Workers of rarely used versions do not stay forever
+        while len(self._idle_order) > get_settings().local_max_idle_workers:
+            oldest, oldest_version = self._idle_order.popitem(last=False)
+            self._idle_workers[oldest_version].remove(oldest)
+            self._retire(oldest, "idle")
+
+    async def _spawn(self, venv: str) -> _Worker:
+        logger.info("starting a local mypy worker: %s", venv)
+        directory = tempfile.mkdtemp(prefix="mypy-worker-")
+        # Nothing of the environment of the application is passed on,
+        # such as credentials, proxies and the user's mypy configuration
+        env = {
+            "HOME": directory,
+            "LANG": "C.UTF-8",
+            "MYPY_WORKER_DIR": directory,
+            "PATH": os.path.join(venv, "bin"),
+        }
+        try:
+            process = await asyncio.create_subprocess_exec(
+                os.path.join(venv, "bin", "python"),
+                "-I",
+                str(_WORKER_PATH),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+                cwd=directory,
+                env=env,
+                limit=_LINE_LIMIT,
+                start_new_session=True,
+            )
+        except OSError:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        return _Worker(process, directory)
+
+    def _retire(self, worker: _Worker, reason: str) -> None:
+        """Kill the worker process in the background"""
+        logger.info("recycling a mypy worker: reason=%s, jobs=%d", reason, worker.jobs)
+        local_worker_recycles_total.labels(reason).inc()
+        task = asyncio.create_task(worker.kill())
+        self._retiring.add(task)
+        task.add_done_callback(self._retiring.discard)
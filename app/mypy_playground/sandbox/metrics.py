@@ -0,0 +1,183 @@
+"""Prometheus metrics for sandboxes.
+
+Metrics are registered to the default registry, which is exposed by
+the /private/metrics endpoint.
+"""
+
+import contextlib
+import time
+from collections.abc import Iterator
+
+from prometheus_client import Counter, Gauge, Histogram
+
+_NAMESPACE = "mypy_play"
+_SUB_SYSTEM = "sandbox"
+
+cache_requests_total = Counter(
+    namespace=_NAMESPACE,
+    subsystem=_SUB_SYSTEM,
+    name="cache_requests_total",
+    documentation="Counter of result cache lookups.",
+    labelnames=("tier", "result"),
+)
+cache_evictions_total = Counter(
+    namespace=_NAMESPACE,
+    subsystem=_SUB_SYSTEM,
+    name="cache_evictions_total",
+    documentation="Counter of evicted result cache entries.",
+    labelnames=("tier", "reason"),
+)
+coalesced_requests_total = Counter(
+    namespace=_NAMESPACE,
+    subsystem=_SUB_SYSTEM,
+    name="coalesced_requests_total",
+    documentation="Counter of requests served by an identical in-flight request.",
+)
+docker_pool_containers = Gauge(
+    namespace=_NAMESPACE,
+    subsystem=_SUB_SYSTEM,
+    name="docker_pool_containers",
+    documentation="Number of pre-created containers in the pool.",
+    labelnames=("image",),
+)
+docker_pool_refill_duration_seconds = Histogram(
+    namespace=_NAMESPACE,
+    subsystem=_SUB_SYSTEM,
+    name="docker_pool_refill_duration_seconds",
+    documentation="Histogram of latencies for creating a pooled container.",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    labelnames=("image",),
+)
+docker_pool_cold_misses_total = Counter(
+    namespace=_NAMESPACE,
+    subsystem=_SUB_SYSTEM,
+    name="docker_pool_cold_misses_total",
+    documentation="Counter of requests which found no pre-created container.",
+    labelnames=("image",),
+)
+docker_reaped_containers_total = Counter(
+    namespace=_NAMESPACE,
+    subsystem=_SUB_SYSTEM,
+    name="docker_reaped_containers_total",
+    documentation="Counter of orphaned containers deleted by the reaper.",
+    labelnames=("reason",),
+)
+daemon_worker_recycles_total = Counter(
+    namespace=_NAMESPACE,
+    subsystem=_SUB_SYSTEM,
+    name="daemon_worker_recycles_total",
+    documentation="Counter of recycled mypy worker containers.",
+    labelnames=("reason",),
+)
+local_worker_recycles_total = Counter(
+    namespace=_NAMESPACE,
+    subsystem=_SUB_SYSTEM,
+    name="local_worker_recycles_total",
+    documentation="Counter of recycled local mypy worker processes.",
+    labelnames=("reason",),
+)
+scheduler_queue_length = Gauge(
+    namespace=_NAMESPACE,
+    subsystem=_SUB_SYSTEM,
+    name="scheduler_queue_length",
+    documentation="Number of requests waiting for a sandbox.",
+    labelnames=("mypy_version", "backend"),
+)
+scheduler_wait_duration_seconds = Histogram(
+    namespace=_NAMESPACE,
+    subsystem=_SUB_SYSTEM,
+    name="scheduler_wait_duration_seconds",
+    documentation="Histogram of time spent waiting for a sandbox.",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1, 3, 8, 20, 60),
+    labelnames=("mypy_version", "backend"),
+)
+scheduler_rejections_total = Counter(
+    namespace=_NAMESPACE,
+    subsystem=_SUB_SYSTEM,
+    name="scheduler_rejections_total",
+    documentation="Counter of requests rejected because the sandbox is overloaded.",
+    labelnames=("mypy_version", "backend", "reason"),
+)
+in_flight = Gauge(
+    namespace=_NAMESPACE,
+    subsystem=_SUB_SYSTEM,
+    name="in_flight",
+    documentation="Number of running sandboxes.",
+    labelnames=("mypy_version", "backend"),
+)
+run_duration_seconds = Histogram(
+    namespace=_NAMESPACE,
+    subsystem=_SUB_SYSTEM,
+    name="run_duration_seconds",
+    documentation="Histogram of latencies for running mypy in a sandbox.",
+    buckets=(0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60),
+    labelnames=("mypy_version", "backend"),
+)
+phase_duration_seconds = Histogram(
+    namespace=_NAMESPACE,
+    subsystem=_SUB_SYSTEM,
+    name="phase_duration_seconds",
+    documentation="Histogram of latencies for each phase of running a sandbox.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+    labelnames=("mypy_version", "backend", "phase"),
+)
+results_total = Counter(
+    namespace=_NAMESPACE,
+    subsystem=_SUB_SYSTEM,
+    name="results_total",
+    documentation="Counter of mypy exit codes ('error' if the sandbox failed).",
+    labelnames=("mypy_version", "backend", "exit_code"),
+)
+cloud_functions_cache_requests_total = Counter(
+    namespace=_NAMESPACE,
+    subsystem=_SUB_SYSTEM,
+    name="cloud_functions_cache_requests_total",
+    documentation="Counter of lookups of the mypy cache in Cloud Functions.",
+    labelnames=("mypy_version", "result"),
+)
+hedged_requests_total = Counter(
+    namespace=_NAMESPACE,
+    subsystem=_SUB_SYSTEM,
+    name="hedged_requests_total",
+    documentation="Counter of requests hedged to another backend, by slow backend.",
+    labelnames=("backend",),
+)
+hedged_winners_total = Counter(
+    namespace=_NAMESPACE,
+    subsystem=_SUB_SYSTEM,
+    name="hedged_winners_total",
+    documentation="Counter of backends answering hedged requests.",
+    labelnames=("backend", "attempt"),
+)
+hedged_attempt_failures_total = Counter(
+    namespace=_NAMESPACE,
+    subsystem=_SUB_SYSTEM,
+    name="hedged_attempt_failures_total",
+    documentation="Counter of failed attempts of hedged requests.",
+    labelnames=("backend",),
+)
+identity_token_fetch_duration_seconds = Histogram(
+    namespace=_NAMESPACE,
+    subsystem=_SUB_SYSTEM,
+    name="identity_token_fetch_duration_seconds",
+    documentation="Histogram of latencies for fetching an identity token.",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+identity_token_refresh_failures_total = Counter(
+    namespace=_NAMESPACE,
+    subsystem=_SUB_SYSTEM,
+    name="identity_token_refresh_failures_total",
+    documentation="Counter of failures to fetch an identity token.",
+)
+
+
+@contextlib.contextmanager
+def measure_phase(mypy_version: str, backend: str, phase: str) -> Iterator[None]:
+    """Observe the duration of a phase in phase_duration_seconds"""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        phase_duration_seconds.labels(mypy_version, backend, phase).observe(
+            time.perf_counter() - start_time
+        )
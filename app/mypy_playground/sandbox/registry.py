@@ -0,0 +1,46 @@
+"""Registry of sandbox backends.
+
+A backend is imported only when it is selected by Settings.sandbox, so
+the application does not import the clients of the other backends, such
+as aiodocker and google-auth, at startup.
+"""
+
+import importlib
+import logging
+from typing import get_args
+
+from mypy_playground.config import SandboxName
+from mypy_playground.sandbox.base import AbstractSandbox
+
+logger = logging.getLogger(__name__)
+
+
+def _split_name(name: str) -> tuple[str, str]:
+    module_name, class_name = name.rsplit(".", 1)
+    return module_name, class_name
+
+
+# Name in Settings.sandbox -> (module, class name)
+SANDBOX_BACKENDS: dict[str, tuple[str, str]] = {
+    name: _split_name(name) for name in get_args(SandboxName)
+}
+
+
+def load_sandbox_class(name: str) -> type[AbstractSandbox]:
+    """Import the class of a sandbox backend"""
+    try:
+        module_name, class_name = SANDBOX_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unsupported sandbox: {name}") from None
+    sandbox_class = getattr(importlib.import_module(module_name), class_name)
+    if not (
+        isinstance(sandbox_class, type) and issubclass(sandbox_class, AbstractSandbox)
+    ):
+        raise TypeError(f"{name} is not a sandbox")
+    return sandbox_class
+
+
+def create_sandbox(name: str) -> AbstractSandbox:
+    sandbox_class = load_sandbox_class(name)
+    logger.info("creating sandbox: %s", sandbox_class.__name__)
+    return sandbox_class()
@@ -0,0 +1,286 @@
+"""Fair scheduling of sandbox runs between mypy versions.
+
+Requests waiting for a sandbox are queued per mypy version and
+dispatched by deficit round robin, so a burst of requests for one
+version does not delay the others.  The queue is bounded, and requests
+are rejected immediately when they are unlikely to start in time.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Callable, Collection, Mapping
+from contextlib import asynccontextmanager
+
+from mypy_playground.sandbox.metrics import (
+    scheduler_queue_length,
+    scheduler_rejections_total,
+    scheduler_wait_duration_seconds,
+)
+
+logger = logging.getLogger(__name__)
+
+# Queue for mypy versions which are not configured, to bound the metric labels
+OTHER_VERSIONS = "other"
+
+# Smoothing factor of the moving average of run durations
+_DURATION_ALPHA = 0.2
+
+
+class SchedulerOverloadedError(Exception):
+    """Raised when a request cannot be queued"""
+
+    def __init__(self, reason: str, retry_after: float) -> None:
+        super().__init__(f"sandbox is overloaded: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_seconds(self) -> int:
+        """Value for the Retry-After header"""
+        return max(1, math.ceil(self.retry_after))
+
+
+class _Waiter:
+    def __init__(self, on_position: Callable[[int], None] | None, backend: str) -> None:
+        self.future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self.on_position = on_position
+        self.backend = backend
+        self.position = 0
+
+
+class Scheduler:
+    """Limit concurrent sandbox runs and share them fairly between versions.
+
+    Each mypy version gets a quantum of its weight (1 by default) when
+    its turn comes, and dispatches one waiting request per unit.
+    """
+
+    def __init__(
+        self,
+        concurrency: int,
+        max_queue: int,
+        max_wait: float,
+        versions: Collection[str] | None = None,
+        weights: Mapping[str, int] | None = None,
+    ) -> None:
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._versions = versions
+        self._weights = weights or {}
+        self._running = 0
+        self._queued = 0
+        self._queues: dict[str, deque[_Waiter]] = {}
+        # Versions with waiting requests in round robin order
+        self._active: deque[str] = deque()
+        self._deficits: dict[str, float] = {}
+        # Moving average of how long a sandbox run holds a slot
+        self._average_duration: float | None = None
+        # Number of waiters which want to know their position
+        self._watchers = 0
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    def projected_wait(self) -> float:
+        """Estimate how long a new request waits before it starts"""
+        if self._average_duration is None:
+            return 0.0
+        ahead = self._running + self._queued - self.concurrency + 1
+        if ahead <= 0:
+            return 0.0
+        return math.ceil(ahead / self.concurrency) * self._average_duration
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        mypy_version: str | None,
+        on_position: Callable[[int], None] | None = None,
+        backend: str = "unknown",
+    ) -> AsyncIterator[None]:
+        """Wait for a turn to run a sandbox for the mypy version
+
+        on_position is called with the position in the queue (starting
+        from 1) whenever it changes while waiting.  backend is the name
+        of the sandbox used in metrics.
+        """
+        version = self.get_queue_name(mypy_version)
+        await self._acquire(version, on_position, backend)
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - start_time)
+
+    def try_acquire(self) -> bool:
+        """Take a free slot without waiting, and return whether it was taken
+
+        This is for extra attempts of a request, such as hedged ones, which
+        should neither wait nor delay queued requests.  The slot is given
+        back with release().
+        """
+        if self._running >= self.concurrency or self._queued > 0:
+            return False
+        self._running += 1
+        return True
+
+    def release(self) -> None:
+        """Give back a slot taken by try_acquire()"""
+        self._release(None)
+
+    def get_queue_name(self, mypy_version: str | None) -> str:
+        """Get the queue of the mypy version, which is also used in metrics"""
+        if mypy_version is None:
+            return OTHER_VERSIONS
+        if self._versions is not None and mypy_version not in self._versions:
+            return OTHER_VERSIONS
+        return mypy_version
+
+    async def _acquire(
+        self, version: str, on_position: Callable[[int], None] | None, backend: str
+    ) -> None:
+        if self._running < self.concurrency and self._queued == 0:
+            self._running += 1
+            scheduler_wait_duration_seconds.labels(version, backend).observe(0)
+            return
+
+        if self._queued >= self.max_queue:
+            self._reject(version, backend, "queue_full")
+        if self.projected_wait() > self.max_wait:
+            self._reject(version, backend, "deadline")
+
+        waiter = _Waiter(on_position, backend)
+        queue = self._queues.setdefault(version, deque())
+        if not queue:
+            self._active.append(version)
+        queue.append(waiter)
+        self._queued += 1
+        scheduler_queue_length.labels(version, backend).inc()
+        if on_position is not None:
+            self._watchers += 1
+        self._notify_positions()
+
+        start_time = time.monotonic()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # The slot was handed over just before the cancellation
+                self._release(None)
+            else:
+                self._remove(version, waiter)
+            raise
+        finally:
+            if on_position is not None:
+                self._watchers -= 1
+        scheduler_wait_duration_seconds.labels(version, backend).observe(
+            time.monotonic() - start_time
+        )
+
+    def _reject(self, version: str, backend: str, reason: str) -> None:
+        retry_after = max(self.projected_wait(), self._average_duration or 0)
+        logger.warning(
+            "rejected a request: version=%s, reason=%s, queued=%d",
+            version,
+            reason,
+            self._queued,
+        )
+        scheduler_rejections_total.labels(version, backend, reason).inc()
+        raise SchedulerOverloadedError(reason, retry_after)
+
+    def _release(self, duration: float | None) -> None:
+        self._running -= 1
+        if duration is not None:
+            if self._average_duration is None:
+                self._average_duration = duration
+            else:
+                self._average_duration += _DURATION_ALPHA * (
+                    duration - self._average_duration
+                )
+        self._dispatch()
+
+    def _remove(self, version: str, waiter: _Waiter) -> None:
+        queue = self._queues.get(version)
+        if queue is None or waiter not in queue:
+            # Already skipped by _dispatch()
+            return
+        queue.remove(waiter)
+        self._queued -= 1
+        scheduler_queue_length.labels(version, waiter.backend).dec()
+        if not queue:
+            self._deactivate(version)
+        self._notify_positions()
+
+    def _deactivate(self, version: str) -> None:
+        self._active.remove(version)
+        del self._queues[version]
+        self._deficits.pop(version, None)
+
+    def _dispatch(self) -> None:
+        """Hand over free slots to waiting requests by deficit round robin"""
+        while self._running < self.concurrency and self._active:
+            version = self._active[0]
+            deficit = self._deficits.get(version, 0.0)
+            if deficit < 1:
+                deficit += self._weights.get(version, 1)
+            queue = self._queues[version]
+            waiter = queue.popleft()
+            self._queued -= 1
+            scheduler_queue_length.labels(version, waiter.backend).dec()
+            if not waiter.future.cancelled():
+                self._running += 1
+                waiter.future.set_result(None)
+                deficit -= 1
+
+            if not queue:
+                self._deactivate(version)
+            elif deficit < 1:
+                # The turn is over, move on to the next version
+                self._deficits[version] = deficit
+                self._active.rotate(-1)
+            else:
+                self._deficits[version] = deficit
+        self._notify_positions()
+
+    def _notify_positions(self) -> None:
+        """Report the positions of the waiters in the dispatch order
+
+        This follows the same deficit round robin as _dispatch() without
+        changing the state, assuming that no request arrives meanwhile.
+        """
+        if self._watchers == 0:
+            return
+        active = deque(self._active)
+        deficits = dict(self._deficits)
+        heads = dict.fromkeys(active, 0)
+        position = 0
+        while active:
+            version = active[0]
+            deficit = deficits.get(version, 0.0)
+            if deficit < 1:
+                deficit += self._weights.get(version, 1)
+            queue = self._queues[version]
+            waiter = queue[heads[version]]
+            heads[version] += 1
+            if not waiter.future.cancelled():
+                position += 1
+                deficit -= 1
+                if waiter.on_position is not None and waiter.position != position:
+                    waiter.position = position
+                    waiter.on_position(position)
+
+            if heads[version] == len(queue):
+                active.popleft()
+            elif deficit < 1:
+                deficits[version] = deficit
+                active.rotate(-1)
+            else:
+                deficits[version] = deficit
@@ -83,6 +83,45 @@ class TypecheckResponse(BaseModel):
     duration: int = Field(..., description="Duration in milliseconds")
 
 
+class TypecheckBatchRequest(TypecheckRequest):
+    """Request model for typecheck batch endpoint"""
+
+    mypyVersions: list[str] = Field(
+        ..., min_length=1, description="Mypy versions to use (mypyVersion is ignored)"
+    )
+
+
+class TypecheckBatchGroup(BaseModel):
+    """Mypy versions which produced the same output"""
+
+    mypyVersions: list[str] = Field(..., description="Mypy versions in this group")
+    exit_code: int = Field(..., description="Exit code from mypy")
+    stdout: str = Field(..., description="Standard output from mypy")
+    stderr: str = Field(..., description="Standard error from mypy")
+
+
+class TypecheckBatchResponse(BaseModel):
+    """Response model for typecheck batch endpoint"""
+
+    groups: list[TypecheckBatchGroup] = Field(
+        ..., description="Results grouped by identical output in the requested order"
+    )
+    failedMypyVersions: list[str] = Field(
+        ..., description="Mypy versions for which running mypy failed"
+    )
+
+
+class BisectRequest(TypecheckRequest):
+    """Request model for bisect endpoint"""
+
+    oldMypyVersion: str | None = Field(
+        None, description="The oldest mypy version in the range"
+    )
+    newMypyVersion: str | None = Field(
+        None, description="The newest mypy version in the range"
+    )
+
+
 class GistRequest(BaseModel):
     """Request model for gist creation endpoint"""
 
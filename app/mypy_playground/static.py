@@ -0,0 +1,100 @@
+"""Static files of the frontend with precompressed variants and caching.
+
+The frontend build writes foo.js.br and foo.js.gz next to foo.js (see
+app/frontend/scripts/compress.mjs).  They are served in place of the
+original file when the client accepts the encoding, so nothing is
+compressed per request.
+
+Files built by Vite under assets/ have a content hash in their names,
+so they never change and are cached as immutable.  Other files, such as
+index.html, are revalidated with their ETag every time.
+"""
+
+import mimetypes
+import os
+import re
+import stat
+from os import PathLike
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from mypy_playground.compression import get_accepted_encodings
+
+# Encodings in the order of preference -> suffixes of precompressed files
+_ENCODINGS = {"br": ".br", "gzip": ".gz"}
+# e.g. assets/index-BRpKjz3_.js
+_HASHED_ASSET = re.compile(r"(^|/)assets/[^/]+-[\w-]{8,}\.\w+$")
+_IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+_DEFAULT_CACHE_CONTROL = "no-cache"
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    def __init__(self, *, directory: str, html: bool = False) -> None:
+        super().__init__(directory=directory, html=html)
+        # Path of a file -> encoding -> (path, stat) of its precompressed variants
+        self._variants: dict[str, dict[str, tuple[str, os.stat_result]]] = {}
+
+    def lookup_path(self, path: str) -> tuple[str, os.stat_result | None]:
+        # Runs in a thread, so the variants are looked up here as well
+        full_path, stat_result = super().lookup_path(path)
+        if stat_result is not None and stat.S_ISREG(stat_result.st_mode):
+            variants = {}
+            for encoding, suffix in _ENCODINGS.items():
+                try:
+                    variant_stat = os.stat(full_path + suffix)
+                except OSError:
+                    continue
+                # A stale variant must not be served for an updated file
+                if variant_stat.st_mtime >= stat_result.st_mtime:
+                    variants[encoding] = (full_path + suffix, variant_stat)
+            self._variants[full_path] = variants
+        return full_path, stat_result
+
+    def file_response(
+        self,
+        full_path: PathLike[str] | str,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        variants = self._variants.get(str(full_path), {})
+        accepted = get_accepted_encodings(request_headers.get("accept-encoding", ""))
+        headers = {"Cache-Control": self._get_cache_control(str(full_path))}
+        if variants:
+            headers["Vary"] = "Accept-Encoding"
+
+        response: Response | None = None
+        for encoding in _ENCODINGS:
+            if encoding in accepted and encoding in variants:
+                variant_path, variant_stat = variants[encoding]
+                headers["Content-Encoding"] = encoding
+                # The media type is guessed from the original file name
+                response = FileResponse(
+                    variant_path,
+                    status_code=status_code,
+                    headers=headers,
+                    media_type=mimetypes.guess_type(full_path)[0] or "text/plain",
+                    stat_result=variant_stat,
+                )
+                break
+        if response is None:
+            response = FileResponse(
+                full_path,
+                status_code=status_code,
+                headers=headers,
+                stat_result=stat_result,
+            )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+    def _get_cache_control(self, full_path: str) -> str:
+        if self.directory is not None:
+            full_path = os.path.relpath(full_path, os.path.realpath(self.directory))
+        if _HASHED_ASSET.search(full_path.replace(os.sep, "/")):
+            return _IMMUTABLE_CACHE_CONTROL
+        return _DEFAULT_CACHE_CONTROL
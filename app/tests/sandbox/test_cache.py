@@ -0,0 +1,174 @@
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from mypy_playground.sandbox import run_typecheck_in_sandbox
+from mypy_playground.sandbox.base import Result
+from mypy_playground.sandbox.cache import ResultCache, make_cache_key
+
+RESULT = Result(exit_code=1, stdout="main.py:1: error", stderr="", duration=100)
+
+
+def test_make_cache_key_normalizes_flags() -> None:
+    key1 = make_cache_key(
+        "image",
+        "x = 1",
+        python_version="3.14",
+        strict=True,
+        **{
+            "show-error-codes": True,
+            "enable-error-code": ["deprecated", "redundant-expr"],
+        },
+    )
+    key2 = make_cache_key(
+        "image",
+        "x = 1",
+        python_version="3.14",
+        strict=True,
+        **{
+            "show-error-codes": True,
+            "enable-error-code": ["redundant-expr", "deprecated", "deprecated"],
+            "warn-unreachable": False,
+            "enable-incomplete-feature": [],
+        },
+    )
+    assert key1 is not None
+    assert key1 == key2
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"python_version": "3.13"},
+        {"strict": True},
+        {"enable-error-code": ["deprecated"]},
+    ],
+)
+def test_make_cache_key_differs(kwargs: dict[str, object]) -> None:
+    assert make_cache_key("image", "x = 1") != make_cache_key(
+        "image", "x = 1", **kwargs
+    )
+
+
+def test_make_cache_key_differs_by_target_and_source() -> None:
+    key = make_cache_key("image1", "x = 1")
+    assert key != make_cache_key("image2", "x = 1")
+    assert key != make_cache_key("image1", "x = 2")
+
+
+def test_make_cache_key_uncacheable() -> None:
+    assert make_cache_key("image", "x = 1", verbose=True) is None
+
+
+@pytest.mark.asyncio
+async def test_result_cache_lru() -> None:
+    cache = ResultCache(max_entries=2, ttl=60)
+    await cache.set("a", RESULT)
+    await cache.set("b", RESULT)
+    assert await cache.get("a") == RESULT
+    await cache.set("c", RESULT)
+    assert await cache.get("a") == RESULT
+    assert await cache.get("b") is None
+    assert await cache.get("c") == RESULT
+
+
+@pytest.mark.asyncio
+async def test_result_cache_memory_max_bytes() -> None:
+    result = Result(exit_code=1, stdout="x" * 100, stderr="", duration=100)
+    cache = ResultCache(max_entries=10, ttl=60, memory_max_bytes=250)
+    await cache.set("a", result)
+    await cache.set("b", result)
+    # Replacing an entry does not count it twice
+    await cache.set("b", result)
+    assert await cache.get("a") == result
+    await cache.set("c", result)
+    assert await cache.get("a") == result
+    assert await cache.get("b") is None
+    assert await cache.get("c") == result
+
+    # A result larger than the budget is not kept
+    await cache.set("d", Result(exit_code=1, stdout="x" * 300, stderr="", duration=100))
+    assert await cache.get("d") is None
+    assert await cache.get("a") == result
+
+
+@pytest.mark.asyncio
+async def test_result_cache_ttl(mocker: MockerFixture) -> None:
+    time_mock = mocker.patch("mypy_playground.sandbox.cache.time.time")
+    time_mock.return_value = 1000.0
+    cache = ResultCache(max_entries=2, ttl=60)
+    await cache.set("a", RESULT)
+    time_mock.return_value = 1059.0
+    assert await cache.get("a") == RESULT
+    time_mock.return_value = 1060.0
+    assert await cache.get("a") is None
+
+
+@pytest.mark.asyncio
+async def test_result_cache_disk(tmp_path: Path) -> None:
+    cache = ResultCache(max_entries=1, ttl=60, disk_dir=tmp_path, disk_max_bytes=1024)
+    await cache.set("a" * 64, RESULT)
+
+    # A new instance (e.g. after a restart) reads the result from disk
+    cache = ResultCache(max_entries=1, ttl=60, disk_dir=tmp_path, disk_max_bytes=1024)
+    assert await cache.get("a" * 64) == RESULT
+    assert await cache.get("b" * 64) is None
+
+
+@pytest.mark.asyncio
+async def test_result_cache_disk_eviction(tmp_path: Path) -> None:
+    cache = ResultCache(max_entries=1, ttl=60, disk_dir=tmp_path, disk_max_bytes=300)
+    for key in ("a", "b", "c"):
+        await cache.set(key * 64, RESULT)
+    total = sum(p.stat().st_size for p in tmp_path.glob("*/*.json"))
+    assert 0 < total <= 300
+
+
+@pytest.mark.asyncio
+async def test_result_cache_disk_overwrite(tmp_path: Path) -> None:
+    cache = ResultCache(max_entries=1, ttl=60, disk_dir=tmp_path, disk_max_bytes=1024)
+    for _ in range(3):
+        await cache.set("a" * 64, RESULT)
+    total = sum(p.stat().st_size for p in tmp_path.glob("*/*.json"))
+    assert cache._disk_bytes == total
+
+
+@pytest.mark.asyncio
+async def test_run_typecheck_in_sandbox_uses_cache(mocker: MockerFixture) -> None:
+    cache = ResultCache(max_entries=10, ttl=60)
+    mock_sandbox = mocker.AsyncMock()
+    mock_sandbox.resolve_target.return_value = "sha256:abc"
+    mock_sandbox.run_typecheck.return_value = RESULT
+
+    for _ in range(2):
+        result = await run_typecheck_in_sandbox(
+            mock_sandbox, "import this", cache=cache, mypy_version="latest"
+        )
+        assert result == RESULT
+    mock_sandbox.run_typecheck.assert_called_once_with(
+        "import this", mypy_version="latest"
+    )
+
+    # The alias moved to another image
+    mock_sandbox.resolve_target.return_value = "sha256:def"
+    await run_typecheck_in_sandbox(
+        mock_sandbox, "import this", cache=cache, mypy_version="latest"
+    )
+    assert mock_sandbox.run_typecheck.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_run_typecheck_in_sandbox_skips_crashes(mocker: MockerFixture) -> None:
+    cache = ResultCache(max_entries=10, ttl=60)
+    mock_sandbox = mocker.AsyncMock()
+    mock_sandbox.resolve_target.return_value = "sha256:abc"
+    for exit_code, stderr in ((2, "mypy worker crashed"), (137, "")):
+        mock_sandbox.run_typecheck.return_value = Result(
+            exit_code=exit_code, stdout="", stderr=stderr, duration=100
+        )
+        await run_typecheck_in_sandbox(
+            mock_sandbox, "import this", cache=cache, mypy_version="latest"
+        )
+    # Neither is replayed from the cache
+    assert mock_sandbox.run_typecheck.call_count == 2
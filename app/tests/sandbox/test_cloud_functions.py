@@ -0,0 +1,139 @@
+import json
+from typing import Any
+
+import httpx
+import pytest
+from prometheus_client import REGISTRY
+from pytest_mock import MockerFixture
+
+from mypy_playground.config import Settings
+from mypy_playground.sandbox.cloud_functions import CloudFunctionsSandbox
+
+
+@pytest.fixture
+def sandbox(mocker: MockerFixture) -> CloudFunctionsSandbox:
+    settings = Settings(
+        cloud_functions_base_url="https://example.com/",
+        cloud_functions_identity_token="token",  # noqa: S106
+        cloud_functions_names={"latest": "mypy-latest"},
+        cloud_functions_connect_timeout=1.0,
+    )
+    mocker.patch(
+        "mypy_playground.sandbox.cloud_functions.get_settings", return_value=settings
+    )
+    return CloudFunctionsSandbox()
+
+
+@pytest.mark.asyncio
+async def test_cloud_functions_sandbox_client(sandbox: CloudFunctionsSandbox) -> None:
+    await sandbox.start()
+    client = sandbox.client
+    assert client is not None
+    assert client.timeout.connect == 1.0
+    assert client.timeout.read == 30.0
+    await sandbox.close()
+    assert sandbox.client is None
+    assert client.is_closed
+
+
+def test_cloud_functions_sandbox_http2_requires_h2(mocker: MockerFixture) -> None:
+    settings = Settings(cloud_functions_http2=True)
+    mocker.patch(
+        "mypy_playground.sandbox.cloud_functions.get_settings", return_value=settings
+    )
+    mocker.patch("importlib.util.find_spec", return_value=None)
+    with pytest.raises(RuntimeError, match=r"httpx\[http2\]"):
+        CloudFunctionsSandbox()
+
+
+@pytest.mark.asyncio
+async def test_cloud_functions_sandbox_run_typecheck(
+    sandbox: CloudFunctionsSandbox,
+) -> None:
+    requests: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(
+            200, json={"exit_code": 0, "stdout": "Success", "stderr": ""}
+        )
+
+    sandbox.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    for _ in range(2):
+        result = await sandbox.run_typecheck(
+            "x = 1", mypy_version="latest", python_version="3.14"
+        )
+        assert result is not None
+        assert result.stdout == "Success"
+
+    assert len(requests) == 2
+    assert str(requests[0].url) == "https://example.com/mypy-latest"
+    assert requests[0].headers["authorization"] == "Bearer token"
+    assert json.loads(requests[0].content)["options"][-2:] == [
+        "--python-version",
+        "3.14",
+    ]
+    await sandbox.close()
+
+
+@pytest.mark.asyncio
+async def test_cloud_functions_sandbox_output_limit(
+    sandbox: CloudFunctionsSandbox, mocker: MockerFixture
+) -> None:
+    settings = Settings(
+        cloud_functions_base_url="https://example.com/",
+        cloud_functions_identity_token="token",  # noqa: S106
+        cloud_functions_names={"latest": "mypy-latest"},
+        sandbox_max_output_bytes=10,
+    )
+    mocker.patch(
+        "mypy_playground.sandbox.cloud_functions.get_settings", return_value=settings
+    )
+    stdout = "x" * 100
+    omitted_bytes: dict[str, int] | None = None
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert json.loads(request.content)["max_output_bytes"] == 10
+        data: dict[str, Any] = {"exit_code": 1, "stdout": stdout, "stderr": ""}
+        if omitted_bytes is not None:
+            data["omitted_bytes"] = omitted_bytes
+        return httpx.Response(200, json=data)
+
+    # Functions which do not truncate the output
+    sandbox.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    result = await sandbox.run_typecheck("x = 1", mypy_version="latest")
+    assert result is not None
+    assert result.stdout == "x" * 10 + "\n[output truncated: 90 more bytes]"
+    assert result.stderr == ""
+
+    # Output truncated by the function is kept as it is
+    stdout = "x" * 10 + "\n[output truncated: 125 more bytes]"
+    omitted_bytes = {"stdout": 125, "stderr": 0}
+    result = await sandbox.run_typecheck("x = 1", mypy_version="latest")
+    assert result is not None
+    assert result.stdout == stdout
+
+    # Responses much larger than the limit are not read entirely
+    stdout = "x" * 1024 * 1024
+    assert await sandbox.run_typecheck("x = 1", mypy_version="latest") is None
+    await sandbox.close()
+
+
+@pytest.mark.asyncio
+async def test_cloud_functions_sandbox_cache(sandbox: CloudFunctionsSandbox) -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert json.loads(request.content)["use_cache"] is True
+        cache = {"hit": True, "hits": 3, "misses": 1, "hit_ratio": 0.75}
+        return httpx.Response(
+            200,
+            json={"exit_code": 0, "stdout": "Success", "stderr": "", "cache": cache},
+        )
+
+    labels = {"mypy_version": "latest", "result": "hit"}
+    name = "mypy_play_sandbox_cloud_functions_cache_requests_total"
+    before = REGISTRY.get_sample_value(name, labels) or 0.0
+    sandbox.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    result = await sandbox.run_typecheck("x = 1", mypy_version="latest")
+    assert result is not None
+    assert REGISTRY.get_sample_value(name, labels) == before + 1
+    await sandbox.close()
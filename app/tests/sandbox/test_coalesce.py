@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from mypy_playground.sandbox.base import Result
+from mypy_playground.sandbox.coalesce import RequestCoalescer
+
+RESULT = Result(exit_code=0, stdout="Success", stderr="", duration=100)
+
+
+@pytest.mark.asyncio
+async def test_coalesce_identical_requests() -> None:
+    coalescer = RequestCoalescer()
+    calls = 0
+    event = asyncio.Event()
+
+    async def func() -> Result | None:
+        nonlocal calls
+        calls += 1
+        await event.wait()
+        return RESULT
+
+    tasks = [asyncio.create_task(coalescer.run("key", func)) for _ in range(5)]
+    await asyncio.sleep(0)
+    event.set()
+    assert await asyncio.gather(*tasks) == [RESULT] * 5
+    assert calls == 1
+
+    # Finished jobs are not reused
+    assert await coalescer.run("key", func) == RESULT
+    assert calls == 2
+
+
+@pytest.mark.asyncio
+async def test_coalesce_leader_cancelled() -> None:
+    coalescer = RequestCoalescer()
+    event = asyncio.Event()
+
+    async def func() -> Result | None:
+        await event.wait()
+        return RESULT
+
+    leader = asyncio.create_task(coalescer.run("key", func))
+    follower = asyncio.create_task(coalescer.run("key", func))
+    await asyncio.sleep(0)
+    leader.cancel()
+    await asyncio.sleep(0)
+    event.set()
+    assert await follower == RESULT
+    assert leader.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_coalesce_all_waiters_cancelled() -> None:
+    coalescer = RequestCoalescer()
+    cancelled = asyncio.Event()
+
+    async def func() -> Result | None:
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return RESULT
+
+    task = asyncio.create_task(coalescer.run("key", func))
+    await asyncio.sleep(0)
+    task.cancel()
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_coalesce_failure() -> None:
+    coalescer = RequestCoalescer()
+    event = asyncio.Event()
+
+    async def func() -> Result | None:
+        await event.wait()
+        raise RuntimeError("failed")
+
+    tasks = [asyncio.create_task(coalescer.run("key", func)) for _ in range(3)]
+    await asyncio.sleep(0)
+    event.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+    async def succeed() -> Result | None:
+        return RESULT
+
+    # Failures are not reused
+    assert await coalescer.run("key", succeed) == RESULT
@@ -0,0 +1,228 @@
+import errno
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any
+
+import pytest
+from pytest_mock import MockerFixture
+
+from mypy_playground.config import Settings
+from mypy_playground.sandbox import daemon_worker
+from mypy_playground.sandbox.daemon import DaemonSandbox
+
+
+class FakeWorker:
+    def __init__(self) -> None:
+        self.container = object()
+        self.stream = None
+        self.jobs = 0
+        self.rss = 0
+        self.received: list[dict[str, Any]] = []
+
+    async def run(self, job: dict[str, Any]) -> dict[str, Any]:
+        self.jobs += 1
+        self.received.append(job)
+        return {"exit_code": 0, "stdout": "Success\n", "stderr": ""}
+
+
+@pytest.fixture
+def settings() -> Settings:
+    return Settings(docker_images={"latest": "sandbox:latest"}, daemon_max_jobs=2)
+
+
+@pytest.fixture
+def sandbox(mocker: MockerFixture, settings: Settings) -> DaemonSandbox:
+    mocker.patch("mypy_playground.sandbox.daemon.get_settings", return_value=settings)
+    mocker.patch("mypy_playground.sandbox.docker.get_settings", return_value=settings)
+    mocker.patch("mypy_playground.sandbox.docker.aiodocker.Docker")
+    sandbox = DaemonSandbox()
+    mocker.patch.object(sandbox, "_spawn", side_effect=lambda _: FakeWorker())
+    mocker.patch.object(sandbox, "_retire")
+    return sandbox
+
+
+@pytest.mark.asyncio
+async def test_daemon_sandbox_reuses_workers(sandbox: DaemonSandbox) -> None:
+    result = await sandbox.run_typecheck(
+        "x = 1", mypy_version="latest", python_version="3.14", strict=True
+    )
+    assert result is not None
+    assert result.stdout == "Success"
+    await sandbox.run_typecheck("x = 1", mypy_version="latest", python_version="3.14")
+    assert sandbox._spawn.call_count == 1  # type: ignore[attr-defined]
+
+    # Recycled after daemon_max_jobs
+    sandbox._retire.assert_called_once()  # type: ignore[attr-defined]
+    worker = sandbox._retire.call_args.args[0]  # type: ignore[attr-defined]
+    assert worker.received[0]["options"] == [
+        "--no-site-packages",
+        "--python-version",
+        "3.14",
+        "--strict",
+    ]
+
+    # Workers are not shared between Python versions
+    await sandbox.run_typecheck("x = 1", mypy_version="latest", python_version="3.13")
+    assert sandbox._spawn.call_count == 2  # type: ignore[attr-defined]
+
+
+@pytest.mark.asyncio
+async def test_daemon_sandbox_max_idle_workers(
+    sandbox: DaemonSandbox, settings: Settings
+) -> None:
+    settings.daemon_max_idle_workers = 1
+    await sandbox.run_typecheck("x = 1", mypy_version="latest", python_version="3.14")
+    worker = sandbox._idle_workers[("sandbox:latest", "3.14")][0]
+    await sandbox.run_typecheck("x = 1", mypy_version="latest", python_version="3.13")
+    # The least recently used worker is recycled
+    assert not sandbox._idle_workers[("sandbox:latest", "3.14")]
+    assert len(sandbox._idle_workers[("sandbox:latest", "3.13")]) == 1
+    retire: Any = sandbox._retire
+    retire.assert_called_once_with(worker, "idle")
+
+
+@pytest.mark.asyncio
+async def test_daemon_sandbox_recycles_on_memory(
+    sandbox: DaemonSandbox, settings: Settings
+) -> None:
+    class HungryWorker(FakeWorker):
+        async def run(self, job: dict[str, Any]) -> dict[str, Any]:
+            response = await super().run(job)
+            self.rss = settings.daemon_max_rss + 1
+            return response
+
+    worker = HungryWorker()
+    sandbox._spawn.side_effect = lambda _: worker  # type: ignore[attr-defined]
+    await sandbox.run_typecheck("x = 1", mypy_version="latest")
+    retire: Any = sandbox._retire
+    retire.assert_called_once_with(worker, "memory")
+
+
+@pytest.mark.asyncio
+async def test_daemon_sandbox_unknown_version(sandbox: DaemonSandbox) -> None:
+    assert await sandbox.run_typecheck("x = 1", mypy_version="unknown") is None
+
+
+def test_daemon_worker_run_job(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    work_dir = tmp_path / "work"
+    cache_dir = tmp_path / "cache"
+    work_dir.mkdir()
+    monkeypatch.setattr(daemon_worker, "WORK_DIR", str(work_dir))
+    monkeypatch.setattr(daemon_worker, "CACHE_DIR", str(cache_dir))
+    monkeypatch.chdir(work_dir)
+
+    job = {"source": 'secret_name: int = "a"\n', "options": ["--no-site-packages"]}
+    result = daemon_worker.run_job(job)
+    assert result["exit_code"] == 1
+    assert "main.py:1: error" in result["stdout"]
+
+    # The standard library is cached, but the user's module is not
+    cached_files = [p for p in cache_dir.rglob("*") if p.is_file()]
+    assert cached_files
+    assert all(b"secret_name" not in p.read_bytes() for p in cached_files)
+    assert not (work_dir / "main.py").exists()
+
+    result = daemon_worker.run_job({"source": "x: int = 1\n", "options": []})
+    assert result["exit_code"] == 0
+
+
+def test_daemon_worker_partial_base_cache(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(daemon_worker, "CACHE_DIR", str(tmp_path))
+
+    def run_mypy(source: str, options: list[str], cache_dir: str, **kwargs: Any) -> Any:
+        # Killed while writing the cache
+        (Path(cache_dir) / "partial.json").write_text("{")
+        return {"exit_code": 2, "stdout": "", "stderr": "mypy worker crashed"}
+
+    monkeypatch.setattr(daemon_worker, "run_mypy", run_mypy)
+    base_cache_dir = daemon_worker.get_base_cache_dir([])
+    daemon_worker.build_base_cache([], base_cache_dir, {}, False)
+    assert not Path(base_cache_dir).exists()
+    assert not list(Path(base_cache_dir).parent.iterdir())
+
+
+def test_daemon_worker_reports_peak_rss(monkeypatch: pytest.MonkeyPatch) -> None:
+    def run_child(*args: Any) -> None:
+        # The job, rather than the long-lived parent, uses the memory
+        data = b"x" * (64 * 1024 * 1024)
+        with os.fdopen(args[-1], "w") as w:
+            json.dump({"exit_code": 0, "stdout": str(len(data)), "stderr": ""}, w)
+
+    monkeypatch.setattr(daemon_worker, "run_child", run_child)
+    result = daemon_worker.run_mypy("", [], "/dev/null")
+    assert result["rss"] >= 64 * 1024 * 1024
+
+
+def fake_run_mypy(
+    source: str, options: list[str], cache_dir: str, *args: Any, **kwargs: Any
+) -> Any:
+    os.makedirs(cache_dir, exist_ok=True)
+    (Path(cache_dir) / "builtins.data.json").write_text("{}")
+    return {"exit_code": 0, "stdout": "", "stderr": "", "rss": 0}
+
+
+def test_daemon_worker_evicts_base_caches(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(daemon_worker, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(daemon_worker, "CACHE_MAX_PROFILES", 2)
+    monkeypatch.setattr(daemon_worker, "run_mypy", fake_run_mypy)
+    for options in ([], ["--strict"], ["--warn-unreachable"]):
+        daemon_worker.run_job({"source": "", "options": options})
+    base_dirs = sorted(p.name for p in (tmp_path / "base").iterdir())
+    assert base_dirs == sorted(
+        Path(daemon_worker.get_base_cache_dir(options)).name
+        for options in (["--strict"], ["--warn-unreachable"])
+    )
+
+
+def test_daemon_worker_survives_full_tmp(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(daemon_worker, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(daemon_worker, "run_mypy", fake_run_mypy)
+
+    def copytree(src: str, dst: str) -> None:
+        os.makedirs(dst)
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr("shutil.copytree", copytree)
+    # The job runs without the warm cache
+    result = daemon_worker.run_job({"source": "x = 1", "options": []})
+    assert result["exit_code"] == 0
+    assert not (tmp_path / "job").exists()
+
+
+def test_daemon_worker_truncate() -> None:
+    assert daemon_worker.truncate("abc", 0) == "abc"
+    assert daemon_worker.truncate("abc", 3) == "abc"
+    # A multi-byte character is not split
+    assert daemon_worker.truncate("a→b", 2) == "a\n[output truncated: 3 more bytes]"
+
+
+def test_daemon_worker_limits() -> None:
+    # Run in a new process, as neither can be undone
+    code = """
+import resource, socket
+from mypy_playground.sandbox import daemon_worker
+daemon_worker.set_limits({"cpu": 5, "as": 0})
+assert resource.getrlimit(resource.RLIMIT_CPU) == (5, 5)
+daemon_worker.block_network()
+try:
+    socket.create_connection(("127.0.0.1", 1))
+except PermissionError:
+    print("blocked")
+"""
+    process = subprocess.run(  # noqa: S603
+        [sys.executable, "-c", code],
+        capture_output=True,
+        check=True,
+        cwd=Path(__file__).parents[2],
+        text=True,
+    )
+    assert process.stdout == "blocked\n"
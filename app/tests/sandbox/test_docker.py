@@ -1,6 +1,9 @@
-import tarfile
+import asyncio
+import json
+from typing import Self
 
 import pytest
+from aiodocker.stream import Message
 from pytest_mock import MockerFixture
 
 from mypy_playground.sandbox.docker import DockerSandbox
@@ -12,17 +15,153 @@ print(this.__name__)
 
 
 @pytest.mark.asyncio
-async def test_create_archive(mocker: MockerFixture) -> None:
-    # DockerSandbox checks existence of DOCKER_HOST or local sockets in __init__().
+async def test_get_cache_dir(mocker: MockerFixture) -> None:
     mocker.patch("mypy_playground.sandbox.docker.aiodocker.Docker")
     sandbox = DockerSandbox()
-    tar_bytes = sandbox._create_archive(SAMPLE_CODE)
-    with tarfile.open(fileobj=tar_bytes, mode="r") as tar:
-        members = tar.getmembers()
-        assert len(members) == 1
-        member = members[0]
-        assert member.name == "main.py"
-        assert member.size == len(SAMPLE_CODE.encode())
-        extracted = tar.extractfile(member)
-        assert extracted is not None
-        assert extracted.read().decode() == SAMPLE_CODE
+    assert sandbox._get_cache_dir("3.14") == "/opt/mypy-cache/3.14/default"
+    assert (
+        sandbox._get_cache_dir("3.14", strict=True, **{"show-error-codes": True})
+        == "/opt/mypy-cache/3.14/strict"
+    )
+    assert sandbox._get_cache_dir("3.14", **{"warn-unreachable": True}) is None
+    assert sandbox._get_cache_dir("3.14", **{"enable-error-code": ["ignore"]}) is None
+    assert sandbox._get_cache_dir(None) is None
+
+
+class FakeStream:
+    def __init__(self, messages: list[Message]) -> None:
+        self.messages = messages
+        self.written = b""
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(self, *args: object) -> None:
+        pass
+
+    async def write_in(self, data: bytes) -> None:
+        self.written += data
+
+    async def read_out(self) -> Message | None:
+        return self.messages.pop(0) if self.messages else None
+
+
+@pytest.mark.asyncio
+async def test_read_output(mocker: MockerFixture) -> None:
+    mocker.patch("mypy_playground.sandbox.docker.aiodocker.Docker")
+    sandbox = DockerSandbox()
+    stream = FakeStream(
+        [
+            Message(1, b"main.py:1: error: "),
+            Message(2, b"warn\n"),
+            # A multi-byte character split between messages
+            Message(1, "a \u2192\nmain.py:2: error: b\n".encode()[: 12 + 9]),
+            Message(1, "a \u2192\nmain.py:2: error: b\n".encode()[12 + 9 :]),
+            Message(1, b"Found 2"),
+        ]
+    )
+    lines: list[tuple[str, str]] = []
+    stdout, stderr = await sandbox._read_output(
+        stream,  # type: ignore[arg-type]
+        lambda stream, line: lines.append((stream, line)),
+    )
+    assert stdout == "main.py:1: error: a \u2192\nmain.py:2: error: b\nFound 2"
+    assert stderr == "warn"
+    assert lines == [
+        ("stderr", "warn"),
+        ("stdout", "main.py:1: error: a \u2192"),
+        ("stdout", "main.py:2: error: b"),
+        ("stdout", "Found 2"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_read_output_truncated(mocker: MockerFixture) -> None:
+    mocker.patch("mypy_playground.sandbox.docker.aiodocker.Docker")
+    sandbox = DockerSandbox()
+    stream = FakeStream(
+        [
+            Message(1, b"line 1\nline 2\n"),
+            Message(2, b"warn\n"),
+            Message(1, b"line 3\n"),
+        ]
+    )
+    lines: list[tuple[str, str]] = []
+    stdout, stderr = await sandbox._read_output(
+        stream,  # type: ignore[arg-type]
+        lambda stream, line: lines.append((stream, line)),
+        max_bytes=10,
+    )
+    assert stdout == "line 1\nlin\n[output truncated: 11 more bytes]"
+    assert stderr == "warn"
+    assert stream.messages == []
+    assert lines == [
+        ("stdout", "line 1"),
+        ("stderr", "warn"),
+        ("stdout", "lin"),
+        ("stdout", "[output truncated: 11 more bytes]"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_run_typecheck(mocker: MockerFixture) -> None:
+    mocker.patch("mypy_playground.sandbox.docker.aiodocker.Docker")
+    mocker.patch.object(
+        DockerSandbox, "_get_docker_image", return_value="ymyzk/mypy-playground:latest"
+    )
+    sandbox = DockerSandbox()
+    container = mocker.AsyncMock()
+    mocker.patch.object(sandbox, "_create_container", return_value=container)
+    stream = FakeStream([Message(1, b"Success: no issues found in 1 source file\n")])
+    container.attach = mocker.Mock(return_value=stream)
+    container.wait.return_value = {"StatusCode": 0}
+
+    result = await sandbox.run_typecheck(
+        SAMPLE_CODE, mypy_version="latest", python_version="3.14"
+    )
+    assert result is not None
+    assert result.exit_code == 0
+    assert result.stdout == "Success: no issues found in 1 source file"
+    assert result.stderr == ""
+    header, source = stream.written.split(b"\n", 1)
+    job = json.loads(header)
+    assert job["size"] == len(source)
+    assert source.decode() == SAMPLE_CODE
+    assert job["path"] == str(sandbox.source_file_path)
+    assert job["args"][-1] == "main.py"
+    await asyncio.gather(*sandbox._deleting)
+    # The exited container is deleted after the result is known
+    assert container.method_calls == [
+        mocker.call.attach(stdin=True, stdout=True, stderr=True),
+        mocker.call.start(),
+        mocker.call.wait(),
+        mocker.call.delete(force=True),
+    ]
+
+
+class HangingStream(FakeStream):
+    async def read_out(self) -> Message | None:
+        await asyncio.Event().wait()
+        return None
+
+
+@pytest.mark.asyncio
+async def test_run_typecheck_cancelled(mocker: MockerFixture) -> None:
+    mocker.patch("mypy_playground.sandbox.docker.aiodocker.Docker")
+    mocker.patch.object(
+        DockerSandbox, "_get_docker_image", return_value="ymyzk/mypy-playground:latest"
+    )
+    sandbox = DockerSandbox()
+    container = mocker.AsyncMock()
+    mocker.patch.object(sandbox, "_create_container", return_value=container)
+    container.attach = mocker.Mock(return_value=HangingStream([]))
+
+    task = asyncio.create_task(
+        sandbox.run_typecheck(SAMPLE_CODE, mypy_version="latest")
+    )
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    # The running container is killed rather than left to finish
+    container.delete.assert_awaited_once_with(force=True)
@@ -0,0 +1,128 @@
+import asyncio
+import itertools
+
+import pytest
+from pytest_mock import MockerFixture
+
+from mypy_playground.config import Settings
+from mypy_playground.sandbox.docker_pool import ContainerPool
+
+IMAGES = {"latest": "sandbox:latest", "1.0.0": "sandbox:1.0.0"}
+
+
+@pytest.fixture
+def settings(mocker: MockerFixture) -> Settings:
+    settings = Settings(docker_images=IMAGES, docker_pool_size=2)
+    mocker.patch(
+        "mypy_playground.sandbox.docker_pool.get_settings", return_value=settings
+    )
+    return settings
+
+
+@pytest.fixture
+def pool(mocker: MockerFixture) -> ContainerPool:
+    counter = itertools.count()
+
+    async def create_container(image: str) -> str:
+        return f"{image}#{next(counter)}"
+
+    return ContainerPool(create_container, mocker.AsyncMock())
+
+
+async def _wait_for_depth(pool: ContainerPool, image: str, depth: int) -> None:
+    for _ in range(100):
+        if len(pool._containers[image]) == depth:
+            return
+        await asyncio.sleep(0)
+    raise AssertionError(f"pool for {image} did not reach {depth}")
+
+
+@pytest.mark.asyncio
+async def test_pool_acquire_and_refill(settings: Settings, pool: ContainerPool) -> None:
+    await pool.start()
+    try:
+        await _wait_for_depth(pool, "sandbox:latest", 2)
+        await _wait_for_depth(pool, "sandbox:1.0.0", 2)
+
+        first = await pool.acquire("latest", "sandbox:latest")
+        second = await pool.acquire("latest", "sandbox:latest")
+        assert first != second
+        assert first.startswith("sandbox:latest#")
+
+        # Containers are never handed out twice and the pool is refilled
+        await _wait_for_depth(pool, "sandbox:latest", 2)
+        assert first not in [c for _, c in pool._containers["sandbox:latest"]]
+    finally:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_cold_miss(mocker: MockerFixture) -> None:
+    create_container = mocker.AsyncMock(return_value="container")
+    pool = ContainerPool(create_container, mocker.AsyncMock())
+    assert await pool.acquire("latest", "sandbox:latest") == "container"
+    create_container.assert_called_once_with("sandbox:latest")
+
+
+@pytest.mark.asyncio
+async def test_pool_discard(settings: Settings, mocker: MockerFixture) -> None:
+    delete_container = mocker.AsyncMock()
+    pool = ContainerPool(mocker.AsyncMock(return_value="container"), delete_container)
+    await pool._refill("sandbox:latest", 2)
+    await pool.discard("sandbox:latest")
+    assert delete_container.call_count == 2
+    assert len(pool._containers["sandbox:latest"]) == 0
+
+
+def test_pool_rebalance_by_traffic(settings: Settings, pool: ContainerPool) -> None:
+    settings.docker_pool_size = 1
+    settings.docker_pool_sizes = {"1.0.0": 0}
+    settings.docker_pool_traffic_budget = 4
+    pool._rebalance()
+    assert pool._targets == {"sandbox:latest": 1, "sandbox:1.0.0": 0}
+
+    pool._recent_traffic["latest"] = 3
+    pool._recent_traffic["1.0.0"] = 1
+    pool._rebalance()
+    assert pool._targets == {"sandbox:latest": 4, "sandbox:1.0.0": 1}
+
+
+@pytest.mark.asyncio
+async def test_pool_replaces_old_containers(mocker: MockerFixture) -> None:
+    counter = itertools.count()
+
+    async def create_container(image: str) -> str:
+        return f"{image}#{next(counter)}"
+
+    delete_container = mocker.AsyncMock()
+    pool = ContainerPool(create_container, delete_container, max_age=600)
+    await pool._refill("sandbox:latest", 2)
+    created_time, old = pool._containers["sandbox:latest"][0]
+    pool._containers["sandbox:latest"][0] = (created_time - 600, old)
+
+    await pool._refill("sandbox:latest", 2)
+    delete_container.assert_called_once_with(old)
+    containers = [c for _, c in pool._containers["sandbox:latest"]]
+    assert containers == ["sandbox:latest#1", "sandbox:latest#2"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("error", [TimeoutError(), RuntimeError("unexpected")])
+async def test_pool_survives_refill_errors(
+    settings: Settings, mocker: MockerFixture, error: Exception
+) -> None:
+    settings.docker_images = {"latest": "sandbox:latest"}
+    settings.docker_pool_size = 1
+    create_container = mocker.AsyncMock(side_effect=[error, "container"])
+    pool = ContainerPool(create_container, mocker.AsyncMock())
+    await pool.start()
+    try:
+        for _ in range(100):
+            if create_container.call_count:
+                break
+            await asyncio.sleep(0)
+        # The refill loop is still alive for the next request
+        pool._refill_needed.set()
+        await _wait_for_depth(pool, "sandbox:latest", 1)
+    finally:
+        await pool.close()
@@ -0,0 +1,87 @@
+import asyncio
+import time
+from typing import Any
+
+import aiodocker
+import aiohttp
+import pytest
+from aiodocker.containers import DockerContainer
+from pytest_mock import MockerFixture
+
+from mypy_playground.sandbox.docker import (
+    CREATED_LABEL,
+    OWNER_LABEL,
+    WORKER_LABEL,
+    DockerSandbox,
+)
+from mypy_playground.sandbox.docker_reaper import ContainerReaper
+
+
+def make_container(
+    mocker: MockerFixture, container_id: str, owner: str, age: float, state: str
+) -> Any:
+    c: Any = DockerContainer(
+        mocker.Mock(),
+        Id=container_id,
+        State=state,
+        Created=int(time.time()),
+        Labels={OWNER_LABEL: owner, CREATED_LABEL: str(int(time.time() - age))},
+    )
+    c.delete = mocker.AsyncMock()
+    return c
+
+
+@pytest.mark.asyncio
+async def test_reap(mocker: MockerFixture) -> None:
+    mocker.patch("mypy_playground.sandbox.docker.aiodocker.Docker")
+    sandbox = DockerSandbox()
+    sandbox.containers_in_use = {"pooled"}
+    me = sandbox.instance_id
+    containers = [
+        make_container(mocker, "pooled", me, 3600, "created"),
+        make_container(mocker, "running", me, 10, "running"),
+        make_container(mocker, "exited", me, 10, "exited"),
+        make_container(mocker, "stale", me, 3600, "created"),
+        make_container(mocker, "other-running", "other", 10, "running"),
+        make_container(mocker, "other-exited", "other", 900, "exited"),
+        # Still pooled, running or being read in another instance
+        make_container(mocker, "other-just-exited", "other", 10, "exited"),
+        make_container(mocker, "other-pooled", "other", 900, "created"),
+        make_container(mocker, "other-long-running", "other", 900, "running"),
+        make_container(mocker, "other-abandoned", "other", 3600, "created"),
+        make_container(mocker, "other-worker", "other", 3600, "running"),
+        make_container(mocker, "removed", "other", 3600, "exited"),
+    ]
+    containers[-2]["Labels"][WORKER_LABEL] = "1"
+    containers[-1].delete.side_effect = aiodocker.exceptions.DockerError(
+        404, "no such container"
+    )
+    mocker.patch.object(
+        sandbox.client.containers, "list", mocker.AsyncMock(return_value=containers)
+    )
+
+    reaper = ContainerReaper(sandbox, interval=60, max_age=600, batch_size=2)
+    assert await reaper.reap() == 4
+    deleted = {c.id for c in containers if c.delete.called}
+    assert deleted == {"exited", "stale", "other-exited", "other-abandoned", "removed"}
+
+
+@pytest.mark.asyncio
+async def test_reaper_survives_connection_errors(mocker: MockerFixture) -> None:
+    mocker.patch("mypy_playground.sandbox.docker.aiodocker.Docker")
+    reaper = ContainerReaper(DockerSandbox(), interval=0.001, max_age=600, batch_size=1)
+    called = asyncio.Event()
+    errors = [aiohttp.ClientConnectionError("reset"), TimeoutError()]
+
+    async def reap() -> int:
+        if errors:
+            raise errors.pop()
+        called.set()
+        return 0
+
+    mocker.patch.object(reaper, "reap", side_effect=reap)
+    await reaper.start()
+    await asyncio.wait_for(called.wait(), timeout=5)
+    assert reaper._task is not None
+    assert not reaper._task.done()
+    await reaper.close()
@@ -0,0 +1,147 @@
+import asyncio
+from typing import Any
+
+import pytest
+from prometheus_client import REGISTRY
+from pytest_mock import MockerFixture
+
+from mypy_playground.config import Settings
+from mypy_playground.sandbox.base import AbstractSandbox, Result
+from mypy_playground.sandbox.hedged import HedgedSandbox, LatencyTracker
+from mypy_playground.sandbox.scheduler import Scheduler
+
+
+class FakeSandbox(AbstractSandbox):
+    def __init__(self, backend: str, latency: float, fail: bool = False) -> None:
+        self.backend = backend
+        self.latency = latency
+        self.fail = fail
+        self.cancelled = False
+
+    async def run_typecheck(
+        self,
+        source: str,
+        /,
+        mypy_version: str,
+        python_version: str | None = None,
+        **kwargs: Any,
+    ) -> Result | None:
+        try:
+            await asyncio.sleep(self.latency)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.fail:
+            return None
+        return Result(exit_code=0, stdout=self.backend, stderr="", duration=0)
+
+    async def resolve_target(self, mypy_version: str) -> str | None:
+        return f"{self.backend}:{mypy_version}"
+
+
+def create_hedged_sandbox(
+    mocker: MockerFixture, *sandboxes: FakeSandbox
+) -> HedgedSandbox:
+    settings = Settings(
+        hedged_backends=[
+            "mypy_playground.sandbox.docker.DockerSandbox",
+            "mypy_playground.sandbox.cloud_functions.CloudFunctionsSandbox",
+        ],
+        hedged_initial_delay=0.05,
+    )
+    mocker.patch("mypy_playground.sandbox.hedged.get_settings", return_value=settings)
+    mocker.patch("mypy_playground.sandbox.hedged.create_sandbox", side_effect=sandboxes)
+    sandbox = HedgedSandbox()
+    sandbox.scheduler = Scheduler(concurrency=2, max_queue=10, max_wait=60)
+    return sandbox
+
+
+def get_sample_value(name: str, **labels: str) -> float:
+    return REGISTRY.get_sample_value(f"mypy_play_sandbox_{name}", labels) or 0.0
+
+
+@pytest.mark.asyncio
+async def test_hedged_sandbox_hedges_slow_requests(mocker: MockerFixture) -> None:
+    slow = FakeSandbox("hedge_slow", latency=10)
+    fast = FakeSandbox("hedge_fast", latency=0.01)
+    sandbox = create_hedged_sandbox(mocker, slow, fast)
+
+    result = await sandbox.run_typecheck("x = 1", mypy_version="latest")
+    assert result is not None
+    assert result.stdout == "hedge_fast"
+    await sandbox.close()
+    # The losing attempt is cancelled, and the slot of the hedge is released
+    assert slow.cancelled
+    assert sandbox.scheduler is not None
+    assert sandbox.scheduler.running == 0
+    assert get_sample_value("hedged_requests_total", backend="hedge_slow") == 1
+    assert (
+        get_sample_value("hedged_winners_total", backend="hedge_fast", attempt="hedge")
+        == 1
+    )
+
+
+@pytest.mark.asyncio
+async def test_hedged_sandbox_first_backend_wins(mocker: MockerFixture) -> None:
+    first = FakeSandbox("first_fast", latency=0)
+    second = FakeSandbox("first_unused", latency=0)
+    sandbox = create_hedged_sandbox(mocker, first, second)
+
+    result = await sandbox.run_typecheck("x = 1", mypy_version="latest")
+    assert result is not None
+    assert result.stdout == "first_fast"
+    assert get_sample_value("hedged_requests_total", backend="first_fast") == 0
+    # Keyed on the first backend, even if the others cannot resolve it
+    mocker.patch.object(second, "resolve_target", return_value=None)
+    assert await sandbox.resolve_target("latest") == "hedged:first_fast:latest"
+
+
+@pytest.mark.asyncio
+async def test_hedged_sandbox_falls_back_on_errors(mocker: MockerFixture) -> None:
+    broken = FakeSandbox("fallback_broken", latency=0, fail=True)
+    working = FakeSandbox("fallback_working", latency=0)
+    sandbox = create_hedged_sandbox(mocker, broken, working)
+
+    result = await sandbox.run_typecheck("x = 1", mypy_version="latest")
+    assert result is not None
+    assert result.stdout == "fallback_working"
+    assert (
+        get_sample_value("hedged_attempt_failures_total", backend="fallback_broken")
+        == 1
+    )
+    assert (
+        get_sample_value(
+            "hedged_winners_total", backend="fallback_working", attempt="fallback"
+        )
+        == 1
+    )
+
+    working.fail = True
+    assert await sandbox.run_typecheck("x = 1", mypy_version="latest") is None
+
+
+@pytest.mark.asyncio
+async def test_hedged_sandbox_respects_concurrency(mocker: MockerFixture) -> None:
+    slow = FakeSandbox("busy_slow", latency=0.1)
+    fast = FakeSandbox("busy_fast", latency=0)
+    sandbox = create_hedged_sandbox(mocker, slow, fast)
+    scheduler = Scheduler(concurrency=1, max_queue=10, max_wait=60)
+    sandbox.scheduler = scheduler
+
+    # The request itself holds the only slot
+    async with scheduler.slot("latest"):
+        result = await sandbox.run_typecheck("x = 1", mypy_version="latest")
+    assert result is not None
+    assert result.stdout == "busy_slow"
+    assert get_sample_value("hedged_requests_total", backend="busy_slow") == 0
+
+
+def test_latency_tracker() -> None:
+    tracker = LatencyTracker(window=100)
+    for i in range(19):
+        tracker.observe("latest", i / 100)
+    assert tracker.percentile("latest", 95) is None
+    tracker.observe("latest", 1.0)
+    assert tracker.percentile("latest", 50) == 0.09
+    assert tracker.percentile("latest", 100) == 1.0
+    assert tracker.percentile("master", 50) is None
@@ -0,0 +1,69 @@
+import asyncio
+import base64
+import json
+import threading
+import time
+
+import pytest
+
+from mypy_playground.sandbox import identity_token
+from mypy_playground.sandbox.identity_token import IdentityTokenProvider
+
+
+def make_token(expiry: float) -> str:
+    payload = base64.urlsafe_b64encode(json.dumps({"exp": expiry}).encode())
+    return f"header.{payload.decode().rstrip('=')}.signature"
+
+
+@pytest.mark.asyncio
+async def test_identity_token_provider_caches_tokens() -> None:
+    calls: list[str] = []
+    threads: set[int] = set()
+
+    def fetch(audience: str) -> str:
+        calls.append(audience)
+        threads.add(threading.get_ident())
+        time.sleep(0.01)
+        return make_token(time.time() + 3600)
+
+    provider = IdentityTokenProvider(fetch)
+    tokens = await asyncio.gather(*(provider.get("a") for _ in range(5)))
+    assert len(set(tokens)) == 1
+    assert await provider.get("a") == tokens[0]
+    assert calls == ["a"]
+    # Fetched outside of the event loop
+    assert threading.get_ident() not in threads
+
+    await provider.get("b")
+    assert calls == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_identity_token_provider_refreshes_in_background() -> None:
+    expiries = [time.time() + 120, time.time() + 3600]
+    failures = 0
+
+    def fetch(audience: str) -> str:
+        if failures:
+            raise OSError("metadata server is not available")
+        return make_token(expiries.pop(0))
+
+    provider = IdentityTokenProvider(fetch)
+    first = await provider.get("a")
+    # The token is still valid, so it is returned while being refreshed
+    assert await provider.get("a") == first
+    await asyncio.sleep(0.1)
+    second = await provider.get("a")
+    assert second != first
+
+    # Expired tokens are fetched before returning, and errors are raised
+    provider._tokens["a"].expiry = time.time()
+    failures = 1
+    with pytest.raises(OSError):
+        await provider.get("a")
+    await provider.close()
+
+
+def test_get_expiry() -> None:
+    assert identity_token._get_expiry(make_token(1234)) == 1234
+    assert identity_token._get_expiry("broken") > time.time()
@@ -1,18 +1,61 @@
-import asyncio
-
 import pytest
+from prometheus_client import REGISTRY
 from pytest_mock import MockerFixture
 
 from mypy_playground.sandbox import run_typecheck_in_sandbox
+from mypy_playground.sandbox.base import Result
+from mypy_playground.sandbox.scheduler import Scheduler
 
 
 @pytest.mark.asyncio
 async def test_run_typecheck_in_sandbox(mocker: MockerFixture) -> None:
-    semaphore = asyncio.Semaphore(1)
+    scheduler = Scheduler(concurrency=1, max_queue=1, max_wait=1.0)
     mock_sandbox = mocker.AsyncMock()
     await run_typecheck_in_sandbox(
-        mock_sandbox, "import this", semaphore=semaphore, python_version="3.8"
+        mock_sandbox, "import this", scheduler=scheduler, python_version="3.8"
     )
     mock_sandbox.run_typecheck.assert_called_once_with(
         "import this", python_version="3.8"
     )
+
+
+@pytest.mark.asyncio
+async def test_run_typecheck_in_sandbox_metrics(mocker: MockerFixture) -> None:
+    scheduler = Scheduler(
+        concurrency=1, max_queue=1, max_wait=1.0, versions={"metrics-test"}
+    )
+    mock_sandbox = mocker.AsyncMock(backend="test")
+    mock_sandbox.run_typecheck.return_value = Result(
+        exit_code=1, stdout="error", stderr="", duration=1
+    )
+
+    def get(name: str, **labels: str) -> float:
+        value = REGISTRY.get_sample_value(f"mypy_play_sandbox_{name}", labels)
+        return value or 0.0
+
+    before = get(
+        "results_total", mypy_version="metrics-test", backend="test", exit_code="1"
+    )
+    for mypy_version in ("metrics-test", "unknown-version"):
+        await run_typecheck_in_sandbox(
+            mock_sandbox,
+            "import this",
+            scheduler=scheduler,
+            cache=None,
+            mypy_version=mypy_version,
+        )
+    assert (
+        get("results_total", mypy_version="metrics-test", backend="test", exit_code="1")
+        == before + 1
+    )
+    # Unknown versions are not used as labels
+    assert get("run_duration_seconds_count", mypy_version="other", backend="test") >= 1
+    assert get("in_flight", mypy_version="metrics-test", backend="test") == 0
+    assert (
+        get(
+            "scheduler_wait_duration_seconds_count",
+            mypy_version="metrics-test",
+            backend="test",
+        )
+        >= 1
+    )
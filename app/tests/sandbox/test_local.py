@@ -0,0 +1,93 @@
+import sys
+
+import pytest
+from pytest_mock import MockerFixture
+
+from mypy_playground.config import Settings
+from mypy_playground.sandbox import local
+from mypy_playground.sandbox.local import LocalSandbox
+
+
+@pytest.fixture
+def settings(mocker: MockerFixture) -> Settings:
+    # mypy is installed in the environment running the tests
+    settings = Settings(local_venvs={"latest": sys.prefix}, sandbox_concurrency=2)
+    mocker.patch("mypy_playground.sandbox.local.get_settings", return_value=settings)
+    return settings
+
+
+@pytest.mark.asyncio
+async def test_local_sandbox_run_typecheck(settings: Settings) -> None:
+    sandbox = LocalSandbox()
+    for _ in range(2):
+        result = await sandbox.run_typecheck(
+            'x: int = "a"\n', mypy_version="latest", python_version="3.12"
+        )
+        assert result is not None
+        assert result.exit_code == 1
+        assert result.stdout.startswith("main.py:1: error: Incompatible types")
+    # The worker is reused
+    assert len(sandbox._idle_workers["latest"]) == 1
+    worker = sandbox._idle_workers["latest"][0]
+    assert worker.jobs == 2
+
+    await sandbox.close()
+    assert worker.process.returncode is not None
+
+
+@pytest.mark.asyncio
+async def test_local_sandbox_max_idle_workers(settings: Settings) -> None:
+    settings.local_venvs = {"latest": sys.prefix, "master": sys.prefix}
+    settings.local_max_idle_workers = 1
+    sandbox = LocalSandbox()
+    assert await sandbox.run_typecheck("x = 1", mypy_version="latest") is not None
+    worker = sandbox._idle_workers["latest"][0]
+    assert await sandbox.run_typecheck("x = 1", mypy_version="master") is not None
+    # The least recently used worker is recycled
+    assert not sandbox._idle_workers["latest"]
+    assert len(sandbox._idle_workers["master"]) == 1
+    await sandbox.close()
+    assert worker.process.returncode is not None
+
+
+@pytest.mark.asyncio
+async def test_local_sandbox_timeout(settings: Settings) -> None:
+    settings.local_job_timeout = 0.001
+    sandbox = LocalSandbox()
+    assert await sandbox.run_typecheck("x = 1", mypy_version="latest") is None
+    assert not sandbox._idle_workers["latest"]
+    await sandbox.close()
+
+
+@pytest.mark.asyncio
+async def test_local_sandbox_unknown_version(settings: Settings) -> None:
+    sandbox = LocalSandbox()
+    assert await sandbox.run_typecheck("x = 1", mypy_version="unknown") is None
+    assert await sandbox.resolve_target("unknown") is None
+    assert await sandbox.resolve_target("latest") is None
+
+
+@pytest.mark.asyncio
+async def test_local_sandbox_warns_without_network_namespace(
+    settings: Settings, mocker: MockerFixture, caplog: pytest.LogCaptureFixture
+) -> None:
+    sandbox = LocalSandbox()
+    response = {"exit_code": 0, "stdout": "", "stderr": "", "network_namespace": False}
+    mocker.patch.object(local._Worker, "run", return_value=response)
+    for _ in range(2):
+        assert await sandbox.run_typecheck("x = 1", mypy_version="latest") is not None
+    warnings = [r for r in caplog.records if "network namespace" in r.getMessage()]
+    assert len(warnings) == 1
+    await sandbox.close()
+
+
+def test_local_sandbox_requires_network_namespace(
+    settings: Settings, mocker: MockerFixture
+) -> None:
+    settings.local_require_network_namespace = True
+    mocker.patch(
+        "mypy_playground.sandbox.local._can_create_network_namespace",
+        return_value=False,
+    )
+    with pytest.raises(RuntimeError, match="network namespace"):
+        LocalSandbox()
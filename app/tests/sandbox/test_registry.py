@@ -0,0 +1,32 @@
+from typing import get_args
+
+import pytest
+from pydantic import ValidationError
+
+from mypy_playground.config import SandboxName, Settings
+from mypy_playground.sandbox.base import AbstractSandbox
+from mypy_playground.sandbox.registry import SANDBOX_BACKENDS, load_sandbox_class
+
+
+def test_sandbox_backends() -> None:
+    assert set(SANDBOX_BACKENDS) == set(get_args(SandboxName))
+    for name in SANDBOX_BACKENDS:
+        sandbox_class = load_sandbox_class(name)
+        assert issubclass(sandbox_class, AbstractSandbox)
+        assert f"{sandbox_class.__module__}.{sandbox_class.__name__}" == name
+
+
+def test_settings_sandbox_validation() -> None:
+    with pytest.raises(ValidationError):
+        Settings.model_validate(
+            {"sandbox": "mypy_playground.sandbox.unknown.UnknownSandbox"}
+        )
+    with pytest.raises(ValidationError):
+        Settings.model_validate(
+            {"hedged_backends": ["mypy_playground.sandbox.unknown.UnknownSandbox"]}
+        )
+
+
+def test_load_sandbox_class_unsupported() -> None:
+    with pytest.raises(ValueError, match="Unsupported sandbox"):
+        load_sandbox_class("mypy_playground.sandbox.unknown.UnknownSandbox")
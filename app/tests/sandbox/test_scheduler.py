@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+from mypy_playground.sandbox.scheduler import Scheduler, SchedulerOverloadedError
+
+
+@pytest.mark.asyncio
+async def test_scheduler_is_fair_between_versions() -> None:
+    scheduler = Scheduler(
+        concurrency=1, max_queue=10, max_wait=60.0, weights={"latest": 2}
+    )
+    started: list[str] = []
+    event = asyncio.Event()
+
+    async def run(version: str) -> None:
+        async with scheduler.slot(version):
+            started.append(version)
+            await event.wait()
+
+    blocker = asyncio.create_task(run("blocker"))
+    await asyncio.sleep(0)
+    tasks = [asyncio.create_task(run("0.800")) for _ in range(4)]
+    tasks += [asyncio.create_task(run("latest")) for _ in range(4)]
+    await asyncio.sleep(0)
+    assert scheduler.queued == 8
+
+    event.set()
+    await asyncio.gather(blocker, *tasks)
+    # A burst for an old version does not delay the other versions
+    assert started == [
+        "blocker",
+        "0.800",
+        "latest",
+        "latest",
+        "0.800",
+        "latest",
+        "latest",
+        "0.800",
+        "0.800",
+    ]
+    assert scheduler.running == 0
+    assert scheduler.queued == 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_rejects_when_queue_is_full() -> None:
+    scheduler = Scheduler(concurrency=1, max_queue=1, max_wait=60.0)
+    event = asyncio.Event()
+
+    async def run() -> None:
+        async with scheduler.slot("latest"):
+            await event.wait()
+
+    tasks = [asyncio.create_task(run()) for _ in range(2)]
+    await asyncio.sleep(0)
+    with pytest.raises(SchedulerOverloadedError) as e:
+        await run()
+    assert e.value.reason == "queue_full"
+    assert e.value.retry_after_seconds >= 1
+
+    event.set()
+    await asyncio.gather(*tasks)
+
+
+@pytest.mark.asyncio
+async def test_scheduler_rejects_when_wait_is_too_long() -> None:
+    scheduler = Scheduler(concurrency=1, max_queue=10, max_wait=0.05)
+    async with scheduler.slot("latest"):
+        await asyncio.sleep(0.1)
+
+    async with scheduler.slot("latest"):
+        with pytest.raises(SchedulerOverloadedError) as e:
+            async with scheduler.slot("latest"):
+                pass
+    assert e.value.reason == "deadline"
+
+
+@pytest.mark.asyncio
+async def test_scheduler_cancelled_waiter() -> None:
+    scheduler = Scheduler(concurrency=1, max_queue=10, max_wait=60.0)
+    async with scheduler.slot("latest"):
+        task = asyncio.create_task(scheduler.slot("latest").__aenter__())
+        await asyncio.sleep(0)
+        assert scheduler.queued == 1
+        task.cancel()
+        await asyncio.sleep(0)
+        assert scheduler.queued == 0
+    assert scheduler.running == 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_try_acquire() -> None:
+    scheduler = Scheduler(concurrency=2, max_queue=10, max_wait=60.0)
+    async with scheduler.slot("latest"):
+        assert scheduler.try_acquire()
+        assert scheduler.running == 2
+        # It does not wait for a slot
+        assert not scheduler.try_acquire()
+        scheduler.release()
+    assert scheduler.running == 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_reports_positions() -> None:
+    scheduler = Scheduler(concurrency=1, max_queue=10, max_wait=60.0)
+    positions: dict[str, list[int]] = {"a": [], "b": []}
+    event = asyncio.Event()
+
+    async def run(name: str, version: str) -> None:
+        async with scheduler.slot(version, positions[name].append):
+            await event.wait()
+
+    async with scheduler.slot("latest"):
+        a = asyncio.create_task(run("a", "latest"))
+        await asyncio.sleep(0)
+        b = asyncio.create_task(run("b", "latest"))
+        await asyncio.sleep(0)
+        # A request for another version goes ahead of "b" by round robin
+        c = asyncio.create_task(scheduler.slot("0.800").__aenter__())
+        await asyncio.sleep(0)
+        assert positions == {"a": [1], "b": [2, 3]}
+        c.cancel()
+        await asyncio.sleep(0)
+        assert positions == {"a": [1], "b": [2, 3, 2]}
+    assert positions == {"a": [1], "b": [2, 3, 2, 1]}
+    event.set()
+    await asyncio.gather(a, b)
@@ -1,7 +1,14 @@
+import json
+from typing import Any
+
 import pytest
 from fastapi.testclient import TestClient
+from pytest_mock import MockerFixture
 
+from mypy_playground.config import Settings, get_settings
 from mypy_playground.main import app
+from mypy_playground.sandbox.base import OutputCallback, Result
+from mypy_playground.sandbox.scheduler import SchedulerOverloadedError
 
 
 @pytest.fixture
@@ -21,6 +28,27 @@ def test_api_context(client: TestClient) -> None:
     assert "multiSelectOptions" in data
 
 
+def test_api_context_etag(client: TestClient) -> None:
+    """Test that the context is served with an ETag and revalidated"""
+    response = client.get("/api/context")
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "public, no-cache"
+
+    response = client.get("/api/context", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    response = client.get(
+        "/api/context", headers={"If-None-Match": f'"other", W/{etag}'}
+    )
+    assert response.status_code == 304
+
+    response = client.get("/api/context", headers={"If-None-Match": '"other"'})
+    assert response.status_code == 200
+    assert response.json()["flags"]
+
+
 def test_api_typecheck_missing_source(client: TestClient) -> None:
     """Test typecheck endpoint with missing source"""
     response = client.post("/api/typecheck", json={})
@@ -33,3 +61,190 @@ def test_api_404_json(client: TestClient) -> None:
     assert response.status_code == 404
     data = response.json()
     assert "detail" in data
+
+
+def test_api_typecheck_overloaded(client: TestClient, mocker: MockerFixture) -> None:
+    """Test that requests are rejected with Retry-After when overloaded"""
+    mocker.patch.object(app.state, "sandbox", mocker.Mock(), create=True)
+    mocker.patch(
+        "mypy_playground.routes.run_typecheck_in_sandbox",
+        side_effect=SchedulerOverloadedError("queue_full", 2.5),
+    )
+    response = client.post("/api/typecheck", json={"source": "x = 1"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "3"
+
+
+def test_api_typecheck_compressed(client: TestClient, mocker: MockerFixture) -> None:
+    """Test that large responses are compressed when the client accepts it"""
+    mocker.patch.object(app.state, "sandbox", mocker.Mock(), create=True)
+    run_typecheck = mocker.patch("mypy_playground.routes.run_typecheck_in_sandbox")
+    stdout = "main.py:1: error: a\n" * 1000
+    run_typecheck.return_value = Result(
+        exit_code=1, stdout=stdout, stderr="", duration=1
+    )
+    response = client.post(
+        "/api/typecheck", json={"source": "x = 1"}, headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) < len(stdout)
+    assert response.json()["stdout"] == stdout
+
+    response = client.post(
+        "/api/typecheck",
+        json={"source": "x = 1"},
+        headers={"Accept-Encoding": "identity"},
+    )
+    assert "content-encoding" not in response.headers
+    assert response.json()["stdout"] == stdout
+
+    run_typecheck.return_value = Result(exit_code=0, stdout="", stderr="", duration=1)
+    response = client.post(
+        "/api/typecheck", json={"source": "x = 1"}, headers={"Accept-Encoding": "gzip"}
+    )
+    assert "content-encoding" not in response.headers
+    assert response.json()["exit_code"] == 0
+
+
+def test_api_typecheck_stream(client: TestClient, mocker: MockerFixture) -> None:
+    """Test that the streaming endpoint sends output and the result"""
+    sandbox = mocker.AsyncMock()
+
+    async def run_typecheck_streaming(
+        source: str, on_output: OutputCallback, **kwargs: Any
+    ) -> Result:
+        on_output("stdout", "main.py:1: error: a")
+        return Result(exit_code=1, stdout="main.py:1: error: a", stderr="", duration=1)
+
+    sandbox.run_typecheck_streaming = run_typecheck_streaming
+    mocker.patch.object(app.state, "sandbox", sandbox, create=True)
+    response = client.post("/api/typecheck/stream", json={"source": "x = 1"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [
+        (event.split("\n")[0], json.loads(event.split("\n")[1].removeprefix("data: ")))
+        for event in response.text.strip().split("\n\n")
+    ]
+    assert events == [
+        ("event: started", {}),
+        ("event: output", {"stream": "stdout", "line": "main.py:1: error: a"}),
+        (
+            "event: result",
+            {
+                "exit_code": 1,
+                "stdout": "main.py:1: error: a",
+                "stderr": "",
+                "duration": 1,
+            },
+        ),
+    ]
+
+
+def test_api_typecheck_stream_error(client: TestClient, mocker: MockerFixture) -> None:
+    """Test that the streaming endpoint reports unexpected errors"""
+    sandbox = mocker.AsyncMock()
+    sandbox.run_typecheck_streaming.side_effect = RuntimeError("broken")
+    mocker.patch.object(app.state, "sandbox", sandbox, create=True)
+    response = client.post("/api/typecheck/stream", json={"source": "x = 2"})
+    assert response.status_code == 200
+    last_event = response.text.strip().split("\n\n")[-1].split("\n")
+    assert last_event[0] == "event: error"
+    assert json.loads(last_event[1].removeprefix("data: ")) == {
+        "detail": "an unexpected error occurred",
+        "retryAfter": None,
+    }
+
+
+def test_api_typecheck_batch(client: TestClient, mocker: MockerFixture) -> None:
+    """Test that results of the batch endpoint are grouped by output"""
+    outputs = {"1.0": "error", "1.1": "ok", "1.2": "ok"}
+
+    async def run_typecheck(
+        source: str, mypy_version: str, **kwargs: Any
+    ) -> Result | None:
+        if mypy_version == "1.3":
+            return None
+        return Result(exit_code=0, stdout=outputs[mypy_version], stderr="", duration=1)
+
+    sandbox = mocker.AsyncMock()
+    sandbox.run_typecheck = run_typecheck
+    mocker.patch.object(app.state, "sandbox", sandbox, create=True)
+    settings = Settings(mypy_versions=[(v, v) for v in ("1.0", "1.1", "1.2", "1.3")])
+    app.dependency_overrides[get_settings] = lambda: settings
+    try:
+        response = client.post(
+            "/api/typecheck/batch",
+            json={"source": "x = 1", "mypyVersions": ["1.2", "1.0", "1.1", "1.3"]},
+        )
+        assert response.status_code == 200
+        assert response.json() == {
+            "groups": [
+                {
+                    "mypyVersions": ["1.2", "1.1"],
+                    "exit_code": 0,
+                    "stdout": "ok",
+                    "stderr": "",
+                },
+                {
+                    "mypyVersions": ["1.0"],
+                    "exit_code": 0,
+                    "stdout": "error",
+                    "stderr": "",
+                },
+            ],
+            "failedMypyVersions": ["1.3"],
+        }
+
+        response = client.post(
+            "/api/typecheck/batch",
+            json={"source": "x = 1", "mypyVersions": ["1.0", "unknown"]},
+        )
+        assert response.status_code == 422
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_api_bisect(client: TestClient, mocker: MockerFixture) -> None:
+    """Test that the bisect endpoint streams probes and the result"""
+    versions = ["1.3", "1.2", "1.1", "1.0"]
+
+    async def probe(mypy_version: str) -> Result | None:
+        stdout = "new" if mypy_version in ("1.3", "1.2") else "old"
+        return Result(exit_code=0, stdout=stdout, stderr="", duration=1)
+
+    mocker.patch("mypy_playground.routes.make_probe", return_value=probe)
+    mocker.patch.object(app.state, "sandbox", mocker.Mock(), create=True)
+    # Aliases are not bisected
+    settings = Settings(mypy_versions=[(v, v) for v in ["latest", *versions]])
+    app.dependency_overrides[get_settings] = lambda: settings
+    try:
+        response = client.post(
+            "/api/bisect", json={"source": "x = 1", "oldMypyVersion": "latest"}
+        )
+        assert response.status_code == 422
+        # The range is not reversed
+        response = client.post(
+            "/api/bisect",
+            json={"source": "x = 1", "oldMypyVersion": "1.3", "newMypyVersion": "1.0"},
+        )
+        assert response.status_code == 422
+        response = client.post("/api/bisect", json={"source": "x = 1"})
+    finally:
+        app.dependency_overrides.clear()
+    assert response.status_code == 200
+    events = [
+        (event.split("\n")[0], json.loads(event.split("\n")[1].removeprefix("data: ")))
+        for event in response.text.strip().split("\n\n")
+    ]
+    assert [data["mypyVersion"] for name, data in events if name == "event: probe"] == [
+        "1.0",
+        "1.3",
+        "1.1",
+        "1.2",
+    ]
+    name, data = events[-1]
+    assert name == "event: result"
+    assert data["firstChangedVersion"] == "1.2"
+    assert data["lastUnchangedVersion"] == "1.1"
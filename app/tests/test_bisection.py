@@ -0,0 +1,109 @@
+import pytest
+from pytest_mock import MockerFixture
+
+from mypy_playground.bisection import (
+    BisectionError,
+    bisect_versions,
+    get_candidate_versions,
+    get_max_probes,
+    make_probe,
+)
+from mypy_playground.sandbox.base import Result
+
+VERSIONS = [f"1.{i}" for i in range(80)]
+
+
+def make_result(stdout: str) -> Result:
+    return Result(exit_code=0, stdout=stdout, stderr="", duration=1)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("changed", [1, 2, 40, 79])
+async def test_bisect_versions(changed: int) -> None:
+    probed: list[str] = []
+    progress: list[tuple[str, int, int]] = []
+
+    async def probe(mypy_version: str) -> Result | None:
+        probed.append(mypy_version)
+        index = VERSIONS.index(mypy_version)
+        return make_result("new" if index >= changed else "old")
+
+    result = await bisect_versions(VERSIONS, probe, lambda *args: progress.append(args))
+    assert result.first_changed == VERSIONS[changed]
+    assert result.last_unchanged == VERSIONS[changed - 1]
+    assert len(probed) <= get_max_probes(len(VERSIONS)) == 9
+    assert [p[0] for p in progress] == probed
+    assert set(result.results) == set(probed)
+
+
+@pytest.mark.asyncio
+async def test_bisect_versions_unchanged() -> None:
+    async def probe(mypy_version: str) -> Result | None:
+        return make_result("same")
+
+    result = await bisect_versions(VERSIONS, probe)
+    assert result.first_changed is None
+    assert list(result.results) == [VERSIONS[0], VERSIONS[-1]]
+
+
+@pytest.mark.asyncio
+async def test_bisect_versions_error() -> None:
+    async def probe(mypy_version: str) -> Result | None:
+        return None
+
+    with pytest.raises(BisectionError):
+        await bisect_versions(VERSIONS, probe)
+
+
+def test_get_candidate_versions() -> None:
+    available = [
+        "latest",
+        "master",
+        "basedmypy-latest",
+        "1.10.0",
+        "basedmypy-2.10.0",
+        "1.9.0",
+        "basedmypy-2.9.1",
+        "1.0.0",
+        "0.990",
+        "0.910",
+    ]
+    assert get_candidate_versions(available) == [
+        "0.910",
+        "0.990",
+        "1.0.0",
+        "1.9.0",
+        "1.10.0",
+    ]
+    assert get_candidate_versions(available, "0.990", "1.9.0") == [
+        "0.990",
+        "1.0.0",
+        "1.9.0",
+    ]
+    assert get_candidate_versions(available, new_version="basedmypy-2.10.0") == [
+        "basedmypy-2.9.1",
+        "basedmypy-2.10.0",
+    ]
+    with pytest.raises(ValueError, match="not a release"):
+        get_candidate_versions(available, new_version="latest")
+    with pytest.raises(ValueError, match="same family"):
+        get_candidate_versions(available, "1.0.0", "basedmypy-2.10.0")
+    with pytest.raises(ValueError, match="unknown"):
+        get_candidate_versions(available, "2.0.0")
+    with pytest.raises(ValueError, match="newer"):
+        get_candidate_versions(available, "1.10.0", "0.990")
+
+
+@pytest.mark.asyncio
+async def test_make_probe(mocker: MockerFixture) -> None:
+    run = mocker.patch(
+        "mypy_playground.bisection.run_typecheck_in_sandbox",
+        return_value=make_result("ok"),
+    )
+    sandbox = mocker.Mock()
+    probe = make_probe(sandbox, "x = 1", python_version="3.14")
+    assert await probe("1.0") == make_result("ok")
+    # Results are cached by run_typecheck_in_sandbox
+    run.assert_called_once_with(
+        sandbox, "x = 1", mypy_version="1.0", python_version="3.14"
+    )
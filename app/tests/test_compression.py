@@ -0,0 +1,36 @@
+import gzip
+
+import pytest
+from pytest_mock import MockerFixture
+
+from mypy_playground import compression
+from mypy_playground.compression import (
+    compress,
+    get_accepted_encodings,
+    select_encoding,
+)
+
+
+def test_get_accepted_encodings() -> None:
+    assert get_accepted_encodings("gzip, deflate, br;q=1.0") == {
+        "gzip",
+        "deflate",
+        "br",
+    }
+    assert get_accepted_encodings("br;q=0, gzip;q=0.5") == {"gzip"}
+    assert get_accepted_encodings("") == {""}
+
+
+def test_select_encoding(mocker: MockerFixture) -> None:
+    mocker.patch.object(compression, "brotli", None)
+    assert select_encoding("gzip, br") == "gzip"
+    assert select_encoding("br") is None
+    assert select_encoding("gzip;q=0") is None
+    assert select_encoding("") is None
+
+
+def test_compress() -> None:
+    data = b'{"stdout": "..."}' * 100
+    assert gzip.decompress(compress(data, "gzip")) == data
+    with pytest.raises(ValueError, match="unsupported encoding"):
+        compress(data, "zstd")
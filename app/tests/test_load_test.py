@@ -0,0 +1,36 @@
+import pytest
+
+from benchmarks.load_test import DEFAULT_SCENARIO, generate_trace, get_percentiles, run
+
+
+def test_generate_trace() -> None:
+    scenario = {**DEFAULT_SCENARIO, "duration": 2.0}
+    trace = generate_trace(scenario)
+    assert trace == generate_trace(scenario)
+    assert all(0 <= item["at"] < 2.0 for item in trace)
+    assert {item["body"]["mypyVersion"] for item in trace} == {"latest", "master"}
+    assert len({item["body"]["source"] for item in trace}) == len(trace)
+
+
+def test_get_percentiles() -> None:
+    percentiles = get_percentiles([i / 1000 for i in range(1, 101)])
+    assert percentiles["p50"] == 50
+    assert percentiles["p99"] == 99
+    assert percentiles["max"] == 100
+    assert get_percentiles([]) == {}
+
+
+@pytest.mark.asyncio
+async def test_run() -> None:
+    scenario = {
+        **DEFAULT_SCENARIO,
+        "duration": 0.5,
+        "sandbox": {"type": "fixed", "latency": 0.01},
+        "settings": {"sandbox_concurrency": 2},
+    }
+    trace = generate_trace(scenario)
+    report = await run(scenario, trace)
+    assert report["status"] == {"200": len(trace)}
+    assert report["latency_ms"]["p50"] >= 10
+    assert set(report["queue_wait_ms"]) == {"p50", "p95", "p99", "max", "mean"}
+    assert report["loop_lag_ms"]
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+from pytest_mock import MockerFixture
+
+from mypy_playground.memory import MemoryManager
+
+MiB = 1024 * 1024
+
+
+def test_memory_manager_rss_growth(mocker: MockerFixture) -> None:
+    get_rss = mocker.patch("mypy_playground.memory.get_rss", return_value=100 * MiB)
+    collect = mocker.patch("mypy_playground.memory.gc.collect", return_value=0)
+    manager = MemoryManager(check_interval=1, rss_growth_threshold=64 * MiB)
+    manager._update_baseline()
+
+    get_rss.return_value = 150 * MiB
+    assert manager.check() is None
+    get_rss.return_value = 170 * MiB
+    assert manager.check() == "rss"
+    collect.assert_called_once()
+
+    # The baseline is updated after a collection
+    assert manager.check() is None
+
+
+def test_memory_manager_object_growth(mocker: MockerFixture) -> None:
+    get_objects = mocker.patch(
+        "mypy_playground.memory.gc.get_objects", return_value=[None] * 1000
+    )
+    manager = MemoryManager(check_interval=1, object_growth_threshold=1000)
+    manager._update_baseline()
+    get_objects.return_value = [None] * 2000
+    assert manager.check() == "objects"
+
+
+def test_memory_manager_interval(mocker: MockerFixture) -> None:
+    monotonic = mocker.patch("mypy_playground.memory.time.monotonic", return_value=0)
+    manager = MemoryManager(check_interval=1, gc_interval=300)
+    assert manager.check() is None
+    monotonic.return_value = 300
+    assert manager.check() == "interval"
+
+
+@pytest.mark.asyncio
+async def test_memory_manager_runs_in_background(mocker: MockerFixture) -> None:
+    check = mocker.patch.object(MemoryManager, "check")
+    manager = MemoryManager(check_interval=0.01)
+    await manager.start()
+    await asyncio.sleep(0.05)
+    await manager.close()
+    assert check.called
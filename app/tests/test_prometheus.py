@@ -1,5 +1,10 @@
+from collections.abc import AsyncIterator
+from pathlib import Path
+
 import pytest
 from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.staticfiles import StaticFiles
 from fastapi.testclient import TestClient
 from prometheus_client import CollectorRegistry
 
@@ -101,3 +106,75 @@ def test_middleware_records_multiple_requests(client: TestClient, app: FastAPI)
         )
         == 3.0
     )
+
+
+def test_middleware_labels_by_route_template(client: TestClient, app: FastAPI) -> None:
+    """Test that paths are collapsed into route templates and fixed labels"""
+    registry = app.state.registry
+
+    @app.get("/items/{item_id}")
+    async def item_endpoint(item_id: str) -> dict[str, str]:
+        return {"id": item_id}
+
+    for path in ("/items/1", "/items/2", "/wp-login.php", "/.env"):
+        client.get(path)
+
+    assert (
+        registry.get_sample_value(
+            "mypy_play_http_requests_total",
+            {"handler": "/items/{item_id}", "method": "GET", "code": "200"},
+        )
+        == 2.0
+    )
+    assert (
+        registry.get_sample_value(
+            "mypy_play_http_requests_total",
+            {"handler": "unmatched", "method": "GET", "code": "404"},
+        )
+        == 2.0
+    )
+
+
+def test_middleware_records_streamed_size(client: TestClient, app: FastAPI) -> None:
+    """Test that the size is measured from the bytes sent"""
+    registry = app.state.registry
+
+    @app.get("/stream")
+    async def stream_endpoint() -> StreamingResponse:
+        async def body() -> AsyncIterator[bytes]:
+            for _ in range(3):
+                yield b"x" * 100
+
+        return StreamingResponse(body())
+
+    response = client.get("/stream")
+    assert response.content == b"x" * 300
+    assert (
+        registry.get_sample_value(
+            "mypy_play_http_response_size_bytes_sum",
+            {"handler": "/stream", "method": "GET"},
+        )
+        == 300.0
+    )
+
+
+def test_middleware_labels_by_mount_name(
+    client: TestClient, app: FastAPI, tmp_path: Path
+) -> None:
+    """Test that requests handled by a mounted application use its name"""
+    registry = app.state.registry
+    (tmp_path / "index.html").write_text("<html></html>")
+    app.mount("/static", StaticFiles(directory=tmp_path), name="static")
+
+    assert client.get("/static/index.html").status_code == 200
+    assert client.get("/static/missing.js").status_code == 404
+    assert client.get("/wp-login.php").status_code == 404
+
+    for code, handler in (("200", "static"), ("404", "static"), ("404", "unmatched")):
+        assert (
+            registry.get_sample_value(
+                "mypy_play_http_requests_total",
+                {"handler": handler, "method": "GET", "code": code},
+            )
+            == 1.0
+        )
@@ -0,0 +1,31 @@
+from pathlib import Path
+
+import pytest
+
+from benchmarks.import_time import measure_imports
+
+# Clients of sandbox backends, which are imported when the sandbox is created
+BACKEND_MODULES = (
+    "aiodocker",
+    "google.auth",
+    "google.oauth2.id_token",
+    "mypy_playground.sandbox.cloud_functions",
+    "mypy_playground.sandbox.daemon",
+    "mypy_playground.sandbox.docker",
+)
+
+
+@pytest.mark.parametrize(
+    "sandbox",
+    [
+        "mypy_playground.sandbox.docker.DockerSandbox",
+        "mypy_playground.sandbox.cloud_functions.CloudFunctionsSandbox",
+    ],
+)
+def test_import_time(sandbox: str, tmp_path: Path) -> None:
+    """Test that importing the application does not import sandbox backends"""
+    imports = measure_imports(
+        "mypy_playground.main", env={"sandbox": sandbox}, cwd=tmp_path
+    )
+    assert "mypy_playground.main" in imports
+    assert [name for name in BACKEND_MODULES if name in imports] == []
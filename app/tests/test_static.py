@@ -0,0 +1,71 @@
+import gzip
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from mypy_playground.static import PrecompressedStaticFiles
+
+BUNDLE = b"console.log('mypy playground');\n" * 100
+
+
+@pytest.fixture
+def client(tmp_path: Path) -> TestClient:
+    (tmp_path / "index.html").write_text("<html></html>")
+    assets = tmp_path / "assets"
+    assets.mkdir()
+    (assets / "index-BRpKjz3_.js").write_bytes(BUNDLE)
+    # Brotli is not in the standard library, so a fake variant is used
+    (assets / "index-BRpKjz3_.js.br").write_bytes(b"brotli")
+    (assets / "index-BRpKjz3_.js.gz").write_bytes(gzip.compress(BUNDLE))
+    app = FastAPI()
+    app.mount("/", PrecompressedStaticFiles(directory=str(tmp_path), html=True))
+    return TestClient(app)
+
+
+def test_precompressed_variants(client: TestClient) -> None:
+    path = "/assets/index-BRpKjz3_.js"
+    # Raw bytes are read, as the fake variant cannot be decoded
+    with client.stream(
+        "GET", path, headers={"Accept-Encoding": "gzip, br"}
+    ) as response:
+        assert response.headers["content-encoding"] == "br"
+        assert response.headers["content-type"].startswith("text/javascript")
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert (
+            response.headers["cache-control"] == "public, max-age=31536000, immutable"
+        )
+        assert b"".join(response.iter_raw()) == b"brotli"
+
+    response = client.get(path, headers={"Accept-Encoding": "gzip, br;q=0"})
+    assert response.headers["content-encoding"] == "gzip"
+    # Decoded by the client
+    assert response.content == BUNDLE
+
+    response = client.get(path, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.content == BUNDLE
+
+
+def test_range_and_conditional_requests(client: TestClient) -> None:
+    path = "/assets/index-BRpKjz3_.js"
+    headers = {"Accept-Encoding": "identity"}
+    response = client.get(path, headers={**headers, "Range": "bytes=0-6"})
+    assert response.status_code == 206
+    assert response.content == b"console"
+
+    etag = client.get(path, headers=headers).headers["etag"]
+    response = client.get(path, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    # Variants have their own ETags
+    headers = {"Accept-Encoding": "br", "If-None-Match": etag}
+    with client.stream("GET", path, headers=headers) as response:
+        assert response.status_code == 200
+
+
+def test_index_is_revalidated(client: TestClient) -> None:
+    response = client.get("/")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "no-cache"
+    assert "vary" not in response.headers
@@ -58,6 +58,25 @@ RUN pip install -r requirements.txt \
         && rm -rf /tmp/requirements.txt \
         && rm -rf /root/.cache
 
+# Pre-build the mypy cache of the standard library for each Python version
+# and cache profile used by DockerSandbox. Each sandbox container writes to
+# its own layer, so nothing persists between requests.
+RUN echo > /tmp/main.py \
+        && for python_version in 3.9 3.10 3.11 3.12 3.13 3.14; do \
+            for profile in default strict; do \
+                flags=""; \
+                if [ "$profile" = "strict" ]; then flags="--strict"; fi; \
+                cache_dir="/opt/mypy-cache/${python_version}/${profile}"; \
+                mkdir -p "/opt/mypy-cache/${python_version}"; \
+                mypy --no-site-packages --python-version "$python_version" $flags \
+                        --cache-dir "${cache_dir}.tmp" /tmp/main.py \
+                    && mv "${cache_dir}.tmp" "$cache_dir" \
+                    || rm -rf "${cache_dir}.tmp"; \
+            done; \
+        done \
+        && rm /tmp/main.py \
+        && chown -R nobody /opt/mypy-cache
+
 USER nobody
 CMD ["mypy"]' > "Dockerfile"
 cd "$sandbox_dir"
@@ -0,0 +1,91 @@
+"""
+Local benchmark of the Cloud Functions wrapper.
+
+Calls the Flask entry point run_typecheck directly, without a server,
+in each worker mode and prints the latency per request.  The first
+request in each mode is reported separately as it starts the fork
+server.  Finally, the output of the modes is compared with a small
+max_output_bytes, which truncates it.
+
+usage: python benchmark.py [--requests N] [--mode subprocess|forkserver]
+"""
+
+import argparse
+import json
+import statistics
+import time
+from typing import List
+
+from flask import Flask
+
+import main
+
+SOURCE = """
+from typing import TypedDict
+
+class Movie(TypedDict):
+    name: str
+    year: int
+
+movie: Movie = {"name": "Blade Runner", "year": "1982"}
+"""
+
+app = Flask(__name__)
+
+
+def call(source: str, options: List[str], max_output_bytes: int = 0) -> dict:
+    data = {"source": source, "options": options, "max_output_bytes": max_output_bytes}
+    with app.test_request_context(method="POST", json=data) as context:
+        response = main.run_typecheck(context.request)
+    return json.loads(response.get_data())
+
+
+def measure(mode: str, requests: int, options: List[str]) -> None:
+    main.WORKER_MODE = mode
+    start_time = time.perf_counter()
+    first = call(SOURCE, options)
+    first_latency = time.perf_counter() - start_time
+    latencies = []
+    for _ in range(requests):
+        start_time = time.perf_counter()
+        result = call(SOURCE, options)
+        latencies.append(time.perf_counter() - start_time)
+        assert result == first, (result, first)
+    print(
+        f"{mode}: first={1000 * first_latency:.0f} ms,"
+        f" p50={1000 * statistics.median(latencies):.0f} ms,"
+        f" mean={1000 * statistics.mean(latencies):.0f} ms,"
+        f" exit_code={first['exit_code']}",
+        flush=True,
+    )
+
+
+def compare_truncated(modes: List[str], options: List[str]) -> None:
+    results = {}
+    for mode in modes:
+        main.WORKER_MODE = mode
+        results[mode] = call(SOURCE, options, max_output_bytes=50)
+    first = results[modes[0]]
+    assert "[output truncated:" in first["stdout"], first
+    for mode, result in results.items():
+        assert result == first, (mode, result, first)
+    print(f"truncated output: {first['stdout']!r}", flush=True)
+
+
+def main_() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument(
+        "--mode", action="append", choices=["subprocess", "forkserver"]
+    )
+    args = parser.parse_args()
+    # The same options as CloudFunctionsSandbox
+    options = ["--cache-dir", "/dev/null", "--no-site-packages"]
+    modes = args.mode or ["subprocess", "forkserver"]
+    for mode in modes:
+        measure(mode, args.requests, options)
+    compare_truncated(modes, options)
+
+
+if __name__ == "__main__":
+    main_()
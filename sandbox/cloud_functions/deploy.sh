@@ -8,6 +8,8 @@ cd "$(dirname "$0")"
 : "${MEMORY:=1024MB}"
 : "${REGION:=asia-northeast1}"
 : "${RUNTIME:=python312}"
+# "subprocess" or "forkserver" (see main.py)
+: "${WORKER_MODE:=subprocess}"
 
 deploy() {
   VERSION="$1"
@@ -27,6 +29,7 @@ deploy() {
     --no-gen2 \
     "--region=${REGION}" \
     "--runtime=${RUNTIME}"\
+    "--set-env-vars=MYPY_WORKER_MODE=${WORKER_MODE}" \
     "--memory=${MEMORY}" \
     "--source=${VERSION}" \
     "--service-account=${SERVICE_ACCOUNT}" \
@@ -1,13 +1,31 @@
 """
 Wrapper to run mypy on Cloud Functions.
 
+mypy runs in one of the following modes, selected by MYPY_WORKER_MODE:
+- "subprocess" (default): start `python -m mypy` for every request
+- "forkserver": a server process imports mypy once, and every request is
+  served by a child freshly forked from it, so no state is carried over
+  between requests
+
+When a request sets "use_cache", the incremental cache of the standard
+library is kept in the instance-local MYPY_CACHE_DIR per options (which
+include the Python version), and each request works on a throwaway copy
+of it, so the user's module is never cached.
+
 This module should be able to run on Python 3.8 and later.
 """
 
+import hashlib
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import shutil
 import subprocess
 import sys
 import tempfile
-from typing import Dict, List, Union
+import threading
+from typing import IO, Callable, Dict, List, Optional, Tuple
 
 from flask import Request, Response, abort, jsonify, make_response
 
@@ -29,23 +47,277 @@ def run_typecheck(request: Request) -> Response:
     for option in options:
         if not isinstance(option, str):
             abort_api(400, "'options' field must be a list of strings.")
+    max_output_bytes = data.get("max_output_bytes", 0)
+    if not isinstance(max_output_bytes, int) or max_output_bytes < 0:
+        abort_api(400, "'max_output_bytes' field must be a non-negative integer.")
+
+    use_cache = data.get("use_cache", False)
+    if not isinstance(use_cache, bool):
+        abort_api(400, "'use_cache' field must be a boolean.")
+
+    run = run_mypy_forked if WORKER_MODE == "forkserver" else run_mypy
+    if use_cache:
+        return jsonify(run_mypy_cached(run, source, options, max_output_bytes))
+    return jsonify(run(source, options, max_output_bytes))
+
+
+WORKER_MODE = os.environ.get("MYPY_WORKER_MODE", "subprocess")
+CACHE_DIR = os.environ.get(
+    "MYPY_CACHE_DIR", os.path.join(tempfile.gettempdir(), "mypy-cache")
+)
+# /tmp of Cloud Functions is in memory, so the number of caches is limited
+CACHE_MAX_PROFILES = int(os.environ.get("MYPY_CACHE_MAX_PROFILES", "8"))
+# Modules imported by the fork server before forking children
+PRELOAD_MODULES = ["mypy.api", "mypy.main", __name__]
+TRUNCATED_MARKER = "\n[output truncated: %d more bytes]"
+Result = Dict[str, object]
+
+
+class OutputLimit:
+    """Keep the first max_bytes of output (0 means no limit).
+
+    The path of the temporary file is rewritten to main.py before the
+    output is limited, so the output is the same in every worker mode.
+    """
+
+    def __init__(self, file_name: str, max_bytes: int) -> None:
+        self.file_name = file_name.encode()
+        self.max_bytes = max_bytes
+        self.data = bytearray()
+        self.omitted = 0
+
+    def feed(self, data: bytes) -> None:
+        # The path never spans lines, so data must consist of whole lines
+        data = data.replace(self.file_name, b"main.py")
+        if self.max_bytes > 0:
+            kept = data[: max(0, self.max_bytes - len(self.data))]
+            self.omitted += len(data) - len(kept)
+            data = kept
+        self.data += data
+
+    def result(self) -> str:
+        output = self.data.decode(errors="ignore")
+        if self.omitted:
+            output += TRUNCATED_MARKER % self.omitted
+        return output
+
 
-    return jsonify(run_mypy(source, options))
+class LimitedReader:
+    """Read a stream line by line into an OutputLimit"""
 
+    def __init__(self, stream: IO[bytes], limit: OutputLimit) -> None:
+        self.stream = stream
+        self.limit = limit
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
 
-def run_mypy(source: str, options: List[str]) -> Dict[str, Union[int, str]]:
+    def run(self) -> None:
+        # The rest is read and discarded so that mypy is not blocked
+        for line in iter(self.stream.readline, b""):
+            self.limit.feed(line)
+
+    def join(self) -> None:
+        self.thread.join()
+
+
+def make_result(exit_code: int, stdout: OutputLimit, stderr: OutputLimit) -> Result:
+    return {
+        "exit_code": exit_code,
+        "stderr": stderr.result(),
+        "stdout": stdout.result(),
+        # Tells the application that the output is already limited
+        "omitted_bytes": {"stdout": stdout.omitted, "stderr": stderr.omitted},
+    }
+
+
+def run_mypy(source: str, options: List[str], max_output_bytes: int = 0) -> Result:
     with tempfile.NamedTemporaryFile(mode="w") as f:
         f.write(source)
         f.flush()
-        process = subprocess.run(
+        process = subprocess.Popen(
             [sys.executable, "-m", "mypy", "--no-color-output"] + options + [f.name],
-            capture_output=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
         )
-        return {
-            "exit_code": process.returncode,
-            "stderr": process.stderr.decode().replace(f.name, "main.py"),
-            "stdout": process.stdout.decode().replace(f.name, "main.py"),
+        assert process.stdout is not None and process.stderr is not None
+        stdout = OutputLimit(f.name, max_output_bytes)
+        stderr = OutputLimit(f.name, max_output_bytes)
+        stdout_reader = LimitedReader(process.stdout, stdout)
+        stderr_reader = LimitedReader(process.stderr, stderr)
+        exit_code = process.wait()
+        stdout_reader.join()
+        stderr_reader.join()
+        return make_result(exit_code, stdout, stderr)
+
+
+def get_forkserver_context() -> multiprocessing.context.BaseContext:
+    # The fork server is started by the first request
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(PRELOAD_MODULES)
+    return context
+
+
+def run_mypy_forked(
+    source: str, options: List[str], max_output_bytes: int = 0
+) -> Result:
+    """Run mypy in a child forked from the fork server"""
+    reader, writer = multiprocessing.Pipe(duplex=False)
+    process = get_forkserver_context().Process(
+        target=run_child, args=(source, options, max_output_bytes, writer)
+    )
+    process.start()
+    writer.close()
+    try:
+        result: Result = reader.recv()
+    except EOFError:
+        process.join()
+        result = {
+            "exit_code": 2,
+            "stderr": "mypy worker crashed (status: %s)" % process.exitcode,
+            "stdout": "",
         }
+    finally:
+        reader.close()
+        process.join()
+    return result
+
+
+def run_child(
+    source: str,
+    options: List[str],
+    max_output_bytes: int,
+    writer: multiprocessing.connection.Connection,
+) -> None:
+    import mypy.api
+
+    with tempfile.NamedTemporaryFile(mode="w") as f:
+        f.write(source)
+        f.flush()
+        stdout, stderr, exit_code = mypy.api.run(
+            ["--no-color-output"] + options + [f.name]
+        )
+        # Same as the output of the subprocess mode
+        stdout_limit = OutputLimit(f.name, max_output_bytes)
+        stdout_limit.feed(stdout.encode())
+        stderr_limit = OutputLimit(f.name, max_output_bytes)
+        stderr_limit.feed(stderr.encode())
+        writer.send(make_result(exit_code, stdout_limit, stderr_limit))
+    writer.close()
+
+
+Runner = Callable[[str, List[str], int], Result]
+
+# Guards the base caches against concurrent requests of this instance
+cache_lock = threading.Lock()
+cache_stats = {"hits": 0, "misses": 0}
+
+
+def strip_cache_dir(options: List[str]) -> List[str]:
+    stripped = []
+    skip = False
+    for option in options:
+        if skip:
+            skip = False
+        elif option == "--cache-dir":
+            skip = True
+        elif not option.startswith("--cache-dir="):
+            stripped.append(option)
+    return stripped
+
+
+def get_base_cache_dir(options: List[str]) -> str:
+    # Cached data depends on options, so use a separate cache per options
+    digest = hashlib.sha256(json.dumps(sorted(options)).encode()).hexdigest()
+    return os.path.join(CACHE_DIR, "base", digest[:16])
+
+
+def build_base_cache(run: Runner, options: List[str], base_dir: str) -> bool:
+    """Analyze the standard library with an empty module and keep the cache"""
+    os.makedirs(os.path.dirname(base_dir), exist_ok=True)
+    # Written elsewhere and renamed, so a partial cache is never used
+    build_dir = tempfile.mkdtemp(dir=os.path.dirname(base_dir), prefix="build-")
+    try:
+        result = run("", ["--cache-dir", build_dir] + options, 0)
+        if result["exit_code"] != 0:
+            return False
+        with cache_lock:
+            if os.path.isdir(base_dir):
+                return True
+            evict_base_caches(os.path.dirname(base_dir))
+            os.rename(build_dir, base_dir)
+            return True
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+
+
+def evict_base_caches(parent_dir: str) -> None:
+    """Delete the least recently used caches to make room for a new one"""
+    base_dirs = [
+        os.path.join(parent_dir, name)
+        for name in os.listdir(parent_dir)
+        if not name.startswith("build-")
+    ]
+    base_dirs.sort(key=os.path.getmtime)
+    for base_dir in base_dirs[: max(0, len(base_dirs) - CACHE_MAX_PROFILES + 1)]:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+
+def copy_base_cache(base_dir: str) -> Optional[str]:
+    with cache_lock:
+        if not os.path.isdir(base_dir):
+            return None
+        job_dir = tempfile.mkdtemp(dir=CACHE_DIR, prefix="job-")
+        try:
+            shutil.copytree(base_dir, job_dir, dirs_exist_ok=True)
+        except OSError:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            return None
+        # Used for the least recently used eviction
+        os.utime(base_dir)
+        return job_dir
+
+
+def run_mypy_cached(
+    run: Runner, source: str, options: List[str], max_output_bytes: int
+) -> Result:
+    """Run mypy with a copy of the cache of the standard library"""
+    options = strip_cache_dir(options)
+    base_dir = get_base_cache_dir(options)
+    job_dir, hit = prepare_job_cache(run, options, base_dir)
+    try:
+        result = run(source, ["--cache-dir", job_dir] + options, max_output_bytes)
+    finally:
+        shutil.rmtree(job_dir, ignore_errors=True)
+    if "INTERNAL ERROR" in str(result["stderr"]) + str(result["stdout"]):
+        # Do not reuse a cache which may have caused the crash
+        with cache_lock:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+    with cache_lock:
+        cache_stats["hits" if hit else "misses"] += 1
+        total = cache_stats["hits"] + cache_stats["misses"]
+        result["cache"] = {
+            "hit": hit,
+            "hits": cache_stats["hits"],
+            "misses": cache_stats["misses"],
+            "hit_ratio": cache_stats["hits"] / total,
+        }
+    return result
+
+
+def prepare_job_cache(
+    run: Runner, options: List[str], base_dir: str
+) -> Tuple[str, bool]:
+    """Return a cache directory for a job and whether the base cache was hit"""
+    job_dir = copy_base_cache(base_dir)
+    if job_dir is not None:
+        return job_dir, True
+    if build_base_cache(run, options, base_dir):
+        job_dir = copy_base_cache(base_dir)
+        if job_dir is not None:
+            return job_dir, False
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return tempfile.mkdtemp(dir=CACHE_DIR, prefix="job-"), False
 
 
 def abort_api(status: int, message: str) -> None:
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Benchmark the pre-built mypy cache in sandbox images.
+
+Runs mypy in sandbox containers with and without the cache under
+/opt/mypy-cache and reports the median latency for each image, Python
+version and cache profile.  It also checks that the output is identical
+with and without the cache, and exits with 1 if it is not.
+
+usage: ./benchmark_cache.py [--runs N] [--python-versions 3.13,3.14] IMAGE...
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SNIPPETS = {
+    "fib": """from typing import Iterator
+
+
+def fib(n: int) -> Iterator[int]:
+    a, b = 0, 1
+    while a < n:
+        yield a
+        a, b = b, a + b
+
+
+fib(10)
+fib("10")
+""",
+    "stdlib": """import asyncio
+import collections
+import dataclasses
+import json
+import pathlib
+
+
+@dataclasses.dataclass
+class Item:
+    path: pathlib.Path
+    count: int
+
+
+async def main() -> None:
+    items = collections.Counter(json.loads("[]"))
+    await asyncio.sleep(items["a"])
+    Item(path="a", count=1)
+""",
+}
+
+PROFILES = {
+    "default": [],
+    "strict": ["--strict"],
+}
+
+
+def run_mypy(
+    image: str, source_path: Path, python_version: str, flags: list[str], cache: bool
+) -> tuple[float, str, int]:
+    cache_dir = f"/opt/mypy-cache/{python_version}/" if cache else "/dev/null"
+    if cache:
+        cache_dir += "strict" if "--strict" in flags else "default"
+    cmd = [
+        "docker",
+        "run",
+        "--rm",
+        "--network=none",
+        f"--volume={source_path}:/tmp/main.py:ro",
+        image,
+        "mypy",
+        "--cache-dir",
+        cache_dir,
+        "--no-site-packages",
+        "--python-version",
+        python_version,
+        *flags,
+        "main.py",
+    ]
+    start_time = time.perf_counter()
+    process = subprocess.run(cmd, check=False, capture_output=True, text=True)
+    duration = time.perf_counter() - start_time
+    return duration, process.stdout, process.returncode
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("images", nargs="+")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--python-versions", default="3.13,3.14")
+    parser.add_argument("--json", action="store_true", help="print JSON lines")
+    args = parser.parse_args()
+
+    identical = True
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for image in args.images:
+            for python_version in args.python_versions.split(","):
+                for profile, flags in PROFILES.items():
+                    for name, source in SNIPPETS.items():
+                        source_path = Path(tmp_dir) / f"{name}.py"
+                        source_path.write_text(source)
+                        durations: dict[bool, list[float]] = {False: [], True: []}
+                        outputs: dict[bool, set[tuple[str, int]]] = {
+                            False: set(),
+                            True: set(),
+                        }
+                        for _ in range(args.runs):
+                            for cache in (False, True):
+                                duration, stdout, exit_code = run_mypy(
+                                    image, source_path, python_version, flags, cache
+                                )
+                                durations[cache].append(duration)
+                                outputs[cache].add((stdout, exit_code))
+                        same = outputs[False] == outputs[True]
+                        identical &= same
+                        row = {
+                            "image": image,
+                            "python_version": python_version,
+                            "profile": profile,
+                            "snippet": name,
+                            "median_without_cache": statistics.median(durations[False]),
+                            "median_with_cache": statistics.median(durations[True]),
+                            "identical_output": same,
+                        }
+                        if args.json:
+                            print(json.dumps(row))
+                        else:
+                            print(
+                                "{image} py{python_version} {profile:7} {snippet:6}"
+                                " without={median_without_cache:.3f}s"
+                                " with={median_with_cache:.3f}s"
+                                " identical={identical_output}".format(**row)
+                            )
+    if not identical:
+        print("output differs with and without the cache", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())